@@ -0,0 +1 @@
+"""Benchmarks of the datasource builders, run them with `python -m benchmarks.<name>`."""
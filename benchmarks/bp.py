@@ -0,0 +1,107 @@
+"""Benchmarks of the BP Datasource."""
+
+import argparse
+import time
+import timeit
+import tracemalloc
+from typing import Any
+
+import pandas as pd
+
+from shifter_pandas.bp import BPDatasource
+
+_BENCHMARKS = ["builder", "load", "memory"]
+
+
+def _datasource_concat(shifter_ds: BPDatasource) -> pd.DataFrame:
+    """Build the DataFrame with one `pd.concat` per cell, as it was done before the columnar builder."""
+    assert shifter_ds.xlsx is not None
+    data_frame = pd.DataFrame(columns=["Value", "Type", "Unit", "TypeUnit", "Year", "Region"])
+    for type_ in shifter_ds.metadata():
+        if not type_["supported"]:
+            continue
+        unit_definition = type_["unit"]
+        for year in type_["years"]:
+            for region in type_["regions"]:
+                value = shifter_ds.xlsx.worksheets[type_["index"]].cell(region["index"], year["index"]).value
+                if not isinstance(value, int | float):
+                    continue
+                element: dict[str, Any] = {
+                    "Value": value * unit_definition["iso_factor"],
+                    "Year": year["label"],
+                    "Region": region["label"],
+                    "Type": type_["type"],
+                    "Unit": f"{unit_definition['iso']}{unit_definition['iso_postfix']}",
+                    "TypeUnit": f"{type_['label']} [{unit_definition['iso']}]{unit_definition['iso_postfix']}",
+                }
+                data_frame = pd.concat(
+                    [data_frame, pd.DataFrame({k: [v] for k, v in element.items()})],
+                    ignore_index=True,
+                )
+    return data_frame
+
+
+def _benchmark_builder(file_name: str, number: int) -> None:
+    """Compare the columnar builder with the per cell concatenation."""
+    shifter_ds = BPDatasource(file_name)
+
+    concat = min(timeit.repeat(lambda: _datasource_concat(shifter_ds), number=1, repeat=number))
+    columnar = min(timeit.repeat(shifter_ds.datasource, number=1, repeat=number))
+    print(f"Rows: {len(shifter_ds.datasource())}")
+    print(f"Per cell concat: {concat:.3f}s")
+    print(f"Columnar:        {columnar:.3f}s")
+    print(f"Speedup:         {concat / columnar:.0f}x")
+
+
+def _benchmark_load(file_name: str) -> None:
+    """Compare the load time and the peak memory of the full and of the read only modes."""
+    for read_only in (False, True):
+        tracemalloc.start()
+        start = time.perf_counter()
+        shifter_ds = BPDatasource(file_name, read_only=read_only)
+        shifter_ds.datasource()
+        duration = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del shifter_ds
+        print(
+            f"{'Read only' if read_only else 'Full':9}: {duration:.3f}s, "
+            f"peak {peak / 1024 / 1024:.1f} MiB, retained {current / 1024 / 1024:.1f} MiB",
+        )
+
+
+def _benchmark_memory(file_name: str) -> None:
+    """Compare the memory footprint of the DataFrame with the object and with the categorical columns."""
+    shifter_ds = BPDatasource(file_name, read_only=True)
+    for categorical in (False, True):
+        data_frame = shifter_ds.datasource(categorical=categorical)
+        print(
+            f"{'Categorical' if categorical else 'Objects':11}: "
+            f"{data_frame.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MiB for {len(data_frame)} rows",
+        )
+
+
+def main() -> None:
+    """Run the benchmarks of the BP Datasource."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--file", default="tests/bp-stats-review-2021-all-data.xlsx", help="The BP workbook")
+    parser.add_argument("--number", type=int, default=3, help="Number of runs")
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    if "builder" in benchmarks:
+        _benchmark_builder(args.file, args.number)
+    if "load" in benchmarks:
+        _benchmark_load(args.file)
+    if "memory" in benchmarks:
+        _benchmark_memory(args.file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmarks of the regions fuzzy matcher, on the BP regions of the tests."""
+
+import argparse
+import importlib.util
+import time
+from pathlib import Path
+from typing import Any
+
+from shifter_pandas.gazetteer import Gazetteer, normalize_name
+from shifter_pandas.matcher import RegionMatcher, clean_label
+
+_BENCHMARKS = ["accuracy", "throughput"]
+
+
+def _bp_data() -> list[tuple[str | None, str]]:
+    """Get the expected labels and the BP regions of the `get_region` tests."""
+    spec = importlib.util.spec_from_file_location(
+        "test_get_region",
+        Path(__file__).parent.parent / "tests" / "test_get_region.py",
+    )
+    assert spec is not None
+    assert spec.loader is not None
+    module: Any = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return list(module.BP_DATA)
+
+
+def _matchers(gazetteer: Gazetteer, threshold: float, bp_labels: list[str]) -> dict[str, RegionMatcher]:
+    """
+    Get the matchers on all the names, on the labels of the regions, and on the names without the BP labels.
+
+    The names of the bundled gazetteer include the BP regions resolved in a cache, the labels don't, and the
+    held out names have none of the BP labels, so that all of them are matched on other names.
+    """
+    labels = {region["id"]: (region["label"], region) for _, region in gazetteer.names()}
+    held_out = {normalize_name(label) for label in bp_labels} | {clean_label(label) for label in bp_labels}
+    return {
+        "All names": RegionMatcher.from_gazetteer(gazetteer, threshold),
+        "Labels": RegionMatcher(labels.values(), gazetteer.types, threshold),
+        "Held out": RegionMatcher(
+            [(name, region) for name, region in gazetteer.names() if normalize_name(name) not in held_out],
+            gazetteer.types,
+            threshold,
+        ),
+    }
+
+
+def _benchmark_accuracy(gazetteer: Gazetteer, threshold: float) -> None:
+    """Compare the matched regions with the expected ones, with the exact gazetteer lookup as reference."""
+    bp_data = _bp_data()
+    exact = [gazetteer.get_region(region) for _, region in bp_data]
+    correct = sum(
+        (region["label"] if region else None) == expected
+        for (expected, _), region in zip(bp_data, exact, strict=True)
+    )
+    print(f"Exact:     {correct}/{len(bp_data)}")
+    labels = [region for _, region in bp_data]
+    for name, matcher in _matchers(gazetteer, threshold, labels).items():
+        matched = matcher.match(labels)
+        correct = sum(
+            (region["label"] if region else None) == expected
+            for (expected, _), region in zip(bp_data, matched, strict=True)
+        )
+        print(f"{name:10} {correct}/{len(bp_data)}")
+
+
+def _benchmark_throughput(gazetteer: Gazetteer, threshold: float, repeat: int) -> None:
+    """Measure the matching of the BP labels, as a column with repeated labels and as distinct labels."""
+    labels = [region for _, region in _bp_data()]
+    for name, matcher in _matchers(gazetteer, threshold, labels).items():
+        start = time.perf_counter()
+        matcher.match(labels * repeat)
+        column_duration = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(repeat):
+            matcher.match(labels)
+        distinct_duration = time.perf_counter() - start
+        print(
+            f"{name:10} column of {len(labels) * repeat} labels: {column_duration:.3f}s, "
+            f"{len(labels) * repeat / distinct_duration:.0f} distinct labels/s"
+        )
+
+
+def main() -> None:
+    """Run the benchmarks of the regions fuzzy matcher."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--threshold", type=float, default=0.7, help="The minimum score of a match")
+    parser.add_argument("--repeat", type=int, default=100, help="Number of repetitions of the BP labels")
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    gazetteer = Gazetteer()
+    if "accuracy" in benchmarks:
+        _benchmark_accuracy(gazetteer, args.threshold)
+    if "throughput" in benchmarks:
+        _benchmark_throughput(gazetteer, args.threshold, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Benchmarks of the OFS Datasource."""
+
+import argparse
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+import pandas as pd
+
+from shifter_pandas.ofs import decode_json_stat
+
+_BENCHMARKS = ["decode", "memory"]
+
+
+def _decode_loops(dataset: dict[str, Any]) -> dict[str, Any]:
+    """Decode the JSON-stat dataset with the loops, as it was done before the vectorized decoding."""
+    values = {"values": dataset["value"]}
+    length = 1
+    total_length = len(dataset["value"])
+    for dimension_id in dataset["dimension"]["id"]:
+        dimension = dataset["dimension"][dimension_id]
+        current_length = len(dimension["category"]["index"])
+        number = int(total_length / (length * current_length))
+        dimension_value = list(dataset["value"])
+        for index_x in range(length):
+            for index_y, value in enumerate(dimension["category"]["label"].values()):
+                for index_z in range(number):
+                    dimension_value[index_x * current_length * number + index_y * number + index_z] = value
+        values[dimension["label"]] = dimension_value
+        length *= current_length
+    return values
+
+
+def _dataset(sizes: list[int]) -> dict[str, Any]:
+    """Get a JSON-stat dataset with dimensions of the given sizes."""
+    dimensions: dict[str, Any] = {"id": [f"d{index}" for index in range(len(sizes))]}
+    total_length = 1
+    for index, size in enumerate(sizes):
+        dimensions[f"d{index}"] = {
+            "label": f"Dimension {index}",
+            "category": {
+                "index": {str(code): code for code in range(size)},
+                "label": {str(code): f"Category {index}.{code}" for code in range(size)},
+            },
+        }
+        total_length *= size
+    return {"dimension": dimensions, "value": list(range(total_length))}
+
+
+def _measure(function: Callable[[dict[str, Any]], dict[str, Any]], dataset: dict[str, Any]) -> str:
+    """Get the duration and the peak memory of the decoding to a DataFrame."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    pd.DataFrame(function(dataset))
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return f"{duration:.3f}s, peak {peak / 1024 / 1024:.1f} MiB"
+
+
+def _benchmark_decode(sizes: list[int]) -> None:
+    """Compare the vectorized decoding with the loops."""
+    dataset = _dataset(sizes)
+    print(f"Cells: {len(dataset['value'])}")
+    print(f"Loops:      {_measure(_decode_loops, dataset)}")
+    print(f"Vectorized: {_measure(decode_json_stat, dataset)}")
+
+
+def _benchmark_memory(sizes: list[int]) -> None:
+    """Compare the memory footprint of the DataFrame with the string and with the categorical columns."""
+    values = decode_json_stat(_dataset(sizes))
+    strings = pd.DataFrame(
+        {
+            name: column.tolist() if isinstance(column, pd.Categorical) else column
+            for name, column in values.items()
+        },
+    )
+    for name, data_frame in (("Strings", strings), ("Categorical", pd.DataFrame(values))):
+        print(f"{name:11}: {data_frame.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MiB")
+
+
+def main() -> None:
+    """Run the benchmarks of the OFS Datasource."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[26, 20, 10, 40],
+        help="The sizes of the dimensions of the cube",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    if "decode" in benchmarks:
+        _benchmark_decode(args.sizes)
+    if "memory" in benchmarks:
+        _benchmark_memory(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Microbenchmarks of the units registry."""
+
+import argparse
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from shifter_pandas.units import UnitRegistry, normalize_unit
+
+_BENCHMARKS = ["parse", "convert"]
+_UNITS = [
+    "Exajoules",
+    "Terawatt-hours",
+    "Million tonnes of oil equivalent",
+    "Thousand barrels daily",
+    "Billion cubic metres",
+    "Million tonnes of carbon dioxide",
+    "Megawatts",
+    "Gigajoule per capita",
+    "US dollars per barrel",
+    "Thousand tonnes of lithium content",
+]
+
+
+def _benchmark_parse(number: int) -> None:
+    """Compare the parse of the units without and with the cache."""
+    registry = UnitRegistry()
+    normalized_units = [normalize_unit(unit) for unit in _UNITS]
+
+    def _cold() -> None:
+        for unit in normalized_units:
+            registry._parse_cache.clear()  # noqa: SLF001
+            registry.parse(unit)
+
+    def _cached() -> None:
+        for unit in normalized_units:
+            registry.parse(unit)
+
+    cold = min(timeit.repeat(_cold, number=number, repeat=3)) / number / len(_UNITS)
+    cached = min(timeit.repeat(_cached, number=number, repeat=3)) / number / len(_UNITS)
+    print(f"Parse, not cached: {cold * 1e9:8.0f}ns per unit")
+    print(f"Parse, cached:     {cached * 1e9:8.0f}ns per unit")
+
+
+def _benchmark_convert(size: int) -> None:
+    """Compare the vectorized conversion with a conversion value by value."""
+    registry = UnitRegistry()
+    rng = np.random.default_rng(42)
+    values = pd.Series(rng.random(size))
+    units = pd.Series(rng.choice(_UNITS, size))
+
+    def _scalar() -> list[float]:
+        return [
+            value * registry.parse(normalize_unit(unit)).factor
+            for value, unit in zip(values, units, strict=True)
+        ]
+
+    scalar = min(timeit.repeat(_scalar, number=1, repeat=3))
+    single = min(timeit.repeat(lambda: registry.convert(values, "Exajoules"), number=1, repeat=3))
+    column = min(timeit.repeat(lambda: registry.to_iso(values, units), number=1, repeat=3))
+    print(f"Convert {size} values, value by value:     {scalar:.3f}s")
+    print(f"Convert {size} values, one unit:           {single:.3f}s")
+    print(f"Convert {size} values, with a unit column: {column:.3f}s")
+
+
+def main() -> None:
+    """Run the microbenchmarks of the units registry."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--number", type=int, default=1000, help="Number of parse runs")
+    parser.add_argument("--size", type=int, default=1000000, help="Number of values to convert")
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    if "parse" in benchmarks:
+        _benchmark_parse(args.number)
+    if "convert" in benchmarks:
+        _benchmark_convert(args.size)
+
+
+if __name__ == "__main__":
+    main()
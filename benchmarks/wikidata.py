@@ -0,0 +1,129 @@
+"""Benchmarks of the Wikidata fetching against a local mock endpoint with an artificial latency."""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+from shifter_pandas.cache import open_backend
+from shifter_pandas.transport import Transport
+from shifter_pandas.wikidata_ import WikidataDatasource
+from tests.conftest import StubHandler, StubServer
+
+_BENCHMARKS = ["entities", "regions", "memory"]
+
+
+class _Handler(StubHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        time.sleep(self.server.latency)
+        params = parse_qs(urlparse(self.path).query)
+        if "ids" in params:
+            result: dict[str, Any] = {
+                "entities": {
+                    entity_id: {"id": entity_id, "labels": {"en": {"language": "en", "value": entity_id}}}
+                    for entity_id in params["ids"][0].split("|")
+                },
+            }
+        else:
+            result = {"results": {"bindings": []}}
+        self.send_json(result)
+
+
+def _wdds(
+    url: str,
+    max_workers: int,
+    cache_file: Path,
+    memory_cache_size: int | None = 10_000,
+) -> WikidataDatasource:
+    """Get a datasource with an empty cache."""
+    os.environ["WIKIDATA_CACHE_FILE"] = str(cache_file)
+    return WikidataDatasource(
+        endpoint_url=f"{url}/sparql",
+        api_url=f"{url}/w/api.php",
+        transport=Transport(max_workers=max_workers),
+        memory_cache_size=memory_cache_size,
+    )
+
+
+def _benchmark_entities(url: str, size: int, max_workers: int, cache_dir: Path) -> None:
+    """Compare the entities fetching without and with concurrent requests."""
+    item_ids = [f"Q{number}" for number in range(1, size + 1)]
+    for workers in (1, max_workers):
+        wdds = _wdds(url, workers, cache_dir / f"entities-{workers}.json")
+        start = time.perf_counter()
+        items = wdds.get_items(item_ids)
+        duration = time.perf_counter() - start
+        assert [item["Name"] for item in items] == item_ids
+        print(f"Fetch {size} entities, {workers:2d} workers: {duration:.3f}s")
+
+
+def _benchmark_regions(url: str, size: int, max_workers: int, cache_dir: Path) -> None:
+    """Compare the regions resolution without and with concurrent queries."""
+    names = [f"Region {number}" for number in range(size)]
+    for workers in (1, max_workers):
+        wdds = _wdds(url, workers, cache_dir / f"regions-{workers}.json")
+        start = time.perf_counter()
+        wdds.get_regions(names=names, chunk_size=20)
+        duration = time.perf_counter() - start
+        print(f"Resolve {size} regions, {workers:2d} workers: {duration:.3f}s")
+
+
+def _benchmark_memory(url: str, size: int, cache_dir: Path) -> None:
+    """Compare the peak memory of the lookups of many cached items, without and with a bound in memory."""
+    cache_file = cache_dir / "memory.sqlite"
+    item_ids = [f"Q{number}" for number in range(1, size * 100 + 1)]
+    open_backend(cache_file).write(
+        {("items", item_id): {"name": item_id, "description": f"The item {item_id}"} for item_id in item_ids},
+    )
+    for memory_cache_size in (None, size):
+        wdds = _wdds(url, 1, cache_file, memory_cache_size)
+        tracemalloc.start()
+        start = time.perf_counter()
+        for index in range(0, len(item_ids), size):
+            wdds.get_items(item_ids[index : index + size])
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        stats = wdds.cache.stats
+        print(
+            f"Lookup {len(item_ids)} cached items, memory size {memory_cache_size}: {duration:.3f}s, "
+            f"peak {peak / 2**20:.1f} MiB, {stats.hits} hits, {stats.misses} misses, "
+            f"{stats.evictions} evictions"
+        )
+
+
+def main() -> None:
+    """Run the benchmarks of the Wikidata fetching."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument("--latency", type=float, default=0.1, help="Latency of the mock endpoint in seconds")
+    parser.add_argument("--size", type=int, default=500, help="Number of entities or regions")
+    parser.add_argument("--max-workers", type=int, default=8, help="Number of concurrent workers")
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    server = StubServer(_Handler, latency=args.latency)
+    url = server.url
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            if "entities" in benchmarks:
+                _benchmark_entities(url, args.size, args.max_workers, Path(cache_dir))
+            if "regions" in benchmarks:
+                _benchmark_regions(url, args.size, args.max_workers, Path(cache_dir))
+            if "memory" in benchmarks:
+                _benchmark_memory(url, args.size, Path(cache_dir))
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
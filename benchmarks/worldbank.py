@@ -0,0 +1,152 @@
+"""Benchmarks of the World Bank Datasource."""
+
+import argparse
+import csv
+import io
+import re
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from shifter_pandas import standardize_property
+from shifter_pandas.worldbank import WorldbankBulkDatasource, WorldbankDatasource
+
+_BENCHMARKS = ["parse", "memory", "bulk"]
+
+
+def _datasource_rows(zip_filename: str) -> pd.DataFrame:
+    """Read the CSV as lists and build the DataFrame cell by cell, as it was done before `pd.read_csv`."""
+    with (
+        zipfile.ZipFile(zip_filename) as myzip,
+        myzip.open(Path(zip_filename).stem + ".csv") as csvfile,
+    ):
+        table = list(csv.reader(io.TextIOWrapper(csvfile, encoding=None), delimiter=",", quotechar='"'))
+    year_re = re.compile(r"^[0-9]{4}$")
+    headers = [
+        (e[0], standardize_property(e[1]))
+        for e in enumerate(table[4])
+        if e[1] and year_re.match(e[1]) is None
+    ]
+    years = [(e[0], int(e[1])) for e in enumerate(table[4]) if year_re.match(e[1]) is not None]
+    data: dict[str, list[Any]] = {"Year": [], "Value": []}
+    for _, header in headers:
+        data[header] = []
+    for row in table[5:]:
+        for index_y, year in years:
+            value = row[index_y]
+            if value:
+                for index_y2, header in headers:
+                    data[header].append(row[index_y2])
+                data["Year"].append(year)
+                data["Value"].append(float(row[index_y]))
+    return pd.DataFrame(data)
+
+
+def _bulk_file(zip_filename: str, indicators: int, directory: Path) -> str:
+    """Get a zip file with the rows of the given one repeated for many indicators, like the bulk files."""
+    name = Path(zip_filename).stem + ".csv"
+    with zipfile.ZipFile(zip_filename) as myzip:
+        lines = myzip.read(name).decode("utf-8-sig").splitlines(keepends=True)
+    bulk_filename = directory / Path(zip_filename).name
+    with zipfile.ZipFile(bulk_filename, "w", zipfile.ZIP_DEFLATED) as bulk_zip:
+        bulk_zip.writestr(
+            name,
+            "".join(
+                [
+                    *lines[:5],
+                    *[
+                        line.replace("NY.GDP.MKTP.KD", f"NY.GDP.MKTP.KD.{index}")
+                        for index in range(indicators)
+                        for line in lines[5:]
+                    ],
+                ],
+            ),
+        )
+    return str(bulk_filename)
+
+
+def _benchmark_parse(file_name: str, indicators: int) -> None:
+    """Compare the parsing with `pd.read_csv` and `melt` with the cell by cell parsing."""
+    with tempfile.TemporaryDirectory() as directory:
+        bulk_filename = _bulk_file(file_name, indicators, Path(directory))
+        start = time.perf_counter()
+        rows = _datasource_rows(bulk_filename)
+        rows_duration = time.perf_counter() - start
+        start = time.perf_counter()
+        WorldbankDatasource(bulk_filename).datasource()
+        melt_duration = time.perf_counter() - start
+    print(f"Rows: {len(rows)}")
+    print(f"Cell by cell:      {rows_duration:.3f}s")
+    print(f"Read CSV and melt: {melt_duration:.3f}s")
+    print(f"Speedup:           {rows_duration / melt_duration:.0f}x")
+
+
+def _benchmark_memory(file_name: str) -> None:
+    """Compare the memory footprint of the DataFrame with the string and with the categorical columns."""
+    shifter_ds = WorldbankDatasource(file_name)
+    for categorical in (False, True):
+        data_frame = shifter_ds.datasource(categorical=categorical)
+        print(
+            f"{'Categorical' if categorical else 'Strings':11}: "
+            f"{data_frame.memory_usage(deep=True).sum() / 1024 / 1024:.2f} MiB for {len(data_frame)} rows",
+        )
+
+
+def _benchmark_bulk(file_name: str, indicators: int) -> None:
+    """Compare the peak memory of the full load with the one of the chunked write of a Parquet dataset."""
+    with tempfile.TemporaryDirectory() as directory:
+        bulk_filename = _bulk_file(file_name, indicators, Path(directory))
+        for name, function in (
+            ("Full load", lambda: WorldbankDatasource(bulk_filename).datasource()),
+            (
+                "Chunked Parquet",
+                lambda: WorldbankBulkDatasource(bulk_filename).to_parquet(str(Path(directory) / "dataset")),
+            ),
+        ):
+            tracemalloc.start()
+            start = time.perf_counter()
+            function()
+            duration = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:15}: {duration:.3f}s, peak {peak / 1024 / 1024:.1f} MiB")
+
+
+def main() -> None:
+    """Run the benchmarks of the World Bank Datasource."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument(
+        "--file",
+        default="tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip",
+        help="The World Bank zip file",
+    )
+    parser.add_argument(
+        "--indicators",
+        type=int,
+        default=100,
+        help="Number of times the indicator is repeated in the parse and bulk benchmarks",
+    )
+    parser.add_argument(
+        "--benchmark",
+        action="append",
+        choices=_BENCHMARKS,
+        help="The benchmark to run, all by default",
+    )
+    args = parser.parse_args()
+    benchmarks = args.benchmark or _BENCHMARKS
+
+    if "parse" in benchmarks:
+        _benchmark_parse(args.file, args.indicators)
+    if "memory" in benchmarks:
+        _benchmark_memory(args.file)
+    if "bulk" in benchmarks:
+        _benchmark_bulk(args.file, args.indicators)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,26 @@
 """Utilities functions."""
 
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
 
 def standardize_property(words: str) -> str:
     """Get standardize the property name for the Pandas datasource."""
     return "".join(word[0].upper() + word[1:].lower() for word in words.replace("-", "_").split(" "))
+
+
+def compact_dtypes(data_frame: pd.DataFrame, label_columns: list[str]) -> pd.DataFrame:
+    """
+    Get the DataFrame with compact dtypes.
+
+    The label columns are converted to categories, the `Year` column to a 16 bits integer,
+    and the `Value` column to a float.
+    """
+    dtypes: dict[str, Any] = {column: "category" for column in label_columns if column in data_frame}
+    if "Year" in data_frame:
+        dtypes["Year"] = np.int16
+    if "Value" in data_frame:
+        dtypes["Value"] = np.float64
+    return data_frame.astype(dtypes)
@@ -1,11 +1,18 @@
 """Datasource builder for data from British Petroleum."""
 
+import copy
+import hashlib
+import json
+from pathlib import Path
 from typing import Any
 
+import numpy as np
 import openpyxl
 import pandas as pd
 
-from shifter_pandas import standardize_property
+from shifter_pandas import compact_dtypes, standardize_property
+from shifter_pandas.scan import Scan, is_selected
+from shifter_pandas.units import UnitRegistry, normalize_unit
 from shifter_pandas.wikidata_ import WikidataDatasource
 
 # ISO
@@ -19,13 +26,55 @@ UNITS_VOLUME_PRE_DAY = ["m³ per day"]
 # ISO
 UNITS_MASS = ["tonnes"]
 
+_CACHE_VERSION = 2
+
+# The columns converted to categories
+_LABEL_COLUMNS = ["Type", "Unit", "TypeUnit", "Region", "WikidataId", "WikidataName", "WikidataType"]
+
+_is_number = np.frompyfunc(lambda value: isinstance(value, int | float), 1, 1)
+_is_integer = np.frompyfunc(lambda value: isinstance(value, int), 1, 1)
+_is_float = np.frompyfunc(lambda value: isinstance(value, float), 1, 1)
+_is_not_none = np.frompyfunc(lambda value: value is not None, 1, 1)
+_to_text = np.frompyfunc(str, 1, 1)
+
+
+def _masked_array(values: np.ndarray, mask: np.ndarray, dtype: Any) -> Any:
+    """Get a pandas array of the given type with the values where the mask is true and missing values elsewhere."""
+    result = np.full(len(values), None, dtype=object)
+    result[mask] = values[mask]
+    return pd.array(result, dtype=dtype)
+
+
+def _read_sheet(worksheet: Any) -> np.ndarray:
+    """Read all the values of a worksheet in one pass into a 2-D array."""
+    rows = list(worksheet.iter_rows(values_only=True))
+    values = np.full((len(rows), max((len(row) for row in rows), default=0)), None, dtype=object)
+    for index, row in enumerate(rows):
+        values[index, : len(row)] = row
+    return values
+
 
 class BPDatasource:
     """Datasource builder for data from British Petroleum."""
 
-    def __init__(self, file_name: str) -> None:
-        """Initialize the datasource builder."""
-        self.xlsx = openpyxl.load_workbook(file_name)
+    def __init__(self, file_name: str, read_only: bool = False, cache_dir: str | None = None) -> None:
+        """
+        Initialize the datasource builder.
+
+        With `read_only` the workbook is streamed once, the values of each sheet are kept in a 2-D array
+        and the file is closed, this uses less memory and is faster to load. The formulas are replaced
+        by their cached values.
+
+        With `cache_dir` the parsed workbook is saved in this directory (see `save_cache`) and loaded
+        from it on the next runs, without opening the workbook, it requires pyarrow.
+        """
+        self.file_name = file_name
+        self.read_only = read_only
+        self.xlsx: openpyxl.Workbook | None = None
+        self.sheetnames: list[str] = []
+        # _metadata_cache[<sheet index>] = <sheet metadata>
+        self._metadata_cache: dict[int, dict[str, Any]] = {}
+        self.sheets: list[np.ndarray] | None = None
         self.wdds = WikidataDatasource()
         self.wdds.set_alias("World", "World", "Q16502", "World")
         # Crude oil: oil_units_conversion[<from unit>][<to unit>] = <factor>
@@ -36,83 +85,50 @@ class BPDatasource:
         # gaz_units_conversion[<from unit>][<to unit>] = <factor>
         self.gaz_units_conversion: dict[str, dict[str, float]] = {}
 
-        # to_iso_unit[<from_unit>] = {"unit": <to_unit>, "factor": <factor>}
-        # tones is considered as ISO because it's more convenient to use
-        # then J, m³, tonnes (day, capita).
-        self.to_iso_unit: dict[str, dict[str, Any]] = {}
-
-        # 1 metric tonne = 2204.62 lb.
-        self.to_iso_unit["lb"] = {"unit": "tonnes", "factor": 2204.62}
-        # = 1.1023 short tons
-        self.to_iso_unit["short tons"] = {"unit": "tonnes", "factor": 1.1023}
-        # 1 kilolitre = 6.2898 barrels
-        self.to_iso_unit["barrels"] = {"unit": "m³", "factor": 6.2898}
-        # 1 kilolitre = 1 cubic meter
-        self.to_iso_unit["litres"] = {"unit": "m³", "factor": 1000}
-        # 1 kilocalorie (kcal) = 4.1868 kJ = 3.968 Btu
-        # 1 kilojoule (kJ) = 1,000 joules = 0.239 kcal = 0.948 Btu
-        self.to_iso_unit["kilocalorie"] = {"unit": "J", "factor": 1 / 239}
-        self.to_iso_unit["kcal"] = self.to_iso_unit["kilocalorie"]
-        self.to_iso_unit["calorie"] = {"unit": "J", "factor": 1 / 0.239}
-        self.to_iso_unit["cal"] = self.to_iso_unit["calorie"]
-        self.to_iso_unit["Btu"] = {"unit": "J", "factor": 1 / 948}
-        # 1 British thermal unit (Btu) = 0.252 kcal = 1.055 kJ
-        # 1 barrel of oil equivalent (boe) = 5.8 million Btu = 6.119 million kJ
-        self.to_iso_unit["barrel of oil equivalent"] = {"unit": "j", "factor": 6119000}
-        # 1 kilowatt-hour (kWh) = 860 kcal = 3600 kJ = 3412 Btu
-        self.to_iso_unit["kilowatt-hour"] = {"unit": "J", "factor": 3600 / 1000}
-        self.to_iso_unit["kilowatt-hours"] = self.to_iso_unit["kilowatt-hour"]
-        self.to_iso_unit["kWh"] = self.to_iso_unit["kilowatt-hour"]
-        self.to_iso_unit["watt-hour"] = {"unit": "J", "factor": 3600}
-        self.to_iso_unit["watt-hours"] = self.to_iso_unit["watt-hour"]
-        self.to_iso_unit["Wh"] = self.to_iso_unit["watt-hour"]
-
-        self.to_iso_unit["cubic meters"] = {"unit": "m³", "factor": 1}
-        self.to_iso_unit["meters"] = {"unit": "m", "factor": 1}
-        self.to_iso_unit["joules"] = {"unit": "J", "factor": 1}
-        self.to_iso_unit["cubic feets"] = {"unit": "m³", "factor": 35.3146667}
-        self.to_iso_unit["cubic meter"] = self.to_iso_unit["cubic meters"]
-        self.to_iso_unit["meter"] = self.to_iso_unit["meters"]
-        self.to_iso_unit["joule"] = self.to_iso_unit["joules"]
-        self.to_iso_unit["cubic feet"] = self.to_iso_unit["cubic feets"]
-        self.to_iso_unit["watts"] = {"unit": "W", "factor": 1}
-        self.to_iso_unit["watt"] = self.to_iso_unit["watts"]
-
-        for type_index, type_value in enumerate(self.xlsx.sheetnames):
-            if type_value == "Approximate conversion factors":
-                self.units_sheet = self.xlsx.worksheets[type_index]
+        self.units = UnitRegistry()
+
+        if cache_dir is not None and self._load_cache(cache_dir):
+            return
+
+        if read_only:
+            xlsx = openpyxl.load_workbook(file_name, read_only=True, data_only=True)
+            self.sheetnames = list(xlsx.sheetnames)
+            self.sheets = [_read_sheet(worksheet) for worksheet in xlsx.worksheets]
+            xlsx.close()
+        else:
+            self.xlsx = openpyxl.load_workbook(file_name)
+            self.sheetnames = list(self.xlsx.sheetnames)
+
+        self.units_sheet_index = self.sheetnames.index("Approximate conversion factors")
 
         for raw in range(8, 13):
-            from_unit = self.normalize_unit(self.units_sheet.cell(raw, 1).value)
-            from_iso_unit, _, from_iso_factor = self._iso_unit(from_unit)
+            from_unit = self.normalize_unit(self._cell(self.units_sheet_index, raw, 1))
+            from_iso_unit, _, from_iso_factor = self.units.parse(from_unit)
             for col in range(4, 9):
-                to_unit_1 = self.units_sheet.cell(4, col).value
+                to_unit_1 = self._cell(self.units_sheet_index, 4, col)
                 to_unit = self.normalize_unit(
                     ((to_unit_1 + " ") if to_unit_1 is not None else "")
-                    + self.units_sheet.cell(5, col).value,
+                    + self._cell(self.units_sheet_index, 5, col),
                 )
-                to_iso_unit, _, to_iso_factor = self._iso_unit(to_unit)
-                value = self.units_sheet.cell(raw, col).value
+                to_iso_unit, _, to_iso_factor = self.units.parse(to_unit)
+                value = self._cell(self.units_sheet_index, raw, col)
                 if isinstance(value, int | float) and from_unit != to_unit:
                     self.oil_units_conversion.setdefault(from_unit, {})[to_unit] = value
                     self.oil_units_conversion.setdefault(from_iso_unit, {})[to_iso_unit] = (
                         value / from_iso_factor * to_iso_factor
                     )
 
-        self.to_iso_unit["us gallons"] = {
-            "unit": "m³",
-            "factor": self.oil_units_conversion["us gallons"]["m³"],
-        }
-        self.to_iso_unit["gallons"] = self.to_iso_unit["us gallons"]
+        self.units.define("us gallons", "m³", self.oil_units_conversion["us gallons"]["m³"])
+        self.units.define("gallons", "m³", self.oil_units_conversion["us gallons"]["m³"])
 
         for raw in range(20, 27):
-            product = self.units_sheet.cell(raw, 1).value
+            product = self._cell(self.units_sheet_index, raw, 1)
             for col in range(3, 9):
-                from_unit = self.normalize_unit(self.units_sheet.cell(16, col).value)
-                from_iso_unit, _, from_iso_factor = self._iso_unit(from_unit)
-                to_unit = self.normalize_unit(self.units_sheet.cell(17, col).value[2:])
-                to_iso_unit, _, to_iso_factor = self._iso_unit(to_unit)
-                value = self.units_sheet.cell(raw, col).value
+                from_unit = self.normalize_unit(self._cell(self.units_sheet_index, 16, col))
+                from_iso_unit, _, from_iso_factor = self.units.parse(from_unit)
+                to_unit = self.normalize_unit(self._cell(self.units_sheet_index, 17, col)[2:])
+                to_iso_unit, _, to_iso_factor = self.units.parse(to_unit)
+                value = self._cell(self.units_sheet_index, raw, col)
                 if isinstance(value, int | float) and from_unit != to_unit:
                     self.oil_products_units_conversion.setdefault(product, {}).setdefault(from_unit, {})[
                         to_unit
@@ -122,191 +138,235 @@ class BPDatasource:
                     ] = value / from_iso_factor * to_iso_factor
 
         for raw in range(33, 39):
-            from_unit = self.normalize_unit(self.units_sheet.cell(raw, 1).value)
-            from_iso_unit, _, from_iso_factor = self._iso_unit(from_unit)
+            from_unit = self.normalize_unit(self._cell(self.units_sheet_index, raw, 1))
+            from_iso_unit, _, from_iso_factor = self.units.parse(from_unit)
             for col in range(3, 10):
                 to_unit = self.normalize_unit(
-                    self.units_sheet.cell(29, col).value + " " + self.units_sheet.cell(30, col).value,
+                    self._cell(self.units_sheet_index, 29, col)
+                    + " "
+                    + self._cell(self.units_sheet_index, 30, col),
                 )
-                to_iso_unit, _, to_iso_factor = self._iso_unit(to_unit)
-                value = self.units_sheet.cell(raw, col).value
+                to_iso_unit, _, to_iso_factor = self.units.parse(to_unit)
+                value = self._cell(self.units_sheet_index, raw, col)
                 if isinstance(value, int | float) and from_unit != to_unit:
                     self.gaz_units_conversion.setdefault(from_unit, {})[to_unit] = value
                     self.gaz_units_conversion.setdefault(from_iso_unit, {})[to_iso_unit] = (
                         value / from_iso_factor * to_iso_factor
                     )
 
+        if cache_dir is not None:
+            self.save_cache(cache_dir)
+
+    def _cache_name(self) -> str:
+        """Get the name of the cache files, from the hash of the workbook content and the mode."""
+        digest = hashlib.sha256()
+        with Path(self.file_name).open("rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return f"{digest.hexdigest()}{'-read-only' if self.read_only else ''}"
+
+    def save_cache(self, cache_dir: str) -> None:
+        """
+        Save the parsed workbook in the cache directory.
+
+        The non empty cells of all the sheets are saved as a long table in a Parquet file, and the metadata
+        and the units conversion tables in a JSON file, both named with the hash of the workbook content.
+        """
+        sheets = self.sheets
+        if sheets is None:
+            assert self.xlsx is not None
+            sheets = [_read_sheet(worksheet) for worksheet in self.xlsx.worksheets]
+
+        tables = []
+        for type_index, values in enumerate(sheets):
+            rows, columns = np.nonzero(_is_not_none(values).astype(bool))
+            cells = values[rows, columns]
+            is_integer = _is_integer(cells).astype(bool)
+            is_float = _is_float(cells).astype(bool)
+            texts = _to_text(cells)
+            tables.append(
+                pd.DataFrame(
+                    {
+                        "Sheet": np.full(len(cells), type_index, dtype=np.int32),
+                        "Row": (rows + 1).astype(np.int32),
+                        "Column": (columns + 1).astype(np.int32),
+                        "Integer": _masked_array(cells, is_integer, "Int64"),
+                        "Float": _masked_array(cells, is_float, "Float64"),
+                        "Text": _masked_array(texts, ~(is_integer | is_float), pd.StringDtype()),
+                    },
+                ),
+            )
+
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        name = self._cache_name()
+        pd.concat(tables, ignore_index=True).to_parquet(cache_path / f"{name}.parquet.new", index=False)
+        with (cache_path / f"{name}.json.new").open("w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "version": _CACHE_VERSION,
+                    "sheetnames": self.sheetnames,
+                    "shapes": [values.shape for values in sheets],
+                    "metadata": [self._sheet_metadata(type_index) for type_index in range(len(sheets))],
+                    "units_sheet_index": self.units_sheet_index,
+                    "to_iso_unit": self.to_iso_unit,
+                    "oil_units_conversion": self.oil_units_conversion,
+                    "oil_products_units_conversion": self.oil_products_units_conversion,
+                    "gaz_units_conversion": self.gaz_units_conversion,
+                },
+                file,
+            )
+        (cache_path / f"{name}.parquet.new").replace(cache_path / f"{name}.parquet")
+        (cache_path / f"{name}.json.new").replace(cache_path / f"{name}.json")
+
+    def _load_cache(self, cache_dir: str) -> bool:
+        """Load the parsed workbook from the cache directory, return False if it isn't in the cache."""
+        name = self._cache_name()
+        json_path = Path(cache_dir) / f"{name}.json"
+        parquet_path = Path(cache_dir) / f"{name}.parquet"
+        if not json_path.exists() or not parquet_path.exists():
+            return False
+        with json_path.open(encoding="utf-8") as file:
+            cache = json.load(file)
+        if cache.get("version") != _CACHE_VERSION:
+            return False
+
+        table = pd.read_parquet(parquet_path)
+        self.sheets = [np.full(shape, None, dtype=object) for shape in cache["shapes"]]
+        for type_index, cells in table.groupby("Sheet"):
+            values = self.sheets[int(type_index)]
+            rows = cells["Row"].to_numpy() - 1
+            columns = cells["Column"].to_numpy() - 1
+            for column in ("Integer", "Float", "Text"):
+                mask = cells[column].notna().to_numpy()
+                values[rows[mask], columns[mask]] = cells[column][mask].to_numpy(dtype=object)
+
+        self.sheetnames = cache["sheetnames"]
+        self._metadata_cache = dict(enumerate(cache["metadata"]))
+        self.units_sheet_index = cache["units_sheet_index"]
+        self.units = UnitRegistry(cache["to_iso_unit"])
+        self.oil_units_conversion = cache["oil_units_conversion"]
+        self.oil_products_units_conversion = cache["oil_products_units_conversion"]
+        self.gaz_units_conversion = cache["gaz_units_conversion"]
+        return True
+
     @staticmethod
     def normalize_unit(unit: str) -> str:
         """Get normalized unit."""
-        unit = unit.strip()
-        unit = unit.lower()
-        unit = unit.removeprefix("1 ")
-        unit = unit.replace("/", " / ")
-        unit = unit.replace("  ", " ")
-        unit = unit.replace("equiv.", "equivalent")
-        return unit.replace(" daily", " per day")
-
-    def _iso_unit(self, unit: str) -> tuple[str, str, float]:
-        if "/" not in unit:
-            return self._single_iso_unit(unit)
-        upper, lower = unit.split("/")
-        unit, upper_postfix, factor = self._single_iso_unit(upper.strip())
-        assert not upper_postfix, f"Upper unit {upper} has a postfix {upper_postfix}"
-        lower_unit, postfix, lower_factor = self._single_iso_unit(lower.strip())
-        return f"{unit} / {lower_unit}", postfix, factor / lower_factor
-
-    def _single_iso_unit(self, unit: str) -> tuple[str, str, float]:
-        unit_postfix = ""
-        postfix = ""
-        for postfix_candidate in ("*",):
-            if unit.endswith(postfix_candidate):
-                postfix = postfix_candidate
-                unit = unit[: -len(postfix_candidate)]
-                break
-
-        for postfix_candidate in (
-            " (input-equivalent)",
-            " per capita",
-            " daily",
-            " per year",
-            " per day",
+        return normalize_unit(unit)
+
+    @property
+    def to_iso_unit(self) -> dict[str, dict[str, Any]]:
+        """Get the units conversion table to the ISO units."""
+        return self.units.to_iso_unit
+
+    def _cell(self, type_index: int, row: int, column: int) -> Any:
+        """Get the value of a cell of a sheet, the row and the column start at 1."""
+        if self.sheets is None:
+            assert self.xlsx is not None
+            return self.xlsx.worksheets[type_index].cell(row, column).value
+        values = self.sheets[type_index]
+        if row > values.shape[0] or column > values.shape[1]:
+            return None
+        return values[row - 1, column - 1]
+
+    def _block(self, type_index: int, rows: list[int], columns: list[int]) -> np.ndarray:
+        """Get the values of the given rows and columns of a sheet as a 2-D array."""
+        if self.sheets is not None:
+            return self.sheets[type_index][
+                np.ix_([row - 1 for row in rows], [column - 1 for column in columns])
+            ]
+        assert self.xlsx is not None
+        worksheet = self.xlsx.worksheets[type_index]
+        values = np.empty((len(rows), len(columns)), dtype=object)
+        # Only the requested cells are read
+        values[:] = [[worksheet.cell(row, column).value for column in columns] for row in rows]
+        return values
+
+    def _sheet_metadata(self, type_index: int) -> dict[str, Any]:
+        """Get the layout of a sheet, computed on first use and kept on the instance."""
+        if type_index in self._metadata_cache:
+            return self._metadata_cache[type_index]
+
+        type_value = self.sheetnames[type_index]
+        nice_type = type_value
+        for postfix in (
+            " - TWh",
+            " - EJ",
+            " - PJ",
+            " - Cons capita",
+            " - Barrels",
+            " - Tonnes",
+            " - Kboed",
+            " - Prices",
         ):
-            if unit.endswith(postfix_candidate):
-                unit_postfix = postfix_candidate
-                unit = unit[: -len(postfix_candidate)]
-                break
-        for postfix_candidate in (
-            " of carbon dioxide",
-            " of oil equivalent",
-            " of lithium content",
-            "1",
-            "*",
-        ):
-            if unit.endswith(postfix_candidate):
-                postfix = postfix_candidate
-                unit = unit[: -len(postfix_candidate)]
+            if type_value.endswith(postfix):
+                nice_type = type_value[: -len(postfix)]
+
+        row_index = -1
+        for index in (3, 4):
+            value = self._cell(type_index, index, 2)
+            if isinstance(value, int) and 1800 < value < 2100:
+                row_index = index
                 break
 
-        factor = 1
-        if unit.startswith("kilo"):
-            unit = unit[4:]
-            factor = 1000
-        elif unit.startswith("mega"):
-            unit = unit[4:]
-            factor = 1000000
-        elif unit.startswith("giga"):
-            unit = unit[4:]
-            factor = 1000000000
-        elif unit.startswith("tera"):
-            unit = unit[4:]
-            factor = 1000000000000
-        elif unit.startswith("peta"):
-            unit = unit[4:]
-            factor = 1000000000000000
-        elif unit.startswith("exa"):
-            unit = unit[3:]
-            factor = 1000000000000000000
-        elif unit.startswith("thousand million "):
-            unit = unit[17:]
-            factor = 1000000000
-        elif unit.startswith("thousand "):
-            unit = unit[9:]
-            factor = 1000
-        elif unit.startswith("million "):
-            unit = unit[8:]
-            factor = 1000000
-        elif unit.startswith("billion "):
-            unit = unit[8:]
-            factor = 1000000000
-        elif unit.startswith("trillion "):
-            unit = unit[9:]
-            factor = 1000000000000
-
-        if unit in self.to_iso_unit:
-            definition = self.to_iso_unit[unit]
-            unit = definition["unit"]
-            factor *= definition["factor"]
-
-        return unit + unit_postfix, postfix, factor
+        if row_index >= 0:
+            # Year
+            years = []
+            index = 2
+            while True:
+                value = self._cell(type_index, row_index, index)
+                if self._cell(type_index, row_index - 1, index) is not None:
+                    break
+                years.append({"label": value, "index": index})
+                index += 1
+
+            # Country
+            regions = []
+            index = row_index + 2
+            nb_empty_cells = 0
+            while True:
+                value = self._cell(type_index, index, 1)
+                if value is not None:
+                    nb_empty_cells = 0
+                    regions.append({"label": value, "index": index})
+                nb_empty_cells += 1
+                if nb_empty_cells > 5:
+                    break
+                index += 1
+            unit = {"original": self._cell(type_index, row_index, 1).strip()}
+            unit["normalized"] = self.normalize_unit(unit["original"])
+            iso_unit, postfix, factor = self.units.parse(unit["normalized"])
+            unit["iso"] = iso_unit
+            unit["iso_factor"] = factor
+            unit["iso_postfix"] = postfix
+            sheet_metadata = {
+                "type": type_value,
+                "label": nice_type,
+                "index": type_index,
+                "unit": unit,
+                "years": years,
+                "regions": regions,
+                "supported": True,
+                "row_index": row_index,
+            }
+        else:
+            sheet_metadata = {
+                "type": type_value,
+                "index": type_index,
+                "supported": False,
+            }
+
+        self._metadata_cache[type_index] = sheet_metadata
+        return sheet_metadata
+
+    def invalidate_metadata(self) -> None:
+        """Forget the cached layout of the sheets, it will be computed again on next use."""
+        self._metadata_cache.clear()
 
     def metadata(self) -> list[dict[str, Any]]:
         """Get the metadata."""
-        metadata: list[dict[str, Any]] = []
-        for type_index, type_value in enumerate(self.xlsx.sheetnames):
-            nice_type = type_value
-            for postfix in (
-                " - TWh",
-                " - EJ",
-                " - PJ",
-                " - Cons capita",
-                " - Barrels",
-                " - Tonnes",
-                " - Kboed",
-                " - Prices",
-            ):
-                if type_value.endswith(postfix):
-                    nice_type = type_value[: -len(postfix)]
-
-            row_index = -1
-            for index in (3, 4):
-                value = self.xlsx.worksheets[type_index].cell(index, 2).value
-                if isinstance(value, int) and 1800 < value < 2100:
-                    row_index = index
-                    break
-
-            if row_index >= 0:
-                # Year
-                years = []
-                index = 2
-                while True:
-                    value = self.xlsx.worksheets[type_index].cell(row_index, index).value
-                    if self.xlsx.worksheets[type_index].cell(row_index - 1, index).value is not None:
-                        break
-                    years.append({"label": value, "index": index})
-                    index += 1
-
-                # Country
-                regions = []
-                index = row_index + 2
-                nb_empty_cells = 0
-                while True:
-                    value = self.xlsx.worksheets[type_index].cell(index, 1).value
-                    if value is not None:
-                        nb_empty_cells = 0
-                        regions.append({"label": value, "index": index})
-                    nb_empty_cells += 1
-                    if nb_empty_cells > 5:
-                        break
-                    index += 1
-                unit = {"original": self.xlsx.worksheets[type_index].cell(row_index, 1).value.strip()}
-                unit["normalized"] = self.normalize_unit(unit["original"])
-                iso_unit, postfix, factor = self._iso_unit(unit["normalized"])
-                unit["iso"] = iso_unit
-                unit["iso_factor"] = factor
-                unit["iso_postfix"] = postfix
-                metadata.append(
-                    {
-                        "type": type_value,
-                        "label": nice_type,
-                        "index": type_index,
-                        "unit": unit,
-                        "years": years,
-                        "regions": regions,
-                        "supported": True,
-                        "row_index": row_index,
-                    },
-                )
-            else:
-                metadata.append(
-                    {
-                        "type": type_value,
-                        "index": type_index,
-                        "supported": False,
-                    },
-                )
-
-        return metadata
+        return copy.deepcopy([self._sheet_metadata(type_index) for type_index in range(len(self.sheetnames))])
 
     def datasource(
         self,
@@ -320,11 +380,20 @@ class BPDatasource:
         wikidata_type: bool = False,
         wikidata_name: bool = False,
         wikidata_properties: list[str] | None = None,
+        categorical: bool = True,
+        from_year: int | None = None,
+        to_year: int | None = None,
     ) -> pd.DataFrame:
-        """Get the Datasource as DataFrame."""
+        """
+        Get the Datasource as DataFrame.
+
+        With `categorical` the labels are categories, the `Year` a small integer and the `Value` a float,
+        else all the columns are objects.
+        The years can be limited to the inclusive range from `from_year` to `to_year`.
+        """
         if wikidata_properties is None:
             wikidata_properties = []
-        wikidata = wikidata_id or wikidata_name or wikidata_properties
+        wikidata = wikidata_id or wikidata_name or wikidata_type or wikidata_properties
 
         columns = ["Value", "Type", "Unit", "TypeUnit", "Year", "Region"]
         if wikidata:
@@ -340,74 +409,135 @@ class BPDatasource:
                     for wikidata_property in wikidata_properties
                 ],
             )
-        data_frame = pd.DataFrame(columns=columns)
-        for type_ in self.metadata():
+        types_set = set(types_filter) if types_filter is not None else None
+        regions_set = set(regions_filter) if regions_filter is not None else None
+        units_set = set(units_filter) if units_filter is not None else None
+        years_set = set(years_filter) if years_filter is not None else None
+
+        data: dict[str, list[Any]] = {column: [] for column in columns[:6]}
+        for type_index, type_type in enumerate(self.sheetnames):
+            if types_set is not None and type_type not in types_set:
+                continue
+
+            type_ = self._sheet_metadata(type_index)
             if not type_["supported"]:
                 continue
-            type_index = type_["index"]
-            type_type = type_["type"]
             type_label = type_["label"]
-            years = type_["years"]
-            regions = type_["regions"]
 
-            if types_filter is not None and type_type not in types_filter:
+            unit_definition = type_["unit"]
+            unit_postfix = ""
+            factor = 1
+            if units == "normalized":
+                unit = unit_definition["normalized"]
+            elif units == "iso":
+                unit = unit_definition["iso"]
+                factor = unit_definition["iso_factor"]
+                unit_postfix = unit_definition["iso_postfix"]
+            else:
+                unit = unit_definition["original"]
+
+            # The sheet is skipped before reading any value
+            if units_set is not None and unit not in units_set:
                 continue
 
-            for year in years:
-                if years_filter is not None and year["label"] not in years_filter:
-                    continue
-                if years_factor is not None and year["label"] % years_factor != 0:
-                    continue
-                for region in regions:
-                    if regions_filter is not None and region["label"] not in regions_filter:
-                        continue
-                    value = self.xlsx.worksheets[type_index].cell(region["index"], year["index"]).value
-                    if not isinstance(value, int) and not isinstance(value, float):
-                        continue
-
-                    unit_definition = type_["unit"]
-                    unit_postfix = ""
-                    if units == "normalized":
-                        unit = unit_definition["normalized"]
-                    elif units == "iso":
-                        unit = unit_definition["iso"]
-                        value = value * unit_definition["iso_factor"]
-                        unit_postfix = unit_definition["iso_postfix"]
-                    else:
-                        unit = unit_definition["original"]
-
-                    if units_filter is not None and unit not in units_filter:
-                        continue
-
-                    element = {
-                        "Value": value,
-                        "Year": year["label"],
-                        "Region": region["label"],
-                        "Type": type_type,
-                        "Unit": f"{unit}{unit_postfix}",
-                        "TypeUnit": f"{type_label} [{unit}]{unit_postfix}",
-                    }
-                    if wikidata:
-                        region_label = region["label"]
-                        region_label = region_label.removeprefix("Total ")
-                        element_id = self.wdds.get_region(region_label)
-                        element["WikidataType"] = element_id["type"] if element_id else None
-                        element.update(
-                            self.wdds.get_item(
-                                element_id["id"] if element_id else None,
-                                with_name=wikidata_name,
-                                with_id=wikidata_id,
-                                properties=wikidata_properties,
-                                prefix="Wikidata",
-                            ),
-                        )
-                    data_frame = pd.concat(
-                        [data_frame, pd.DataFrame({k: [v] for k, v in element.items()})],
-                        ignore_index=True,
-                    )
+            year_labels = np.array([year["label"] for year in type_["years"]])
+            years_mask = np.ones(len(year_labels), dtype=bool)
+            if years_set is not None:
+                years_mask &= np.fromiter((year in years_set for year in year_labels), bool, len(year_labels))
+            if years_factor is not None:
+                years_mask &= year_labels % years_factor == 0
+            if from_year is not None:
+                years_mask &= year_labels >= from_year
+            if to_year is not None:
+                years_mask &= year_labels <= to_year
+            region_labels = np.array([region["label"] for region in type_["regions"]], dtype=object)
+            regions_mask = np.ones(len(region_labels), dtype=bool)
+            if regions_set is not None:
+                regions_mask &= np.fromiter(
+                    (region in regions_set for region in region_labels),
+                    bool,
+                    len(region_labels),
+                )
+            year_labels = year_labels[years_mask]
+            region_labels = region_labels[regions_mask]
+            if len(year_labels) == 0 or len(region_labels) == 0:
+                continue
 
+            # The values of the sheet as a (years, regions) block, to keep the year major order,
+            # only the selected rows and columns are read
+            block = self._block(
+                type_index,
+                [
+                    region["index"]
+                    for region, selected in zip(type_["regions"], regions_mask, strict=True)
+                    if selected
+                ],
+                [
+                    year["index"]
+                    for year, selected in zip(type_["years"], years_mask, strict=True)
+                    if selected
+                ],
+            ).T
+            mask = _is_number(block).astype(bool)
+            nb_values = int(mask.sum())
+            if nb_values == 0:
+                continue
+
+            region_labels = np.tile(region_labels, len(year_labels))[mask.ravel()]
+            data["Value"].append(block[mask].astype(np.float64) * factor)
+            data["Year"].append(np.repeat(year_labels, block.shape[1])[mask.ravel()])
+            data["Region"].append(region_labels)
+            data["Type"].append(np.full(nb_values, type_type, dtype=object))
+            data["Unit"].append(np.full(nb_values, f"{unit}{unit_postfix}", dtype=object))
+            data["TypeUnit"].append(np.full(nb_values, f"{type_label} [{unit}]{unit_postfix}", dtype=object))
+
+        data_frame = pd.DataFrame(
+            {column: np.concatenate(values) if values else [] for column, values in data.items()},
+            columns=columns[:6],
+            dtype=object,
+        )
+        if wikidata:
+            region_labels = data_frame["Region"].unique()
+            regions = self.wdds.get_regions_data_frame(
+                [region_label.removeprefix("Total ") for region_label in region_labels],
+                wikidata_id=wikidata_id,
+                wikidata_name=wikidata_name,
+                wikidata_type=wikidata_type,
+                wikidata_properties=wikidata_properties,
+            )
+            regions = regions.astype(object).where(regions.notna(), None)
+            regions.index = pd.Index(region_labels)
+            data_frame = data_frame.join(regions, on="Region")[columns]
+        if categorical:
+            data_frame = compact_dtypes(data_frame, _LABEL_COLUMNS)
         return data_frame
 
+    def scan(self, units: str = "iso", categorical: bool = True) -> Scan:
+        """
+        Get a lazy query on the Datasource.
+
+        The `types`, `units`, `regions` and `years` filters and the years range select the sheets, rows and
+        columns read. The Wikidata columns `WikidataId`, `WikidataName` and `WikidataType` are only
+        looked up when they are selected.
+        """
+
+        def _collect(filters: dict[str, Any], columns: list[str] | None) -> pd.DataFrame:
+            return self.datasource(
+                types_filter=filters.get("types"),
+                regions_filter=filters.get("regions"),
+                units_filter=filters.get("units"),
+                years_filter=filters.get("years"),
+                from_year=filters.get("from_year"),
+                to_year=filters.get("to_year"),
+                units=units,
+                categorical=categorical,
+                wikidata_id=is_selected(columns, "WikidataId"),
+                wikidata_name=is_selected(columns, "WikidataName"),
+                wikidata_type=is_selected(columns, "WikidataType"),
+            )
+
+        return Scan(_collect, ["types", "units", "regions", "years", "from_year", "to_year"])
+
     def datasource_non_fossil_electricity_to_primary_energy_factor(
         self,
         from_year: int = 1900,
@@ -417,15 +547,15 @@ class BPDatasource:
             "Year": [],
             "Factor": [],
         }
-        before_2001 = self.units_sheet["B45"].value
+        before_2001 = self._cell(self.units_sheet_index, 45, 2)
         for year in range(from_year, 2001):
             data["Year"].append(year)
             data["Factor"].append(before_2001)
         for index, year in enumerate(range(2001, 2010)):
             data["Year"].append(year)
-            data["Factor"].append(self.units_sheet.cell(index + 46, 2).value)
+            data["Factor"].append(self._cell(self.units_sheet_index, index + 46, 2))
         for index, year in enumerate(range(2010, 2020)):
             data["Year"].append(year)
-            data["Factor"].append(self.units_sheet.cell(index + 45, 5).value)
+            data["Factor"].append(self._cell(self.units_sheet_index, index + 45, 5))
 
         return pd.DataFrame(data)
@@ -0,0 +1,658 @@
+"""Persistent cache of the Wikidata datasource."""
+
+import abc
+import argparse
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+# The version of the schema of the cache files, the version 1 is the nested JSON without the times
+SCHEMA_VERSION = 2
+
+# Number of levels of the section names, by top level section, e.g. `regions/name` or `fromAlias/en/Q23058`
+_SECTION_DEPTHS = {"regions": 2, "items": 1, "properties": 1, "fromAlias": 3}
+
+# The entries are evicted when there are more than the maximum number of entries plus this margin,
+# to not rewrite the JSON file on each write
+_EVICTION_MARGIN = 1.1
+
+
+def _flatten(cache: dict[str, Any]) -> Iterator[tuple[str, str, Any]]:
+    """Get the section, key and value of a nested JSON cache."""
+
+    def _walk(path: list[str], values: dict[str, Any], depth: int) -> Iterator[tuple[str, str, Any]]:
+        if depth == 0:
+            for key, value in values.items():
+                yield "/".join(path), key, value
+        else:
+            for name, sub_values in values.items():
+                yield from _walk([*path, name], sub_values, depth - 1)
+
+    for name, values in cache.items():
+        yield from _walk([name], values, _SECTION_DEPTHS.get(name, 1) - 1)
+
+
+def _nest(values: Iterator[tuple[str, str, Any]]) -> dict[str, Any]:
+    """Get the nested JSON cache from the section, key and value."""
+    cache: dict[str, Any] = {}
+    for section, key, value in values:
+        section_values = cache
+        for name in section.split("/"):
+            section_values = section_values.setdefault(name, {})
+        section_values[key] = value
+    return cache
+
+
+@dataclass
+class CachePolicy:
+    """
+    The expiration and the eviction of the cache entries.
+
+    The `ttl` are in seconds, by section, e.g. `regions/name`, or by top level section, e.g. `items`.
+    The `negative_ttl` is for the `None` values, e.g. the unknown regions. On eviction, only the
+    `max_entries` most recently used entries are kept.
+    """
+
+    ttl: dict[str, float] = field(default_factory=dict)
+    negative_ttl: float | None = None
+    max_entries: int | None = None
+
+    def expired(self, section: str, value: Any, written: float, now: float) -> bool:
+        """Check if an entry is expired."""
+        ttl = self.ttl.get(section, self.ttl.get(section.partition("/")[0]))
+        if value is None and self.negative_ttl is not None:
+            ttl = self.negative_ttl if ttl is None else min(ttl, self.negative_ttl)
+        return ttl is not None and now - written > ttl
+
+    def retained(
+        self,
+        entries: Iterable[tuple[str, str, Any, float, float]],
+        now: float,
+    ) -> set[tuple[str, str]]:
+        """Get the section and key of the entries to keep, the not expired and the most recently used ones."""
+        kept = [
+            (used, (section, key))
+            for section, key, value, written, used in entries
+            if not self.expired(section, value, written, now)
+        ]
+        if self.max_entries is not None and len(kept) > self.max_entries:
+            kept.sort(key=lambda entry: entry[0], reverse=True)
+            kept = kept[: self.max_entries]
+        return {key for _, key in kept}
+
+
+def _encode(value: Any) -> str:
+    """Get the compact JSON text of a value."""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+@contextmanager
+def _file_lock(path: Path, shared: bool = False) -> Iterator[None]:
+    """Hold an exclusive, or a shared, lock on a lock file."""
+    with path.open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class CacheBackend(abc.ABC):
+    """
+    Base class of the persistent cache backends, the values are stored by section and key.
+
+    Each entry has the time where it was written and the time where it was last used.
+    """
+
+    # The prefix of the lock files of the fetching of the missing entries, shared by the processes
+    fetch_lock_prefix: str | None = None
+
+    def __init__(self, policy: CachePolicy | None = None) -> None:
+        """Initialize the backend."""
+        self.policy = policy if policy is not None else CachePolicy()
+        self._fetch_locks: dict[str, threading.RLock] = {}
+        self._fetch_depths: dict[str, int] = {}
+        self._fetch_locks_lock = threading.Lock()
+
+    @contextmanager
+    def fetch_lock(self, section: str) -> Iterator[None]:
+        """
+        Lock the fetching of the missing entries of a section, across the processes and the threads.
+
+        The entries written by the previous holder are visible once the lock is acquired. The lock is reentrant,
+        and the fetching of the other sections isn't blocked.
+        """
+        with self._fetch_locks_lock:
+            thread_lock = self._fetch_locks.setdefault(section, threading.RLock())
+        with thread_lock:
+            depth = self._fetch_depths[section] = self._fetch_depths.get(section, 0) + 1
+            try:
+                if depth == 1 and self.fetch_lock_prefix is not None:
+                    with _file_lock(Path(f"{self.fetch_lock_prefix}.{section.replace('/', '-')}.lock")):
+                        yield
+                else:
+                    yield
+            finally:
+                self._fetch_depths[section] -= 1
+
+    @abc.abstractmethod
+    def get_entry(self, section: str, key: str) -> tuple[Any, float]:
+        """Get a value and its written time, raise a `KeyError` if it's not in the cache or expired."""
+
+    def get(self, section: str, key: str) -> Any:
+        """Get a value, raise a `KeyError` if it's not in the cache or expired."""
+        return self.get_entry(section, key)[0]
+
+    @abc.abstractmethod
+    def write(self, values: dict[tuple[str, str], Any]) -> None:
+        """Write the given values, by section and key."""
+
+    @abc.abstractmethod
+    def touch(self, used: dict[tuple[str, str], float]) -> None:
+        """Set the last used time of the entries, by section and key."""
+
+    @abc.abstractmethod
+    def entries(self) -> Iterator[tuple[str, str, Any, float, float]]:
+        """Get all the section, key, value, written time and used time."""
+
+    def items(self) -> Iterator[tuple[str, str, Any]]:
+        """Get all the section, key and value."""
+        for section, key, value, _, _ in self.entries():
+            yield section, key, value
+
+    @abc.abstractmethod
+    def size(self) -> int:
+        """Get the number of entries."""
+
+    @abc.abstractmethod
+    def evict(self) -> None:
+        """Remove the expired entries and the least recently used ones over the maximum number of entries."""
+
+    def compact(self) -> None:
+        """Evict the entries and compact the storage."""
+        self.evict()
+
+    def _needs_eviction(self, size: int) -> bool:
+        return self.policy.max_entries is not None and size > self.policy.max_entries * _EVICTION_MARGIN
+
+
+class JsonCacheBackend(CacheBackend):
+    """
+    Cache stored in a nested JSON file, with an append-only journal.
+
+    The changed keys are appended to the journal `<file>.log`, one JSON line by value, under a file lock,
+    the files are read under a shared lock, to not read them while another process compacts them.
+    The journal is merged in the JSON file when it becomes bigger than it, or with `compact`.
+    The JSON file has the schema version, the nested values, and the written and used times by section and
+    key. The files of the version 1, with only the nested values, are still read, the entries get the time of
+    the file. The values are kept in memory as compact JSON texts, decoded on each get.
+    """
+
+    def __init__(self, path: str | Path, policy: CachePolicy | None = None) -> None:
+        """Initialize the backend."""
+        super().__init__(policy)
+        self.path = Path(path)
+        self.log_path = Path(f"{path}.log")
+        self.lock_path = Path(f"{path}.lock")
+        self.fetch_lock_prefix = f"{path}.fetch"
+        # The JSON text of the values
+        self._values: dict[tuple[str, str], str] | None = None
+        self._times: dict[tuple[str, str], list[float]] = {}
+        self._base_mtime: int | None = None
+        self._log_offset = 0
+
+    def _load(self, cache: dict[str, Any], file_time: float) -> None:
+        """Load the content of the JSON file."""
+        assert self._values is not None
+        if "schema" not in cache:
+            cache = {"schema": 1, "values": cache, "times": {}}
+        if cache["schema"] > SCHEMA_VERSION:
+            message = f"Unsupported cache schema version {cache['schema']} in {self.path}"
+            raise ValueError(message)
+        for section, key, value in _flatten(cache["values"]):
+            self._values[section, key] = _encode(value)
+            self._times[section, key] = list(cache["times"].get(section, {}).get(key, (file_time, file_time)))
+
+    def _refresh(self) -> dict[tuple[str, str], str]:
+        """Load the file, then the new lines of the journal, including the ones written by other processes."""
+        base_mtime = self.path.stat().st_mtime_ns if self.path.exists() else None
+        log_stat = self.log_path.stat() if self.log_path.exists() else None
+        log_size = log_stat.st_size if log_stat is not None else 0
+        if self._values is None or base_mtime != self._base_mtime or log_size < self._log_offset:
+            self._values = {}
+            self._times = {}
+            if base_mtime is not None:
+                with self.path.open(encoding="utf-8") as file:
+                    self._load(json.load(file), base_mtime / 1e9)
+            self._base_mtime = base_mtime
+            self._log_offset = 0
+        if log_stat is not None and log_size > self._log_offset:
+            with self.log_path.open("rb") as log_file:
+                log_file.seek(self._log_offset)
+                for line in log_file:
+                    # Ignore a line that is not yet completely written
+                    if not line.endswith(b"\n"):
+                        break
+                    self._log_offset += len(line)
+                    entry = json.loads(line)
+                    if isinstance(entry, dict):
+                        # Used time
+                        times = self._times.get((entry["section"], entry["key"]))
+                        if times is not None:
+                            times[1] = max(times[1], entry["used"])
+                        continue
+                    # The lines of the version 1 have no time
+                    section, key, value, *written = entry
+                    written_time = written[0] if written else log_stat.st_mtime
+                    self._values[section, key] = _encode(value)
+                    self._times[section, key] = [written_time, written_time]
+        return self._values
+
+    def _read(self) -> dict[tuple[str, str], str]:
+        """Refresh the values under the shared lock."""
+        with _file_lock(self.lock_path, shared=True):
+            return self._refresh()
+
+    def get_entry(self, section: str, key: str) -> tuple[Any, float]:
+        """Get a value and its written time, raise a `KeyError` if it's not in the cache or expired."""
+        values = self._values if self._values is not None else self._read()
+        if (section, key) not in values:
+            values = self._read()
+        value = json.loads(values[section, key])
+        written = self._times[section, key][0]
+        if self.policy.expired(section, value, written, time.time()):
+            raise KeyError((section, key))
+        return value, written
+
+    def _append(self, lines: str) -> None:
+        with _file_lock(self.lock_path):
+            with self.log_path.open("a", encoding="utf-8") as log_file:
+                log_file.write(lines)
+            values = self._refresh()
+            if self._log_offset > (
+                self.path.stat().st_size if self.path.exists() else 0
+            ) or self._needs_eviction(len(values)):
+                self._compact()
+
+    def write(self, values: dict[tuple[str, str], Any]) -> None:
+        """Append the given values to the journal."""
+        now = time.time()
+        self._append(
+            "".join(
+                json.dumps([section, key, value, now], ensure_ascii=False) + "\n"
+                for (section, key), value in values.items()
+            ),
+        )
+
+    def touch(self, used: dict[tuple[str, str], float]) -> None:
+        """Append the used times to the journal."""
+        self._append(
+            "".join(
+                json.dumps({"section": section, "key": key, "used": used_time}, ensure_ascii=False) + "\n"
+                for (section, key), used_time in used.items()
+            ),
+        )
+
+    def _entries(self) -> list[tuple[str, str, str, float, float]]:
+        """Get all the section, key, JSON text of the value, written time and used time, as loaded."""
+        assert self._values is not None
+        return [
+            (section, key, value, self._times[section, key][0], self._times[section, key][1])
+            for (section, key), value in self._values.items()
+        ]
+
+    def entries(self) -> Iterator[tuple[str, str, Any, float, float]]:
+        """Get all the section, key, value, written time and used time."""
+        with _file_lock(self.lock_path, shared=True):
+            self._refresh()
+            entries = self._entries()
+        for section, key, value, written, used in entries:
+            yield section, key, json.loads(value), written, used
+
+    def size(self) -> int:
+        """Get the number of entries."""
+        return len(self._read())
+
+    def _compact(self) -> None:
+        retained = self.policy.retained(
+            (
+                (section, key, json.loads(value), written, used)
+                for section, key, value, written, used in self._entries()
+            ),
+            time.time(),
+        )
+        assert self._values is not None
+        self._values = {key: value for key, value in self._values.items() if key in retained}
+        self._times = {key: self._times[key] for key in self._values}
+        times: dict[str, dict[str, list[float]]] = {}
+        for (section, key), entry_times in self._times.items():
+            times.setdefault(section, {})[key] = entry_times
+        cache = {
+            "schema": SCHEMA_VERSION,
+            "values": _nest(
+                (section, key, json.loads(value)) for (section, key), value in self._values.items()
+            ),
+            "times": times,
+        }
+        new_path = Path(f"{self.path}.new")
+        with new_path.open("w", encoding="utf-8") as file:
+            file.write(json.dumps(cache, indent=2))
+        new_path.replace(self.path)
+        self.log_path.unlink(missing_ok=True)
+        self._base_mtime = self.path.stat().st_mtime_ns
+        self._log_offset = 0
+
+    def evict(self) -> None:
+        """Rewrite the JSON file without the expired and the least recently used entries."""
+        with _file_lock(self.lock_path):
+            self._refresh()
+            self._compact()
+
+    def compact(self) -> None:
+        """Merge the journal in the JSON file, without the expired and the least recently used entries."""
+        self.evict()
+
+
+class SqliteCacheBackend(CacheBackend):
+    """Cache stored in a SQLite database in WAL mode, each write is a transaction."""
+
+    def __init__(self, path: str | Path, policy: CachePolicy | None = None) -> None:
+        """Initialize the backend, the database of the version 1 is migrated, the entries get the current time."""
+        super().__init__(policy)
+        self.path = Path(path)
+        self.fetch_lock_prefix = f"{path}.fetch"
+        self._local = threading.local()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(section TEXT NOT NULL, key TEXT NOT NULL, value TEXT, written REAL, used REAL, "
+                "PRIMARY KEY (section, key))",
+            )
+            schema = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            if schema > SCHEMA_VERSION:
+                message = f"Unsupported cache schema version {schema} in {self.path}"
+                raise ValueError(message)
+            if schema < SCHEMA_VERSION:
+                columns = {row[1] for row in self.connection.execute("PRAGMA table_info(cache)")}
+                for column in ("written", "used"):
+                    if column not in columns:
+                        self.connection.execute(f"ALTER TABLE cache ADD COLUMN {column} REAL")
+                now = time.time()
+                self.connection.execute(
+                    "UPDATE cache SET written = ?, used = ? WHERE written IS NULL", (now, now)
+                )
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """Get the connection of the current thread, a connection can't be shared by the threads."""
+        connection: sqlite3.Connection | None = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(self.path, timeout=60)
+        return connection
+
+    def get_entry(self, section: str, key: str) -> tuple[Any, float]:
+        """Get a value and its written time, raise a `KeyError` if it's not in the cache or expired."""
+        row = self.connection.execute(
+            "SELECT value, written FROM cache WHERE section = ? AND key = ?",
+            (section, key),
+        ).fetchone()
+        if row is None:
+            raise KeyError((section, key))
+        value = json.loads(row[0])
+        if self.policy.expired(section, value, row[1], time.time()):
+            raise KeyError((section, key))
+        return value, row[1]
+
+    def write(self, values: dict[tuple[str, str], Any]) -> None:
+        """Write the given values in one transaction."""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache (section, key, value, written, used) VALUES (?, ?, ?, ?, ?)",
+                [(section, key, json.dumps(value), now, now) for (section, key), value in values.items()],
+            )
+        if self._needs_eviction(self.size()):
+            self.evict()
+
+    def touch(self, used: dict[tuple[str, str], float]) -> None:
+        """Set the last used time of the entries in one transaction."""
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE cache SET used = MAX(used, ?) WHERE section = ? AND key = ?",
+                [(used_time, section, key) for (section, key), used_time in used.items()],
+            )
+
+    def entries(self) -> Iterator[tuple[str, str, Any, float, float]]:
+        """Get all the section, key, value, written time and used time."""
+        for section, key, value, written, used in self.connection.execute(
+            "SELECT section, key, value, written, used FROM cache",
+        ):
+            yield section, key, json.loads(value), written, used
+
+    def size(self) -> int:
+        """Get the number of entries."""
+        return int(self.connection.execute("SELECT COUNT(*) FROM cache").fetchone()[0])
+
+    def evict(self) -> None:
+        """Delete the expired and the least recently used entries."""
+        entries = list(self.entries())
+        retained = self.policy.retained(entries, time.time())
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM cache WHERE section = ? AND key = ?",
+                [(section, key) for section, key, *_ in entries if (section, key) not in retained],
+            )
+
+    def compact(self) -> None:
+        """Delete the expired and the least recently used entries, checkpoint the WAL and vacuum the database."""
+        self.evict()
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.connection.execute("VACUUM")
+
+
+def open_backend(path: str | Path, policy: CachePolicy | None = None) -> CacheBackend:
+    """Get the backend of the cache file, SQLite for the `.sqlite`, `.sqlite3` and `.db` files, else JSON."""
+    if Path(path).suffix in (".sqlite", ".sqlite3", ".db"):
+        return SqliteCacheBackend(path, policy)
+    return JsonCacheBackend(path, policy)
+
+
+def import_json(json_path: str | Path, backend: CacheBackend) -> None:
+    """Import a nested JSON cache file, e.g. an existing `.wikidata-cache.json`, in a backend."""
+    with Path(json_path).open(encoding="utf-8") as file:
+        cache = json.load(file)
+    if "schema" in cache:
+        cache = cache["values"]
+    backend.write({(section, key): value for section, key, value in _flatten(cache)})
+
+
+class CacheSection:
+    """
+    A section of the in-memory tier of the cache, the values are loaded from the backend on first access.
+
+    The expired values are loaded again, and the used keys are recorded when the entries are evicted.
+    """
+
+    def __init__(self, cache: "Cache", name: str) -> None:
+        """Initialize the section."""
+        self.cache = cache
+        self.name = name
+        self.values: dict[str, Any] = {}
+        self.written: dict[str, float] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        """Get a value, raise a `KeyError` if it's not in the cache or expired."""
+        policy = self.cache.backend.policy
+        now = time.time()
+        if key in self.values and policy.expired(self.name, self.values[key], self.written[key], now):
+            self.cache.forget(self.name, key)
+        if key in self.values:
+            self.cache.stats.hits += 1
+            value = self.values[key]
+        else:
+            self.cache.stats.misses += 1
+            if (self.name, key) in self.cache.dirty:
+                # Evicted before the flush
+                value, written = self.cache.dirty[self.name, key], now
+            else:
+                value, written = self.cache.backend.get_entry(self.name, key)
+            self.values[key] = value
+            self.written[key] = written
+        self.cache.remember(self.name, key)
+        if policy.max_entries is not None:
+            self.cache.used[self.name, key] = now
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        """Check if the key is in the cache."""
+        if not isinstance(key, str):
+            return False
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Get a value, or the default if it's not in the cache."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        """Set a value, it will be written on the next flush."""
+        self.values[key] = value
+        self.written[key] = time.time()
+        self.cache.dirty[self.name, key] = value
+        self.cache.remember(self.name, key)
+
+
+@dataclass
+class CacheStats:
+    """Counters of the in-memory tier of the cache."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+class Cache:
+    """
+    The Wikidata cache, by section, only the changed keys are written in the backend.
+
+    The decoded values are kept in memory, the least recently used ones are evicted when there are more
+    than `memory_size` entries, then loaded again from the backend.
+    """
+
+    def __init__(self, backend: CacheBackend, memory_size: int | None = None) -> None:
+        """Initialize the cache, without bound on the entries in memory if `memory_size` is `None`."""
+        self.backend = backend
+        self.memory_size = memory_size
+        self.sections: dict[str, CacheSection] = {}
+        self.dirty: dict[tuple[str, str], Any] = {}
+        self.used: dict[tuple[str, str], float] = {}
+        self.stats = CacheStats()
+        # The keys in memory, the least recently used first
+        self._recent: OrderedDict[tuple[str, str], None] = OrderedDict()
+
+    def section(self, name: str) -> CacheSection:
+        """Get a section, e.g. `regions/name`."""
+        if name not in self.sections:
+            self.sections[name] = CacheSection(self, name)
+        return self.sections[name]
+
+    def remember(self, section: str, key: str) -> None:
+        """Mark a key in memory as the most recently used one, and evict the least recently used ones."""
+        if self.memory_size is None:
+            return
+        self._recent[section, key] = None
+        self._recent.move_to_end((section, key))
+        while len(self._recent) > self.memory_size:
+            evicted_section, evicted_key = self._recent.popitem(last=False)[0]
+            self.forget(evicted_section, evicted_key)
+            self.stats.evictions += 1
+
+    def forget(self, section: str, key: str) -> None:
+        """Remove a key from memory, a changed value is still written on the next flush."""
+        self.sections[section].values.pop(key, None)
+        self.sections[section].written.pop(key, None)
+        self._recent.pop((section, key), None)
+
+    def flush(self) -> None:
+        """Write the changed keys and the used times in the backend."""
+        if self.dirty:
+            dirty, self.dirty = self.dirty, {}
+            self.backend.write(dirty)
+        if self.used:
+            used, self.used = self.used, {}
+            self.backend.touch(used)
+
+
+def _section_ttl(value: str) -> tuple[str, float]:
+    """Parse a `<section>=<seconds>` argument."""
+    section, _, ttl = value.partition("=")
+    return section, float(ttl)
+
+
+def main() -> None:
+    """Manage the Wikidata cache files."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a JSON cache file in a cache file")
+    import_parser.add_argument("json_file", help="The JSON cache file to import")
+    import_parser.add_argument(
+        "cache_file",
+        nargs="?",
+        default=os.environ.get("WIKIDATA_CACHE_FILE", ".wikidata-cache.json"),
+        help="The destination cache file, e.g. .wikidata-cache.sqlite",
+    )
+    compact_parser = subparsers.add_parser("compact", help="Compact a cache file")
+    compact_parser.add_argument(
+        "cache_file",
+        nargs="?",
+        default=os.environ.get("WIKIDATA_CACHE_FILE", ".wikidata-cache.json"),
+        help="The cache file",
+    )
+    compact_parser.add_argument(
+        "--ttl",
+        type=_section_ttl,
+        action="append",
+        default=[],
+        help="Remove the entries of a section older than the given seconds, e.g. `items=2592000`",
+    )
+    compact_parser.add_argument(
+        "--negative-ttl",
+        type=float,
+        help="Remove the `None` entries, like the unknown regions, older than the given seconds",
+    )
+    compact_parser.add_argument(
+        "--max-entries",
+        type=int,
+        help="Keep only the given number of most recently used entries",
+    )
+    args = parser.parse_args()
+
+    if args.command == "import":
+        import_json(args.json_file, open_backend(args.cache_file))
+    else:
+        open_backend(
+            args.cache_file,
+            CachePolicy(dict(args.ttl), args.negative_ttl, args.max_entries),
+        ).compact()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Offline gazetteer of the regions.
+
+The regions are stored with their Wikidata id, label and type in a binary index, with a hash table of the
+normalized names and one of the ISO 3166-1 codes. The index is read with `mmap`, then it's opened without
+parsing and the lookups don't need any Wikidata query.
+"""
+
+import json
+import mmap
+import re
+import struct
+import unicodedata
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+FORMAT_VERSION = 1
+DEFAULT_FILE = Path(__file__).with_name("gazetteer.bin")
+
+_MAGIC = b"SPGZ"
+# Magic, format version, length of the JSON metadata
+_HEADER = struct.Struct("<4sHI")
+# Offset of the id, offset of the label, length of the id, length of the label, type number
+_REGION = struct.Struct("<IIHHB")
+# Hash of the key, offset of the key, length of the key, region number + 1 (0 for an empty slot)
+_SLOT = struct.Struct("<IIHI")
+
+# The priorities of the names, a resolved name wins over a label, which wins over an alias
+PRIORITY_RESOLVED = 0
+PRIORITY_LABEL = 1
+PRIORITY_ALIAS = 2
+
+_ISO_3166_1_ALPHA_2 = "ISO 3166-1 alpha-2 code"
+
+
+def normalize_name(name: str) -> str:
+    """Get the key of a region name: without accents, case and punctuation, and with `&` as `and`."""
+    name = "".join(
+        char for char in unicodedata.normalize("NFKD", name) if not unicodedata.combining(char)
+    ).casefold()
+    return " ".join(re.sub(r"\W+", " ", name.replace("&", " and ")).split())
+
+
+@dataclass
+class GazetteerRegion:
+    """A region to write in the gazetteer."""
+
+    id: str
+    label: str
+    type: str
+    # The priority by name
+    names: dict[str, int] = field(default_factory=dict)
+    codes: set[str] = field(default_factory=set)
+
+    def add_name(self, name: str, priority: int) -> None:
+        """Add a name, keeping the best priority."""
+        self.names[name] = min(priority, self.names.get(name, priority))
+
+
+def merge_regions(*sources: dict[str, GazetteerRegion]) -> dict[str, GazetteerRegion]:
+    """Merge the regions by id, the label and the type are taken from the first source."""
+    result: dict[str, GazetteerRegion] = {}
+    for regions in sources:
+        for region_id, region in regions.items():
+            if region_id not in result:
+                result[region_id] = GazetteerRegion(region.id, region.label, region.type)
+            merged = result[region_id]
+            for name, priority in region.names.items():
+                merged.add_name(name, priority)
+            merged.codes |= region.codes
+    return result
+
+
+def regions_from_cache(values: Iterable[tuple[str, str, Any]]) -> dict[str, GazetteerRegion]:
+    """
+    Get the regions resolved in a Wikidata cache, from the section, key and value of the cache backend.
+
+    The resolved names and codes are kept, with the ISO 3166-1 alpha-2 codes of the cached items.
+    """
+    regions: dict[str, GazetteerRegion] = {}
+    alpha_2_codes: dict[str, str] = {}
+    for section, key, value in values:
+        if section == "items" and value and value.get(_ISO_3166_1_ALPHA_2):
+            alpha_2_codes[key] = value[_ISO_3166_1_ALPHA_2]
+        if section not in ("regions/name", "regions/code") or not value:
+            continue
+        region = regions.setdefault(value["id"], GazetteerRegion(value["id"], value["label"], value["type"]))
+        region.add_name(value["label"], PRIORITY_LABEL)
+        if section == "regions/name":
+            region.add_name(key, PRIORITY_RESOLVED)
+        else:
+            region.codes.add(key)
+    for region_id, code in alpha_2_codes.items():
+        if region_id in regions:
+            regions[region_id].codes.add(code)
+    return regions
+
+
+def add_iso_3166(regions: dict[str, GazetteerRegion], iso_3166: dict[str, Any]) -> None:
+    """
+    Add the ISO 3166 codes and names to the regions that have one of the codes.
+
+    The `iso_3166` is in the format of the `iso_3166-1.json` or `iso_3166-2.json` file of the Debian
+    `iso-codes` package, the subdivisions like the Swiss cantons are found by their ISO 3166-2 code.
+    """
+    by_code = {code: region for region in regions.values() for code in region.codes}
+    for country in iso_3166.get("3166-1", []):
+        region = by_code.get(country["alpha_3"], by_code.get(country["alpha_2"]))
+        if region is None:
+            continue
+        region.codes |= {country["alpha_2"], country["alpha_3"], country["numeric"]}
+        for name_key in ("name", "official_name", "common_name"):
+            if name_key in country:
+                region.add_name(country[name_key], PRIORITY_ALIAS)
+    for subdivision in iso_3166.get("3166-2", []):
+        region = by_code.get(subdivision["code"])
+        if region is not None:
+            region.add_name(subdivision["name"], PRIORITY_ALIAS)
+
+
+class _StringsBuilder:
+    """Build the strings blob of the index, each string is stored once."""
+
+    def __init__(self) -> None:
+        self.data = bytearray()
+        self._offsets: dict[str, int] = {}
+
+    def add(self, value: str) -> tuple[int, int]:
+        """Get the offset and the length of an encoded string."""
+        encoded = value.encode()
+        if value not in self._offsets:
+            self._offsets[value] = len(self.data)
+            self.data += encoded
+        return self._offsets[value], len(encoded)
+
+
+def _hash_table(keys: dict[str, int], strings: _StringsBuilder) -> tuple[bytes, int]:
+    """Get an open addressing hash table of the keys to the region numbers, and its number of slots."""
+    slots = 8
+    while slots < len(keys) * 2:
+        slots *= 2
+    table = bytearray(slots * _SLOT.size)
+    for key, region in keys.items():
+        encoded = key.encode()
+        key_hash = zlib.crc32(encoded)
+        slot = key_hash & (slots - 1)
+        while _SLOT.unpack_from(table, slot * _SLOT.size)[3] != 0:
+            slot = (slot + 1) & (slots - 1)
+        offset, length = strings.add(key)
+        _SLOT.pack_into(table, slot * _SLOT.size, key_hash, offset, length, region + 1)
+    return bytes(table), slots
+
+
+def write_gazetteer(
+    path: str | Path,
+    regions: Iterable[GazetteerRegion],
+    version: str,
+    types: list[str],
+) -> None:
+    """
+    Write the gazetteer index.
+
+    The `types` are in the order of precedence: a name or a code of many regions gets the region with the
+    best name priority, then with the first type, then with the smallest id.
+    """
+    type_numbers = {type_: number for number, type_ in enumerate(types)}
+    sorted_regions = sorted(
+        regions,
+        key=lambda region: (type_numbers.get(region.type, len(types)), int(region.id[1:])),
+    )
+    all_types = list(dict.fromkeys([*types, *(region.type for region in sorted_regions)]))
+    type_numbers = {type_: number for number, type_ in enumerate(all_types)}
+
+    names: dict[str, tuple[int, int]] = {}
+    codes: dict[str, int] = {}
+    for number, region in enumerate(sorted_regions):
+        for name, priority in region.names.items():
+            key = normalize_name(name)
+            if key and (key not in names or priority < names[key][0]):
+                names[key] = (priority, number)
+        for code in region.codes:
+            codes.setdefault(code, number)
+
+    strings = _StringsBuilder()
+    regions_data = bytearray()
+    for region in sorted_regions:
+        id_offset, id_length = strings.add(region.id)
+        label_offset, label_length = strings.add(region.label)
+        regions_data += _REGION.pack(
+            id_offset, label_offset, id_length, label_length, type_numbers[region.type]
+        )
+    names_data, names_slots = _hash_table({key: number for key, (_, number) in names.items()}, strings)
+    codes_data, codes_slots = _hash_table(codes, strings)
+
+    # The offsets are relative to the end of the metadata
+    metadata = json.dumps(
+        {
+            "version": version,
+            "types": all_types,
+            "regions": [0, len(sorted_regions)],
+            "names": [len(regions_data), names_slots],
+            "codes": [len(regions_data) + len(names_data), codes_slots],
+            "strings": len(regions_data) + len(names_data) + len(codes_data),
+        },
+    ).encode()
+    path = Path(path)
+    new_path = Path(f"{path}.new")
+    with new_path.open("wb") as file:
+        file.write(_HEADER.pack(_MAGIC, FORMAT_VERSION, len(metadata)))
+        file.write(metadata)
+        for data in (regions_data, names_data, codes_data, strings.data):
+            file.write(data)
+    new_path.replace(path)
+
+
+class Gazetteer:
+    """
+    Read only gazetteer index, the regions are returned as by `WikidataDatasource.get_region`.
+
+    The file is mapped in memory, only the looked up slots and strings are read.
+    """
+
+    def __init__(self, path: str | Path = DEFAULT_FILE) -> None:
+        """Open the gazetteer index, the bundled one by default."""
+        self.path = Path(path)
+        with self.path.open("rb") as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, metadata_length = _HEADER.unpack_from(self._data)
+        if magic != _MAGIC or format_version != FORMAT_VERSION:
+            message = f"Unsupported gazetteer file: {self.path}"
+            raise ValueError(message)
+        metadata = json.loads(self._data[_HEADER.size : _HEADER.size + metadata_length])
+        start = _HEADER.size + metadata_length
+        self.version: str = metadata["version"]
+        self.types: list[str] = metadata["types"]
+        self._regions_offset = start + metadata["regions"][0]
+        self._size: int = metadata["regions"][1]
+        self._names = (start + metadata["names"][0], metadata["names"][1])
+        self._codes = (start + metadata["codes"][0], metadata["codes"][1])
+        self._strings = start + metadata["strings"]
+
+    def close(self) -> None:
+        """Close the memory map."""
+        self._data.close()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _string(self, offset: int, length: int) -> str:
+        return self._data[self._strings + offset : self._strings + offset + length].decode()
+
+    def _region(self, number: int) -> dict[str, str]:
+        id_offset, label_offset, id_length, label_length, type_number = _REGION.unpack_from(
+            self._data, self._regions_offset + number * _REGION.size
+        )
+        region_id = self._string(id_offset, id_length)
+        return {
+            "id": region_id,
+            "url": f"http://www.wikidata.org/entity/{region_id}",
+            "label": self._string(label_offset, label_length),
+            "type": self.types[type_number],
+        }
+
+    def _find(self, table: tuple[int, int], key: str) -> int | None:
+        """Get the region number of a key in a hash table."""
+        table_offset, slots = table
+        encoded = key.encode()
+        key_hash = zlib.crc32(encoded)
+        slot = key_hash & (slots - 1)
+        while True:
+            slot_hash, key_offset, key_length, region = _SLOT.unpack_from(
+                self._data, table_offset + slot * _SLOT.size
+            )
+            if region == 0:
+                return None
+            if (
+                slot_hash == key_hash
+                and key_length == len(encoded)
+                and self._data[self._strings + key_offset : self._strings + key_offset + key_length]
+                == encoded
+            ):
+                return region - 1
+            slot = (slot + 1) & (slots - 1)
+
+    def get_by_code(self, code: str) -> dict[str, str] | None:
+        """Get a region by ISO 3166-1 alpha-2, alpha-3 or numeric code."""
+        number = self._find(self._codes, code)
+        return None if number is None else self._region(number)
+
+    def get_by_name(self, name: str) -> dict[str, str] | None:
+        """Get a region by name, label or alias, compared normalized."""
+        number = self._find(self._names, normalize_name(name))
+        return None if number is None else self._region(number)
+
+    def get_region(self, name: str | None, code: str | None = None) -> dict[str, str] | None:
+        """
+        Get a region from a name and a code, as resolved by Wikidata.
+
+        The code is used first, then the name as an alpha-2 or alpha-3 code, then the name.
+        """
+        if code:
+            region = self.get_by_code(code)
+            if region is not None:
+                return region
+        if not name:
+            return None
+        if len(name) in (2, 3) and name.isalpha():
+            region = self.get_by_code(name)
+            if region is not None:
+                return region
+        return self.get_by_name(name)
+
+    def names(self) -> Iterator[tuple[str, dict[str, str]]]:
+        """Get all the normalized names with their region."""
+        table_offset, slots = self._names
+        for slot in range(slots):
+            _, key_offset, key_length, region = _SLOT.unpack_from(
+                self._data, table_offset + slot * _SLOT.size
+            )
+            if region != 0:
+                yield self._string(key_offset, key_length), self._region(region - 1)
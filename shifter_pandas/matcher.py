@@ -0,0 +1,152 @@
+"""Fuzzy matching of the region labels on the names of the gazetteer."""
+
+from collections.abc import Iterable, Sequence
+
+import numpy as np
+
+from shifter_pandas.gazetteer import Gazetteer, normalize_name
+
+# The prefixes of the aggregates that are a region
+_REMOVED_PREFIXES = ("total ",)
+# The prefixes of the aggregates that are not a region, like `Other Europe` or `Non-OECD`
+_UNMATCHED_PREFIXES = ("other ", "of which ", "non ")
+# The abbreviations, by normalized word
+_ABBREVIATIONS = {
+    "cent": "central",
+    "dem": "democratic",
+    "e": "east",
+    "fed": "federation",
+    "is": "islands",
+    "n": "north",
+    "rep": "republic",
+    "s": "south",
+    "st": "saint",
+    "w": "west",
+}
+# The words that don't need to be in the matched name
+_STOP_WORDS = frozenset(("and", "of", "the"))
+
+
+def clean_label(label: str) -> str | None:
+    """
+    Get the normalized name to match of a label, `None` for a label of an aggregate that's not a region.
+
+    The prefixes like `Total ` are removed and the abbreviations like `S. & Cent.` are expanded.
+    """
+    name = normalize_name(label)
+    for prefix in _REMOVED_PREFIXES:
+        name = name.removeprefix(prefix)
+    if not name or name.startswith(_UNMATCHED_PREFIXES):
+        return None
+    return " ".join(_ABBREVIATIONS.get(word, word) for word in name.split())
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f" {name} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def _dice(first: set[str], second: set[str]) -> float:
+    return 2 * len(first & second) / (len(first) + len(second))
+
+
+def _similar_words(first: str, second: str, threshold: float) -> bool:
+    """Get if two words are similar, or if one is the beginning of the other, like `east` and `eastern`."""
+    shortest, longest = sorted((first, second), key=len)
+    return (len(shortest) >= 3 and longest.startswith(shortest)) or _dice(
+        _trigrams(first), _trigrams(second)
+    ) >= threshold
+
+
+class RegionMatcher:
+    """
+    Fuzzy matcher of the region labels with a trigram index.
+
+    The score is the Dice coefficient of the trigrams of the cleaned label and of a name, 1 for an exact match.
+    Each word of the label, except the stop words, should also be in the name, or be similar to one of its
+    words, to not match a name that covers only a part of the label, like `Central America` for
+    `S. & Cent. America`.
+    """
+
+    def __init__(
+        self,
+        names: Iterable[tuple[str, dict[str, str]]],
+        types: Sequence[str] = (),
+        threshold: float = 0.7,
+    ) -> None:
+        """
+        Build the index of the names with their region.
+
+        On equal scores, the regions of the first `types` are preferred.
+        """
+        self.threshold = threshold
+        type_numbers = {type_: number for number, type_ in enumerate(types)}
+        entries = sorted(
+            ((normalize_name(name), region) for name, region in names),
+            key=lambda entry: (type_numbers.get(entry[1]["type"], len(types)), entry[0]),
+        )
+        self._names = [name for name, _ in entries]
+        self._regions = [region for _, region in entries]
+        self._exact: dict[str, int] = {}
+        for number, name in enumerate(self._names):
+            self._exact.setdefault(name, number)
+
+        postings: dict[str, list[int]] = {}
+        lengths = []
+        for number, name in enumerate(self._names):
+            trigrams = _trigrams(name)
+            lengths.append(len(trigrams))
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(number)
+        self._postings = {trigram: np.array(numbers, dtype=np.int32) for trigram, numbers in postings.items()}
+        self._lengths = np.array(lengths, dtype=np.float64)
+
+    @classmethod
+    def from_gazetteer(cls, gazetteer: Gazetteer, threshold: float = 0.7) -> "RegionMatcher":
+        """Get a matcher on all the names of a gazetteer."""
+        return cls(gazetteer.names(), gazetteer.types, threshold)
+
+    def _covers(self, words: list[str], number: int) -> bool:
+        """Get if each word of the label is similar to a word of a name."""
+        name_words = self._names[number].split()
+        return all(
+            any(_similar_words(word, name_word, self.threshold) for name_word in name_words) for word in words
+        )
+
+    def _candidates(self, label: str, limit: int) -> list[tuple[dict[str, str], float]]:
+        name = clean_label(label)
+        if name is None:
+            return []
+        if name in self._exact:
+            return [(dict(self._regions[self._exact[name]]), 1.0)]
+        trigrams = _trigrams(name)
+        known = [self._postings[trigram] for trigram in trigrams if trigram in self._postings]
+        if not known:
+            return []
+        common = np.bincount(np.concatenate(known), minlength=len(self._names))
+        scores = 2 * common / (len(trigrams) + self._lengths)
+        words = [word for word in name.split() if word not in _STOP_WORDS]
+        candidates: list[tuple[dict[str, str], float]] = []
+        seen: set[str] = set()
+        # Stable, to keep the types order on equal scores
+        for number in np.argsort(-scores, kind="stable"):
+            if scores[number] < self.threshold or len(candidates) == limit:
+                break
+            region = self._regions[number]
+            if region["id"] not in seen and self._covers(words, number):
+                seen.add(region["id"])
+                candidates.append((dict(region), float(scores[number])))
+        return candidates
+
+    def candidates(
+        self,
+        labels: Sequence[str | None],
+        limit: int = 5,
+    ) -> list[list[tuple[dict[str, str], float]]]:
+        """Get the regions with a score over the threshold, best first, of each label, each distinct label once."""
+        distinct = {label: self._candidates(label, limit) for label in dict.fromkeys(labels) if label}
+        return [distinct[label] if label else [] for label in labels]
+
+    def match(self, labels: Sequence[str | None]) -> list[dict[str, str] | None]:
+        """Get the best region of each label."""
+        return [candidates[0][0] if candidates else None for candidates in self.candidates(labels, limit=1)]
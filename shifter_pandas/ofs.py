@@ -1,30 +1,195 @@
 """Datasource builder for data from the swiss Office Federal of Statistics."""
 
+import copy
+import fnmatch
+import itertools
+import math
+from pathlib import Path
 from typing import Any, cast
 
+import numpy as np
 import pandas as pd
 import requests
 
+from shifter_pandas.transport import ResponseCache, Transport
+from shifter_pandas.units import UnitRegistry
 from shifter_pandas.wikidata_ import ELEMENT_CANTON_CH, WikidataDatasource
 
 
+def _categories(category: dict[str, Any]) -> list[str]:
+    """Get the labels of the categories of a dimension, in the order of the index."""
+    index = category["index"]
+    codes = sorted(index, key=index.__getitem__) if isinstance(index, dict) else list(index)
+    labels = category.get("label", {})
+    return [labels.get(code, code) for code in codes]
+
+
+def _categorical(labels: list[str], codes: np.ndarray) -> pd.Categorical:
+    """Get a categorical from the codes of the labels, the duplicated labels are merged."""
+    label_codes, categories = pd.Index(labels).factorize()
+    return pd.Categorical.from_codes(label_codes[codes], categories=categories)
+
+
+def decode_json_stat(dataset: dict[str, Any]) -> dict[str, Any]:
+    """
+    Decode a JSON-stat dataset to columns.
+
+    The `values` column is followed by a categorical column per dimension, named by the dimension label.
+    The first dimension varies the slowest.
+    """
+    values: dict[str, Any] = {"values": dataset["value"]}
+    dimensions = [dataset["dimension"][dimension_id] for dimension_id in dataset["dimension"]["id"]]
+    sizes = [len(dimension["category"]["index"]) for dimension in dimensions]
+    total_length = len(dataset["value"])
+    outer = 1
+    for dimension, size in zip(dimensions, sizes, strict=True):
+        inner = total_length // (outer * size) if size else 0
+        codes = np.tile(np.repeat(np.arange(size), inner), outer)
+        values[dimension["label"]] = _categorical(_categories(dimension["category"]), codes)
+        outer *= size
+    return values
+
+
+def combine_json_stat(
+    pieces: list[dict[str, Any]], variables: list[dict[str, Any]] | None = None
+) -> dict[str, Any]:
+    """
+    Combine the decoded JSON-stat datasets of the chunks of a query.
+
+    The rows are in the order of the dataset of the full query, the categories are in the order of the values
+    of the variables of the table metadata, if given, else in the order of the chunks.
+    """
+    if len(pieces) == 1:
+        return pieces[0]
+    texts = {variable["text"]: variable.get("valueTexts", variable["values"]) for variable in variables or []}
+    labels = list(pieces[0])[1:]
+    values: dict[str, Any] = {"values": [value for piece in pieces for value in piece["values"]]}
+    for label in labels:
+        values[label] = pd.api.types.union_categoricals([piece[label] for piece in pieces])
+        if label in texts:
+            position = {text: index for index, text in reversed(list(enumerate(texts[label])))}
+            categories = values[label].categories
+            values[label] = values[label].reorder_categories(
+                sorted(categories, key=lambda category: position.get(category, len(position)))
+            )
+    # The first dimension varies the slowest
+    order = np.lexsort([values[label].codes for label in reversed(labels)])
+    values["values"] = [values["values"][index] for index in order]
+    for label in labels:
+        values[label] = values[label][order]
+    return values
+
+
+def _selected(variable: dict[str, Any], selection: dict[str, Any] | None) -> tuple[int, list[str] | None]:
+    """Get the number of selected values of a variable, and the selected values if the selection can be split."""
+    if selection is None:
+        if variable.get("elimination"):
+            return 1, None
+        return len(variable["values"]), list(variable["values"])
+    if selection["filter"] == "item":
+        return len(selection["values"]), list(selection["values"])
+    if selection["filter"] == "all":
+        values = [
+            value
+            for value in variable["values"]
+            if any(fnmatch.fnmatchcase(value, pattern) for pattern in selection["values"])
+        ]
+        return len(values), values
+    if selection["filter"] == "top":
+        return int(selection["values"][0]), None
+    return len(selection["values"]), None
+
+
+def split_query(
+    query: dict[str, Any], variables: list[dict[str, Any]], max_cells: int
+) -> list[dict[str, Any]]:
+    """
+    Split a PxWeb query in queries of at most `max_cells` cells.
+
+    The variables are the ones of the table metadata, the biggest selections are split first.
+    """
+    selections = {item["code"]: item["selection"] for item in query.get("query", [])}
+    selected = {
+        variable["code"]: _selected(variable, selections.get(variable["code"])) for variable in variables
+    }
+    cells = math.prod(count for count, _ in selected.values())
+    splits: dict[str, list[list[str]]] = {}
+    for code, (count, values) in sorted(selected.items(), key=lambda item: -item[1][0]):
+        if cells <= max_cells:
+            break
+        if values is None or count <= 1:
+            continue
+        rest = cells // count
+        size = max(1, max_cells // rest)
+        splits[code] = [values[index : index + size] for index in range(0, count, size)]
+        cells = rest * size
+    if cells > max_cells:
+        message = f"Unable to split the query in queries of at most {max_cells} cells"
+        raise ValueError(message)
+
+    queries = []
+    for chunk in itertools.product(*splits.values()):
+        chunk_query = copy.deepcopy(query)
+        chunk_selections = dict(zip(splits, chunk, strict=True))
+        items = chunk_query.setdefault("query", [])
+        for item in items:
+            if item["code"] in chunk_selections:
+                item["selection"] = {"filter": "item", "values": chunk_selections.pop(item["code"])}
+        items.extend(
+            {"code": code, "selection": {"filter": "item", "values": values}}
+            for code, values in chunk_selections.items()
+        )
+        queries.append(chunk_query)
+    return queries
+
+
 # https://www.bfs.admin.ch/bfs/fr/home/services/recherche/api/api-pxweb.html
 class OFSDatasource:
     """Datasource builder for data from the swiss Office Federal of Statistics."""
 
-    def __init__(self, url: str) -> None:
-        """Initialize the datasource builder."""
+    def __init__(
+        self,
+        url: str,
+        transport: Transport | None = None,
+        cache_dir: str | Path | None = None,
+        cache_ttl: float | None = 24 * 3600,
+        cache_max_size: int | None = 200 * 1024 * 1024,
+        max_cells: int | None = 100_000,
+    ) -> None:
+        """
+        Initialize the datasource builder.
+
+        With a `cache_dir` the responses are cached on disk, see `ResponseCache`.
+        The queries of more than `max_cells` cells are split in concurrent queries, `None` to disable it,
+        the metadata of the table is fetched once the server refuses a query.
+        """
         self.url = url
+        self.max_cells = max_cells
+        self._variables: list[dict[str, Any]] | None = None
+        self.transport = transport if transport is not None else Transport()
+        self.cache = (
+            ResponseCache(cache_dir, ttl=cache_ttl, max_size=cache_max_size)
+            if cache_dir is not None
+            else None
+        )
         self.wdds = WikidataDatasource()
+        self.units = UnitRegistry()
 
     def metadata(self) -> dict[str, Any]:
         """Get the metadata."""
-        response = requests.get(self.url, timeout=120)
+        response = self.transport.request("GET", self.url, cache=self.cache)
+        self._raise_for_status(response)
+        return cast("dict[str, Any]", response.json())
+
+    def _raise_for_status(self, response: requests.Response) -> None:
+        """Print and raise the error of a refused response."""
         if not response.ok:
             print(f"Error on query {self.url}: {response.status_code}")
             print(response.text)
             response.raise_for_status()
-        return cast("dict[str, Any]", response.json())
+
+    def _post(self, query: dict[str, Any]) -> requests.Response:
+        return self.transport.request("POST", self.url, cache=self.cache, json=query)
 
     def datasource(
         self,
@@ -33,40 +198,48 @@ class OFSDatasource:
         wikidata_id: bool = False,
         wikidata_name: bool = False,
         wikidata_properties: list[str] | None = None,
+        unit_dimension: str | None = None,
+        categorical: bool = True,
     ) -> pd.DataFrame:
-        """Get the Datasource as DataFrame."""
+        """
+        Get the Datasource as DataFrame.
+
+        The query refused as too big is split in chunks of at most `max_cells` cells, fetched concurrently.
+        With `unit_dimension` the values are converted to the ISO units, given by the labels of this dimension.
+        With `categorical` the dimensions columns are categories, else strings.
+        """
         if wikidata_properties is None:
             wikidata_properties = []
         wikidata = wikidata_id or wikidata_name or wikidata_properties
 
-        response = requests.post(self.url, json=query, timeout=120)
-        if not response.ok:
-            print(f"Error on query {self.url}: {response.status_code}")
-            print(response.text)
-            response.raise_for_status()
-
-        json = response.json()
-
-        values = {"values": json["dataset"]["value"]}
-        length = 1
-        total_length = len(json["dataset"]["value"])
-        for dimension_id in json["dataset"]["dimension"]["id"]:
-            dimension = json["dataset"]["dimension"][dimension_id]
-
-            current_length = len(dimension["category"]["index"])
-            number = int(total_length / (length * current_length))
-
-            dimension_value = list(json["dataset"]["value"])
-            for index_x in range(length):
-                for index_y, value in enumerate(dimension["category"]["label"].values()):
-                    for index_z in range(number):
-                        dimension_value[index_x * current_length * number + index_y * number + index_z] = (
-                            value
-                        )
-
-            values[dimension["label"]] = dimension_value
+        queries = [query]
+        if self.max_cells is not None and self._variables is not None:
+            queries = split_query(query, self._variables, self.max_cells)
+        responses = self.transport.map(self._post, queries)
+        if (
+            self.max_cells is not None
+            and self._variables is None
+            and any(response.status_code == 403 for response in responses)
+        ):
+            # Too many cells, split the query with the variables of the table metadata
+            self._variables = self.metadata()["variables"]
+            responses = self.transport.map(self._post, split_query(query, self._variables, self.max_cells))
+        for response in responses:
+            self._raise_for_status(response)
+        values = combine_json_stat(
+            [decode_json_stat(response.json()["dataset"]) for response in responses], self._variables
+        )
 
-            length *= current_length
+        if unit_dimension is not None:
+            units = values[unit_dimension]
+            factors, iso_units = self.units.to_iso(
+                pd.Series(1.0, index=range(len(units.categories))),
+                pd.Series(units.categories, dtype=object),
+            )
+            values["values"] = (
+                pd.Series(values["values"], dtype=float).to_numpy() * factors.to_numpy()[units.codes]
+            )
+            values[unit_dimension] = _categorical(iso_units.tolist(), units.codes)
 
         if wikidata and wikidata_dimension:
 
@@ -87,7 +260,10 @@ class OFSDatasource:
 
                 return element
 
-            data = [_get_values(canton) for canton in values[wikidata_dimension]]
+            cantons = values[wikidata_dimension]
+            with self.wdds.batch():
+                categories_data = [_get_values(canton) for canton in cantons.categories]
+            data = [categories_data[code] for code in cantons.codes]
 
             if wikidata_id:
                 values["WikidataId"] = [item.get("WikidataId") for item in data]
@@ -97,4 +273,9 @@ class OFSDatasource:
                 wikidata_property_name = self.wdds.get_property_name(wikidata_property)
                 values[wikidata_property_name] = [item.get(wikidata_property_name) for item in data]
 
+        if not categorical:
+            values = {
+                name: column.tolist() if isinstance(column, pd.Categorical) else column
+                for name, column in values.items()
+            }
         return pd.DataFrame(values)
@@ -0,0 +1,82 @@
+"""Lazy queries on the datasources."""
+
+from collections.abc import Callable, Iterable
+from typing import Any
+
+import pandas as pd
+
+# The filters given as lists of accepted values, the other ones are the years range
+_LIST_FILTERS = ("types", "units", "regions", "years", "indicators", "countries")
+
+
+def is_selected(columns: list[str] | None, column: str) -> bool:
+    """Check if an optional column, like the Wikidata ones, is explicitly selected."""
+    return columns is not None and column in columns
+
+
+class Scan:
+    """
+    Lazy query on a datasource.
+
+    The filters and the selected columns are only recorded, on `collect` they are given to the datasource,
+    which reads only the needed sheets, rows and columns.
+    """
+
+    def __init__(
+        self,
+        collect: Callable[[dict[str, Any], list[str] | None], pd.DataFrame],
+        supported_filters: Iterable[str],
+        filters: dict[str, Any] | None = None,
+        columns: list[str] | None = None,
+    ) -> None:
+        """
+        Initialize the query.
+
+        `collect` gets the DataFrame from the filters and the selected columns, `None` for all the columns.
+        """
+        self._collect = collect
+        self.supported_filters = frozenset(supported_filters)
+        self.filters = filters if filters is not None else {}
+        self.columns = columns
+
+    def filter(self, **filters: Any) -> "Scan":
+        """
+        Get a query with more filters.
+
+        The list filters (`types`, `units`, `regions`, `years`, `indicators`, `countries`) are intersected
+        with the previous ones, `from_year` and `to_year` give an inclusive years range.
+        """
+        unsupported = set(filters) - self.supported_filters
+        if unsupported:
+            message = f"Unsupported filters: {', '.join(sorted(unsupported))}"
+            raise ValueError(message)
+        new_filters = dict(self.filters)
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in new_filters:
+                new_filters[name] = list(value) if name in _LIST_FILTERS else value
+            elif name in _LIST_FILTERS:
+                values = set(value)
+                new_filters[name] = [element for element in new_filters[name] if element in values]
+            elif name == "from_year":
+                new_filters[name] = max(value, new_filters[name])
+            else:
+                new_filters[name] = min(value, new_filters[name])
+        return Scan(self._collect, self.supported_filters, new_filters, self.columns)
+
+    def select(self, *columns: str) -> "Scan":
+        """Get a query with only the given columns."""
+        if self.columns is not None:
+            missing = [column for column in columns if column not in self.columns]
+            if missing:
+                message = f"Columns not selected: {', '.join(missing)}"
+                raise ValueError(message)
+        return Scan(self._collect, self.supported_filters, self.filters, list(columns))
+
+    def collect(self) -> pd.DataFrame:
+        """Get the DataFrame of the query."""
+        data_frame = self._collect(self.filters, self.columns)
+        if self.columns is not None:
+            data_frame = data_frame[self.columns]
+        return data_frame
@@ -0,0 +1,337 @@
+"""HTTP transport shared by the remote datasources."""
+
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, TypeVar
+
+import requests
+import requests.adapters
+import requests.structures
+import requests.utils
+
+_T = TypeVar("_T")
+_R = TypeVar("_R")
+
+# The status codes of the responses that are retried
+_RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """Thread safe token bucket, to limit the number of requests per second."""
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        """Initialize the bucket, with `rate` tokens per second, and at most `capacity` tokens."""
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def retry_after(response: requests.Response) -> float | None:
+    """Get the delay in seconds of the `Retry-After` header, as seconds or as an HTTP date."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """
+    On-disk cache of the HTTP responses, keyed by the method, the URL and the canonical JSON of the query.
+
+    The responses younger than `ttl` seconds are used without request, the older ones are revalidated with
+    `If-None-Match` and `If-Modified-Since` when the server gave an `ETag` or a `Last-Modified` header.
+    The least recently used responses are removed when the size of the cache exceeds `max_size` bytes.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        ttl: float | None = 24 * 3600,
+        max_size: int | None = 200 * 1024 * 1024,
+    ) -> None:
+        """Initialize the cache, a `ttl` to `None` never expires the responses."""
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method: str, url: str, query: Any = None) -> str:
+        """Get the key of a request, the query is in canonical JSON to not depend on the order of the keys."""
+        canonical = json.dumps(query, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(f"{method.upper()} {url}\n{canonical}".encode()).hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        return self.directory / f"{key}.json", self.directory / f"{key}.body"
+
+    def get(self, key: str) -> tuple[dict[str, Any], bytes] | None:
+        """Get the metadata and the body of a cached response, and mark it as recently used."""
+        metadata_path, body_path = self._paths(key)
+        try:
+            with metadata_path.open(encoding="utf-8") as metadata_file:
+                metadata = json.load(metadata_file)
+            body = body_path.read_bytes()
+            os.utime(metadata_path)
+        except (OSError, ValueError):
+            return None
+        return metadata, body
+
+    def fresh(self, metadata: dict[str, Any]) -> bool:
+        """Check if a cached response can be used without revalidation."""
+        return self.ttl is None or time.time() - metadata["stored"] < self.ttl
+
+    def put(self, key: str, response: requests.Response) -> None:
+        """Store a response."""
+        metadata = {
+            "url": response.url,
+            "status_code": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in ("Content-Type", "ETag", "Last-Modified")
+                if name in response.headers
+            },
+            "stored": time.time(),
+        }
+        self._write(key, metadata, response.content)
+        self._evict()
+
+    def touch(self, key: str, metadata: dict[str, Any]) -> None:
+        """Mark a revalidated response as fresh."""
+        metadata_path, _ = self._paths(key)
+        metadata = {**metadata, "stored": time.time()}
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            new_path = metadata_path.with_name(f"{metadata_path.name}.{os.getpid()}.{threading.get_ident()}")
+            new_path.write_text(json.dumps(metadata), encoding="utf-8")
+            new_path.replace(metadata_path)
+
+    def _write(self, key: str, metadata: dict[str, Any], body: bytes) -> None:
+        metadata_path, body_path = self._paths(key)
+        suffix = f"{os.getpid()}.{threading.get_ident()}"
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            # The body first, a metadata file always has its body
+            new_path = body_path.with_name(f"{body_path.name}.{suffix}")
+            new_path.write_bytes(body)
+            new_path.replace(body_path)
+            new_path = metadata_path.with_name(f"{metadata_path.name}.{suffix}")
+            new_path.write_text(json.dumps(metadata), encoding="utf-8")
+            new_path.replace(metadata_path)
+
+    def size(self) -> int:
+        """Get the size of the cache in bytes."""
+        return sum(path.stat().st_size for path in self.directory.glob("*.body"))
+
+    def _evict(self) -> None:
+        if self.max_size is None:
+            return
+        with self._lock:
+            entries = []
+            for metadata_path in self.directory.glob("*.json"):
+                body_path = metadata_path.with_suffix(".body")
+                try:
+                    entries.append(
+                        (metadata_path.stat().st_mtime, body_path.stat().st_size, metadata_path, body_path),
+                    )
+                except FileNotFoundError:
+                    continue
+            size = sum(entry[1] for entry in entries)
+            for _, body_size, metadata_path, body_path in sorted(entries, key=lambda entry: entry[0]):
+                if size <= self.max_size:
+                    break
+                metadata_path.unlink(missing_ok=True)
+                body_path.unlink(missing_ok=True)
+                size -= body_size
+
+    def clear(self) -> None:
+        """Remove all the cached responses."""
+        with self._lock:
+            for path in [*self.directory.glob("*.json"), *self.directory.glob("*.body")]:
+                path.unlink(missing_ok=True)
+
+
+def _cached_response(metadata: dict[str, Any], body: bytes) -> requests.Response:
+    """Build a response from a cached one."""
+    response = requests.Response()
+    response.status_code = metadata["status_code"]
+    response.url = metadata["url"]
+    response.headers = requests.structures.CaseInsensitiveDict(metadata["headers"])
+    response._content = body  # noqa: SLF001
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+@dataclass
+class TransportStats:
+    """Counters of the requests done by a transport."""
+
+    requests: int = 0
+    retries: int = 0
+    errors: int = 0
+    seconds: float = 0
+    max_seconds: float = 0
+    cache_hits: int = 0
+    not_modified: int = 0
+
+    @property
+    def mean_seconds(self) -> float:
+        """Get the mean duration of a request."""
+        return self.seconds / self.requests if self.requests else 0
+
+
+class Transport:
+    """
+    HTTP transport with a pooled session and a bounded pool of workers.
+
+    The requests are limited to `rate` requests per second if set. The 429 and 5xx responses and the
+    connection errors are retried `max_retries` times, after the delay given by the `Retry-After` header,
+    else with an exponential backoff of `backoff_factor * 2 ** retry` seconds, at most `max_backoff` seconds.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        rate: float | None = None,
+        max_retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 60,
+        timeout: float | tuple[float, float] = (10, 120),
+    ) -> None:
+        """Initialize the transport, the timeout is in seconds, or a connect and read timeouts tuple."""
+        self.max_workers = max_workers
+        self.bucket = TokenBucket(rate) if rate else None
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.stats = TransportStats()
+        self._stats_lock = threading.Lock()
+        # The requests in flight, also bounded for the nested calls of `map`
+        self._in_flight = threading.BoundedSemaphore(max(max_workers, 1))
+
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = "gzip, deflate"
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=max(max_workers, 10))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _count(self, seconds: float, retry: bool, error: bool) -> None:
+        with self._stats_lock:
+            self.stats.requests += 1
+            self.stats.retries += retry
+            self.stats.errors += error
+            self.stats.seconds += seconds
+            self.stats.max_seconds = max(self.stats.max_seconds, seconds)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        cache: ResponseCache | None = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """
+        Do a request, the arguments are the ones of `requests.request`.
+
+        With a `cache` the successful responses are stored, and reused or revalidated on the next requests.
+        """
+        if cache is None:
+            return self._request(method, url, **kwargs)
+
+        key_url = url
+        if kwargs.get("params"):
+            # The parameters are encoded in the URL of the key
+            key_url = requests.Request(method, url, params=kwargs["params"]).prepare().url or url
+        key = cache.key(method, key_url, kwargs.get("json", kwargs.get("data")))
+        cached = cache.get(key)
+        if cached is not None:
+            metadata, body = cached
+            if cache.fresh(metadata):
+                with self._stats_lock:
+                    self.stats.cache_hits += 1
+                return _cached_response(metadata, body)
+            headers = dict(kwargs.pop("headers", None) or {})
+            if "ETag" in metadata["headers"]:
+                headers["If-None-Match"] = metadata["headers"]["ETag"]
+            if "Last-Modified" in metadata["headers"]:
+                headers["If-Modified-Since"] = metadata["headers"]["Last-Modified"]
+            kwargs["headers"] = headers
+
+        response = self._request(method, url, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            with self._stats_lock:
+                self.stats.not_modified += 1
+            cache.touch(key, metadata)
+            return _cached_response(metadata, body)
+        if response.status_code == 200:
+            cache.put(key, response)
+        return response
+
+    def _request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        timeout = kwargs.pop("timeout", self.timeout)
+        retry = 0
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                with self._in_flight:
+                    start = time.perf_counter()
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count(time.perf_counter() - start, retry > 0, error=True)
+                if retry >= self.max_retries:
+                    raise
+                delay = None
+            else:
+                self._count(
+                    time.perf_counter() - start,
+                    retry > 0,
+                    error=response.status_code >= 400,
+                )
+                if response.status_code not in _RETRY_STATUS_CODES or retry >= self.max_retries:
+                    return response
+                delay = retry_after(response)
+            time.sleep(min(delay if delay is not None else self.backoff_factor * 2**retry, self.max_backoff))
+            retry += 1
+
+    def map(self, function: Callable[[_T], _R], arguments: Iterable[_T]) -> list[_R]:
+        """
+        Call the function on each argument in the pool, the results are in the order of the arguments.
+
+        The functions can call `map` again, the requests in flight are still limited to `max_workers`.
+        """
+        arguments = list(arguments)
+        if self.max_workers <= 1 or len(arguments) <= 1:
+            return [function(argument) for argument in arguments]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(arguments))) as executor:
+            return list(executor.map(function, arguments))
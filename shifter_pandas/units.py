@@ -0,0 +1,222 @@
+"""Registry of the units, used to convert the values of all the datasources to the ISO units."""
+
+import re
+from typing import Any, NamedTuple
+
+import pandas as pd
+
+_INDICATOR_UNIT_RE = re.compile(r"^.*\(([^()]+)\)$")
+
+
+class IsoUnit(NamedTuple):
+    """A unit parsed as its ISO unit, the postfix that isn't part of the unit and the factor."""
+
+    unit: str
+    postfix: str
+    factor: float
+
+
+def normalize_unit(unit: str) -> str:
+    """Get normalized unit."""
+    unit = unit.strip()
+    unit = unit.lower()
+    unit = unit.removeprefix("1 ")
+    unit = unit.replace("/", " / ")
+    unit = unit.replace("  ", " ")
+    unit = unit.replace("equiv.", "equivalent")
+    return unit.replace(" daily", " per day")
+
+
+def indicator_unit(indicator: str) -> str | None:
+    """Get the unit of an indicator name like `Electric power consumption (kWh per capita)`."""
+    match = _INDICATOR_UNIT_RE.match(indicator.strip())
+    return match.group(1) if match else None
+
+
+class UnitRegistry:
+    """
+    Registry of the units.
+
+    The value in the ISO unit is the value multiplied by the factor.
+    """
+
+    def __init__(self, to_iso_unit: dict[str, dict[str, Any]] | None = None) -> None:
+        """Initialize the registry, with the default units if no `to_iso_unit` is given."""
+        # _parse_cache[<unit>] = <parsed unit>
+        self._parse_cache: dict[str, IsoUnit] = {}
+        # to_iso_unit[<from_unit>] = {"unit": <to_unit>, "factor": <factor>}
+        # tones is considered as ISO because it's more convenient to use
+        # then J, m³, tonnes (day, capita).
+        self.to_iso_unit: dict[str, dict[str, Any]] = {}
+        if to_iso_unit is not None:
+            # The units are looked up normalized
+            self.to_iso_unit = {normalize_unit(unit): definition for unit, definition in to_iso_unit.items()}
+            return
+
+        # 1 metric tonne = 2204.62 lb.
+        self.to_iso_unit["lb"] = {"unit": "tonnes", "factor": 1 / 2204.62}
+        # 1 metric tonne = 1.1023 short tons
+        self.to_iso_unit["short tons"] = {"unit": "tonnes", "factor": 1 / 1.1023}
+        # 1 kilolitre = 6.2898 barrels
+        self.to_iso_unit["barrels"] = {"unit": "m³", "factor": 1 / 6.2898}
+        # 1 kilolitre = 1 cubic meter
+        self.to_iso_unit["litres"] = {"unit": "m³", "factor": 1 / 1000}
+        # 1 kilocalorie (kcal) = 4.1868 kJ = 3.968 Btu
+        # 1 kilojoule (kJ) = 1,000 joules = 0.239 kcal = 0.948 Btu
+        self.to_iso_unit["kilocalorie"] = {"unit": "J", "factor": 4186.8}
+        self.to_iso_unit["kcal"] = self.to_iso_unit["kilocalorie"]
+        self.to_iso_unit["calorie"] = {"unit": "J", "factor": 4.1868}
+        self.to_iso_unit["cal"] = self.to_iso_unit["calorie"]
+        # 1 British thermal unit (Btu) = 0.252 kcal = 1.055 kJ
+        self.to_iso_unit["btu"] = {"unit": "J", "factor": 1055}
+        # 1 barrel of oil equivalent (boe) = 5.8 million Btu = 6.119 million kJ
+        self.to_iso_unit["barrel of oil equivalent"] = {"unit": "J", "factor": 6119000000}
+        # 1 kilowatt-hour (kWh) = 860 kcal = 3600 kJ = 3412 Btu
+        self.to_iso_unit["kilowatt-hour"] = {"unit": "J", "factor": 3600000}
+        self.to_iso_unit["kilowatt-hours"] = self.to_iso_unit["kilowatt-hour"]
+        self.to_iso_unit["kwh"] = self.to_iso_unit["kilowatt-hour"]
+        self.to_iso_unit["watt-hour"] = {"unit": "J", "factor": 3600}
+        self.to_iso_unit["watt-hours"] = self.to_iso_unit["watt-hour"]
+        self.to_iso_unit["wh"] = self.to_iso_unit["watt-hour"]
+
+        self.to_iso_unit["cubic meters"] = {"unit": "m³", "factor": 1}
+        self.to_iso_unit["meters"] = {"unit": "m", "factor": 1}
+        self.to_iso_unit["joules"] = {"unit": "J", "factor": 1}
+        # 1 cubic meter = 35.3146667 cubic feet
+        self.to_iso_unit["cubic feets"] = {"unit": "m³", "factor": 1 / 35.3146667}
+        self.to_iso_unit["cubic meter"] = self.to_iso_unit["cubic meters"]
+        self.to_iso_unit["meter"] = self.to_iso_unit["meters"]
+        self.to_iso_unit["joule"] = self.to_iso_unit["joules"]
+        self.to_iso_unit["cubic feet"] = self.to_iso_unit["cubic feets"]
+        self.to_iso_unit["watts"] = {"unit": "W", "factor": 1}
+        self.to_iso_unit["watt"] = self.to_iso_unit["watts"]
+
+    def define(self, unit: str, iso_unit: str, factor: float) -> None:
+        """Define a new unit, the value in the ISO unit is the value multiplied by the factor."""
+        self.to_iso_unit[normalize_unit(unit)] = {"unit": iso_unit, "factor": factor}
+        self._parse_cache.clear()
+
+    def parse(self, unit: str) -> IsoUnit:
+        """Get the ISO unit, the postfix and the factor of a normalized unit, the result is cached."""
+        if unit not in self._parse_cache:
+            if "/" not in unit:
+                self._parse_cache[unit] = self._parse_single(unit)
+            else:
+                upper, lower = unit.split("/")
+                upper_unit, upper_postfix, factor = self._parse_single(upper.strip())
+                assert not upper_postfix, f"Upper unit {upper} has a postfix {upper_postfix}"
+                lower_unit, postfix, lower_factor = self._parse_single(lower.strip())
+                self._parse_cache[unit] = IsoUnit(
+                    f"{upper_unit} / {lower_unit}", postfix, factor / lower_factor
+                )
+        return self._parse_cache[unit]
+
+    def _parse_single(self, unit: str) -> IsoUnit:
+        unit_postfix = ""
+        postfix = ""
+        for postfix_candidate in ("*",):
+            if unit.endswith(postfix_candidate):
+                postfix = postfix_candidate
+                unit = unit[: -len(postfix_candidate)]
+                break
+
+        for postfix_candidate in (
+            " (input-equivalent)",
+            " per capita",
+            " daily",
+            " per year",
+            " per day",
+        ):
+            if unit.endswith(postfix_candidate):
+                unit_postfix = postfix_candidate
+                unit = unit[: -len(postfix_candidate)]
+                break
+        for postfix_candidate in (
+            " of carbon dioxide",
+            " of oil equivalent",
+            " of lithium content",
+            "1",
+            "*",
+        ):
+            if unit.endswith(postfix_candidate):
+                postfix = postfix_candidate
+                unit = unit[: -len(postfix_candidate)]
+                break
+
+        factor = 1
+        if unit.startswith("kilo"):
+            unit = unit[4:]
+            factor = 1000
+        elif unit.startswith("mega"):
+            unit = unit[4:]
+            factor = 1000000
+        elif unit.startswith("giga"):
+            unit = unit[4:]
+            factor = 1000000000
+        elif unit.startswith("tera"):
+            unit = unit[4:]
+            factor = 1000000000000
+        elif unit.startswith("peta"):
+            unit = unit[4:]
+            factor = 1000000000000000
+        elif unit.startswith("exa"):
+            unit = unit[3:]
+            factor = 1000000000000000000
+        elif unit.startswith("thousand million "):
+            unit = unit[17:]
+            factor = 1000000000
+        elif unit.startswith("thousand "):
+            unit = unit[9:]
+            factor = 1000
+        elif unit.startswith("million "):
+            unit = unit[8:]
+            factor = 1000000
+        elif unit.startswith("billion "):
+            unit = unit[8:]
+            factor = 1000000000
+        elif unit.startswith("trillion "):
+            unit = unit[9:]
+            factor = 1000000000000
+
+        if unit in self.to_iso_unit:
+            definition = self.to_iso_unit[unit]
+            unit = definition["unit"]
+            factor *= definition["factor"]
+
+        return IsoUnit(unit + unit_postfix, postfix, factor)
+
+    def convert(self, values: pd.Series, from_unit: str, to_unit: str | None = None) -> pd.Series:
+        """
+        Convert a column of values from a unit to another unit, by default to the ISO unit.
+
+        The units are normalized, and should have the same ISO unit.
+        """
+        from_iso_unit = self.parse(normalize_unit(from_unit))
+        if to_unit is None:
+            return values * from_iso_unit.factor
+        to_iso_unit = self.parse(normalize_unit(to_unit))
+        if from_iso_unit.unit != to_iso_unit.unit:
+            message = (
+                f"Unable to convert '{from_unit}' ({from_iso_unit.unit}) to '{to_unit}' ({to_iso_unit.unit})"
+            )
+            raise ValueError(message)
+        return values * (from_iso_unit.factor / to_iso_unit.factor)
+
+    def to_iso(self, values: pd.Series, units: pd.Series) -> tuple[pd.Series, pd.Series]:
+        """
+        Convert a column of values with a column of units to the ISO units.
+
+        Each distinct unit is parsed once, return the converted values and the ISO units with the postfix.
+        The units that are not converted are kept as is.
+        """
+        parsed = {unit: self.parse(normalize_unit(unit)) for unit in units.dropna().unique()}
+        factors = units.map({unit: iso_unit.factor for unit, iso_unit in parsed.items()})
+        iso_units = units.map(
+            {
+                unit: unit
+                if f"{iso_unit.unit}{iso_unit.postfix}" == normalize_unit(unit) and iso_unit.factor == 1
+                else f"{iso_unit.unit}{iso_unit.postfix}"
+                for unit, iso_unit in parsed.items()
+            },
+        )
+        return values * factors.fillna(1).astype(float), iso_units.fillna(units)
@@ -1,18 +1,34 @@
 """Datasource builder for data from WikiData."""
 
+import argparse
+import atexit
 import json
 import os
-import shutil
+import time
+import weakref
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager
+from datetime import UTC, datetime
 from pathlib import Path
 from typing import Any, cast
 
 import pandas as pd
-import requests
-import wikidata.entity
-import wikidata.quantity
-from wikidata.client import Client
 
 from shifter_pandas import standardize_property
+from shifter_pandas.cache import Cache, CachePolicy, open_backend
+from shifter_pandas.gazetteer import (
+    DEFAULT_FILE,
+    PRIORITY_ALIAS,
+    PRIORITY_LABEL,
+    Gazetteer,
+    GazetteerRegion,
+    add_iso_3166,
+    merge_regions,
+    regions_from_cache,
+    write_gazetteer,
+)
+from shifter_pandas.matcher import RegionMatcher
+from shifter_pandas.transport import Transport
 
 ELEMENT_COUNTRY = "Q6256"
 ELEMENT_CONTINENT = "Q5107"
@@ -30,31 +46,143 @@ PROPERTY_ISO_3166_2 = "P300"
 PROPERTY_ISO_3166_2 = "P300"
 PROPERTY_POPULATION = "P1082"
 
+# The categories of the regions, in the order of precedence
+_REGION_CATEGORIES = [
+    (ELEMENT_CONTINENT, "continent"),
+    (ELEMENT_COUNTRY, "country"),
+    (ELEMENT_SUBCONTINENT, "subcontinent"),
+    (ELEMENT_GEOPOLITICAL_REGION, "geographic region"),
+    (ELEMENT_SUBREGION, "subregion"),
+    (ELEMENT_ELECTORAL_DISTRICT, "electoral district"),
+    (ELEMENT_POLITICAL_TERRITORY_ENTITY, "political territorial entity"),
+]
+
+# The categories of the gazetteer regions, in the order of precedence, the Swiss cantons are not searched online
+_GAZETTEER_CATEGORIES = [*_REGION_CATEGORIES[:5], (ELEMENT_CANTON_CH, "canton")]
+
+_RegionKey = tuple[str | None, str | None]
+
+# The maximum number of entities by wbgetentities request
+_ENTITIES_CHUNK_SIZE = 50
+# The maximum number of items by value and category of a region query
+_REGIONS_LIMIT = 10
+
+
+def _get_label(entity: dict[str, Any], key: str) -> str | None:
+    """Get a label or a description of an entity JSON, in the first returned language."""
+    for label in entity.get(key, {}).values():
+        return cast("str", label["value"])
+    return None
+
+
+def _get_claim_value(entity: dict[str, Any], property_id: str) -> Any:
+    """Get the value of the best ranked claim of a property, of an entity JSON."""
+    ranks = {"preferred": 0, "normal": 1, "deprecated": 2}
+    claims = sorted(entity.get("claims", {}).get(property_id, []), key=lambda claim: ranks[claim["rank"]])
+    for claim in claims:
+        if claim["mainsnak"]["snaktype"] != "value":
+            continue
+        datavalue = claim["mainsnak"]["datavalue"]
+        value = datavalue["value"]
+        if datavalue["type"] == "quantity":
+            # TODO: handle units, lower_bound, upper_bound # pylint: disable=fixme # noqa: TD003
+            return float(value["amount"])
+        if datavalue["type"] == "wikibase-entityid":
+            return value["id"]
+        if datavalue["type"] == "monolingualtext":
+            return value["text"]
+        if datavalue["type"] == "time":
+            return value["time"]
+        return value
+    return None
+
+
+def _flush_at_exit(wdds_ref: "weakref.ref[WikidataDatasource]") -> None:
+    wdds = wdds_ref()
+    if wdds is not None:
+        wdds.flush()
+
 
 class WikidataDatasource:
     """Datasource builder for data from WikiData."""
 
-    def __init__(self, endpoint_url: str = "https://query.wikidata.org/sparql") -> None:
-        """Initialize the WikidataDatasource."""
+    def __init__(
+        self,
+        endpoint_url: str = "https://query.wikidata.org/sparql",
+        api_url: str = "https://www.wikidata.org/w/api.php",
+        flush_interval: float | None = None,
+        transport: Transport | None = None,
+        gazetteer: Gazetteer | bool = True,
+        fuzzy_threshold: float | None = None,
+        cache_policy: CachePolicy | None = None,
+        memory_cache_size: int | None = 10_000,
+    ) -> None:
+        """
+        Initialize the WikidataDatasource.
+
+        The fetched and used cache entries are written after each fetch, in a `batch` they are written at
+        the end, at exit, or every `flush_interval` seconds if set.
+        The `transport` limits the concurrent requests and the requests rate.
+        The regions are first resolved with the `gazetteer`, the bundled one if `True`, `False` to disable it.
+        With a `fuzzy_threshold`, the names that are not in the gazetteer are matched on its names with
+        a trigram index, before any SPARQL query.
+        The `cache_policy` gives the time to live of the cache entries and their maximum number.
+        Only the `memory_cache_size` most recently used cache entries are kept decoded in memory, `None` for
+        no bound, the JSON cache backend keeps the other ones as JSON texts.
+        """
         self.endpoint_url = endpoint_url
+        self.api_url = api_url
+        self.transport = transport if transport is not None else Transport()
+        self.gazetteer = gazetteer if isinstance(gazetteer, Gazetteer) else Gazetteer() if gazetteer else None
+        self.fuzzy_threshold = fuzzy_threshold
+        self._matcher: RegionMatcher | None = None
         self.headers = {"User-Agent": "shifter_pandas - stephane.brunner@gmail.com"}
 
-        cache_path = Path(os.environ.get("WIKIDATA_CACHE_FILE", ".wikidata-cache.json"))
-        if cache_path.exists():
-            with cache_path.open(encoding="utf-8") as file:
-                self.cache = json.load(file)
-        else:
-            self.cache = {}
-        self.memory_cache: dict[str, wikidata.entity.Entity] = {}
+        self.cache = Cache(
+            open_backend(os.environ.get("WIKIDATA_CACHE_FILE", ".wikidata-cache.json"), cache_policy),
+            memory_cache_size,
+        )
+        self.flush_interval = flush_interval
+        self._batch_depth = 0
+        self._last_flush = time.monotonic()
+        atexit.register(_flush_at_exit, weakref.ref(self))
 
         self.custom_aliases: dict[str, dict[str, dict[str, str]]] = {}
 
-        self.client = Client()
-
     def _save_cache(self) -> None:
-        with Path(".wikidata-cache.json.new").open("w", encoding="utf-8") as file:
-            file.write(json.dumps(self.cache, indent=2))
-        shutil.move(".wikidata-cache.json.new", os.environ.get("WIKIDATA_CACHE_FILE", ".wikidata-cache.json"))
+        if self._batch_depth and (
+            self.flush_interval is None or time.monotonic() - self._last_flush < self.flush_interval
+        ):
+            return
+        self.flush()
+
+    def flush(self) -> None:
+        """Write the changed cache entries."""
+        self.cache.flush()
+        self._last_flush = time.monotonic()
+
+    @contextmanager
+    def _fetching(self, section: str) -> Iterator[None]:
+        """
+        Fetch the missing cache entries under the fetch lock of the section, then write them before releasing it.
+
+        The processes sharing the cache wait instead of fetching the same entries, they should check the cache
+        again once in the block. In a batch, the entries are written at the end of it.
+        """
+        with self.cache.backend.fetch_lock(section):
+            yield
+            self._save_cache()
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """Defer the writes of the fetched and used cache entries to the end of the block."""
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self.flush()
 
     def run_query(self, query: str) -> dict[str, Any]:
         """
@@ -66,7 +194,7 @@ class WikidataDatasource:
             "query": query,
             "format": "json",
         }
-        response = requests.get(self.endpoint_url, params=payload, headers=self.headers, timeout=120)
+        response = self.transport.request("GET", self.endpoint_url, params=payload, headers=self.headers)
         if not response.ok:
             print(f"Error on query {self.endpoint_url}: {response.status_code}")
             print(response.text)
@@ -74,14 +202,55 @@ class WikidataDatasource:
             response.raise_for_status()
         return cast("dict[str, Any]", response.json())
 
+    def get_entities(self, entity_ids: list[str], props: str, lang: str = "en") -> dict[str, dict[str, Any]]:
+        """
+        Get the entities JSON with the Wikidata API.
+
+        The entities are fetched by concurrent `wbgetentities` requests of 50 entities.
+        """
+
+        def _get_chunk(chunk_ids: list[str]) -> dict[str, dict[str, Any]]:
+            payload = {
+                "action": "wbgetentities",
+                "ids": "|".join(chunk_ids),
+                "props": props,
+                "languages": lang,
+                "format": "json",
+            }
+            response = self.transport.request("GET", self.api_url, params=payload, headers=self.headers)
+            if not response.ok:
+                print(f"Error on query {self.api_url}: {response.status_code}")
+                print(response.text)
+                response.raise_for_status()
+            return cast("dict[str, dict[str, Any]]", response.json()["entities"])
+
+        entities: dict[str, dict[str, Any]] = {}
+        for chunk_entities in self.transport.map(
+            _get_chunk,
+            [
+                entity_ids[start : start + _ENTITIES_CHUNK_SIZE]
+                for start in range(0, len(entity_ids), _ENTITIES_CHUNK_SIZE)
+            ],
+        ):
+            entities.update(chunk_entities)
+        return entities
+
     def get_property_name(self, property_id: str) -> str:
         """Get the name of a property."""
-        if property_id not in self.cache.get("properties", {}):
-            self.cache.setdefault("properties", {})[property_id] = str(
-                self._get_item_obj(cast("wikidata.entity.EntityId", property_id)).label,
-            )
-            self._save_cache()
-        return cast("str", self.cache["properties"][property_id])
+        return self.get_property_names([property_id])[0]
+
+    def get_property_names(self, property_ids: list[str]) -> list[str]:
+        """Get the names of many properties, the missing ones are fetched in one request."""
+        properties_cache = self.cache.section("properties")
+        missing = list(dict.fromkeys(p for p in property_ids if p not in properties_cache))
+        if missing:
+            with self._fetching("properties"):
+                # Fetched by another process while waiting for the lock
+                missing = [p for p in missing if p not in properties_cache]
+                if missing:
+                    for property_id, entity in self.get_entities(missing, "labels").items():
+                        properties_cache[property_id] = _get_label(entity, "labels")
+        return [cast("str", properties_cache[property_id]) for property_id in property_ids]
 
     def set_alias(self, instance_of: str, name: str, item_id: str, label: str = "") -> None:
         """Set an alias in the cache to prevent unwanted match."""
@@ -109,15 +278,18 @@ class WikidataDatasource:
         limit: int = 10,
     ) -> list[dict[str, str]]:
         """Get the items id from an alias."""
-        if code not in self.cache.get("fromAlias", {}).get(lang, {}).get(instance_of, {}):
-            items = [
-                {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                }
-                for item in self.run_query(
-                    f"""
+        alias_cache = self.cache.section(f"fromAlias/{lang}/{instance_of}")
+        if code not in alias_cache:
+            with self._fetching(f"fromAlias/{lang}/{instance_of}"):
+                if code not in alias_cache:
+                    items = [
+                        {
+                            "id": item["item"]["value"].split("/")[-1],
+                            "url": item["item"]["value"],
+                            "label": item["itemLabel"]["value"],
+                        }
+                        for item in self.run_query(
+                            f"""
         SELECT DISTINCT ?item ?itemLabel WHERE {{
 SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }}
 {{
@@ -130,25 +302,12 @@ SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }}
     LIMIT {limit}
 }}
         }}""",
-                )["results"]["bindings"]
-            ]
+                        )["results"]["bindings"]
+                    ]
 
-            def _get_id(item: dict[str, Any]) -> str:
-                return cast("str", item["id"])
-
-            items = sorted(items, key=_get_id)
-            self.cache.setdefault("fromAlias", {}).setdefault(lang, {}).setdefault(instance_of, {})[code] = (
-                items
-            )
-
-            self.cache["fromAlias"][lang][instance_of][code].sort(key=lambda x: int(x["id"][1:]))
-            self._save_cache()
-        return cast("list[dict[str, str]]", self.cache["fromAlias"][lang][instance_of][code])
-
-    def _get_item_obj(self, item_id: wikidata.entity.EntityId) -> wikidata.entity.Entity:
-        if item_id not in self.memory_cache:
-            self.memory_cache[item_id] = self.client.get(item_id, load=True)
-        return self.memory_cache[item_id]
+                    items.sort(key=lambda x: int(x["id"][1:]))
+                    alias_cache[code] = items
+        return cast("list[dict[str, str]]", alias_cache[code])
 
     def get_item(
         self,
@@ -160,336 +319,494 @@ SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }}
         prefix: str = "",
     ) -> dict[str, Any]:
         """Get the item with the given item_id as a JSON object."""
+        return self.get_items(
+            [item_id],
+            properties=properties,
+            with_id=with_id,
+            with_name=with_name,
+            with_description=with_description,
+            prefix=prefix,
+        )[0]
+
+    def get_items(
+        self,
+        item_ids: Sequence[str | None],
+        properties: list[str] | None = None,
+        with_id: bool = False,
+        with_name: bool = True,
+        with_description: bool = False,
+        prefix: str = "",
+    ) -> list[dict[str, Any]]:
+        """
+        Get many items as JSON objects.
+
+        Same as `get_item` for each item, but the items missing in the cache are fetched together,
+        by `wbgetentities` requests of 50 items.
+        """
         if properties is None:
             properties = []
+        property_names = self.get_property_names(properties)
 
-        json_item = self.cache.get("items", {}).get(item_id, {}) if item_id else {}
-        item = None
-        dirty_cache = False
-        if not json_item and item_id:
-            item = self._get_item_obj(cast("wikidata.entity.EntityId", item_id))
-            assert item.label is not None
-            json_item["name"] = str(item.label)
-            json_item["description"] = str(item.description)
-            self.cache.setdefault("items", {})[item_id] = json_item
-            dirty_cache = True
-
-        result = {}
-        if with_id:
-            result[f"{prefix}Id"] = item_id
-        if with_name:
-            result[f"{prefix}Name"] = json_item.get("name")
-        if with_description:
-            result[f"{prefix}Description"] = json_item.get("description")
-
-        for property_id in properties:
-            property_name = self.get_property_name(property_id)
-            if property_name not in json_item and item_id:
-                if item is None:
-                    item = self._get_item_obj(cast("wikidata.entity.EntityId", item_id))
-                property_value = item.get(self._get_item_obj(cast("wikidata.entity.EntityId", property_id)))
-                if isinstance(property_value, wikidata.quantity.Quantity):
-                    # TODO: handle amount, units, lower_bound, upper_bound # pylint: disable=fixme # noqa: TD003
-                    property_value = property_value.amount
-                json_item[property_name] = property_value
-                dirty_cache = True
-            result[prefix + standardize_property(property_name)] = json_item.get(property_name)
-
-        if dirty_cache:
-            self._save_cache()
+        items_cache = self.cache.section("items")
+        missing = [
+            item_id
+            for item_id in dict.fromkeys(item_ids)
+            if item_id
+            and (
+                item_id not in items_cache
+                or any(property_name not in items_cache[item_id] for property_name in property_names)
+            )
+        ]
+        if missing:
+            with self._fetching("items"):
+                # Fetched by another process while waiting for the lock
+                missing = [
+                    item_id
+                    for item_id in missing
+                    if item_id not in items_cache
+                    or any(property_name not in items_cache[item_id] for property_name in property_names)
+                ]
+                if missing:
+                    for entity_id, entity in self.get_entities(missing, "labels|descriptions|claims").items():
+                        json_item = dict(items_cache.get(entity_id, {}))
+                        if "name" not in json_item:
+                            json_item["name"] = _get_label(entity, "labels")
+                            json_item["description"] = _get_label(entity, "descriptions")
+                        for property_id, property_name in zip(properties, property_names, strict=True):
+                            if property_name not in json_item:
+                                json_item[property_name] = _get_claim_value(entity, property_id)
+                        items_cache[entity_id] = json_item
 
-        return result
+        results = []
+        for item_id in item_ids:
+            json_item = items_cache.get(item_id, {}) if item_id else {}
+            result: dict[str, Any] = {}
+            if with_id:
+                result[f"{prefix}Id"] = item_id
+            if with_name:
+                result[f"{prefix}Name"] = json_item.get("name")
+            if with_description:
+                result[f"{prefix}Description"] = json_item.get("description")
+            for property_name in property_names:
+                result[prefix + standardize_property(property_name)] = json_item.get(property_name)
+            results.append(result)
+        return results
 
-    def get_region(self, region: str | None, code: str | None = None) -> dict[str, str] | None:
-        """Get the region information."""
+    def _get_cached_region(self, region: str | None, code: str | None) -> tuple[bool, dict[str, str] | None]:
+        """
+        Get the region from the custom aliases, the cache or the gazetteer, the first value is False on miss.
+        """
         none_match = False
         if code in self.custom_aliases.get("code", {}):
             if self.custom_aliases["code"][code] is None:
                 none_match = True
             else:
-                return self.custom_aliases["code"][code]
+                return True, self.custom_aliases["code"][code]
         if region in self.custom_aliases.get("name", {}):
             if self.custom_aliases["name"][region] is None:
                 none_match = True
             else:
-                return self.custom_aliases["name"][region]
+                return True, self.custom_aliases["name"][region]
 
-        if code in self.cache.get("regions", {}).get("code", {}):
-            if self.cache["regions"]["code"][code] is None:
+        codes_cache = self.cache.section("regions/code")
+        if code is not None and code in codes_cache:
+            if codes_cache[code] is None:
                 none_match = True
             else:
-                return cast("dict[str, str]", self.cache["regions"]["code"][code])
-        if region in self.cache.get("regions", {}).get("name", {}):
-            if self.cache["regions"]["name"][region] is None:
+                return True, cast("dict[str, str]", codes_cache[code])
+        names_cache = self.cache.section("regions/name")
+        if region is not None and region in names_cache:
+            if names_cache[region] is None:
                 none_match = True
             else:
-                return cast("dict[str, str]", self.cache["regions"]["name"][region])
+                return True, cast("dict[str, str]", names_cache[region])
 
+        # An alias or a cached name or code without region isn't looked up in the gazetteer
         if none_match:
-            return None
+            return True, None
 
-        categories = [
-            (ELEMENT_CONTINENT, "continent"),
-            (ELEMENT_COUNTRY, "country"),
-        ]
-        lang = "en"
-        limit = 10
-
-        for instance_of, type_value in categories:
-            code_property = None
-            if code and len(code) == 2:
-                code_property = PROPERTY_ISO_3166_1_ALPHA_2
-            if code and len(code) == 3:
-                code_property = PROPERTY_ISO_3166_1_ALPHA_3
-
-            if code_property:
-                items = [
-                    {
-                        "id": item["item"]["value"].split("/")[-1],
-                        "url": item["item"]["value"],
-                        "label": item["itemLabel"]["value"],
-                        "type": type_value,
-                    }
-                    for item in self.run_query(
-                        f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
-            ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
-            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
-            ?item p:{code_property} ?code.
-            ?code (ps:{code_property}) "{code}"
-        }}
-        LIMIT {limit}
-    }}
-}}""",
-                    )["results"]["bindings"]
-                ]
-                if items:
-                    self.cache.setdefault("regions", {}).setdefault("code", {})[code] = items[0]
-                    self._save_cache()
-                    return items[0]
-
-        code_property = None
-        if code and len(code) == 2:
-            code_property = PROPERTY_ISO_3166_1_ALPHA_2
-        if code and len(code) == 3:
-            code_property = PROPERTY_ISO_3166_1_ALPHA_3
-
-        if code_property:
-            items = [
-                {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                    "type": "other",
-                }
-                for item in self.run_query(
-                    f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
-            ?item p:{code_property} ?code.
-            ?code (ps:{code_property}) "{code}"
-        }}
-        LIMIT {limit}
-    }}
-}}""",
-                )["results"]["bindings"]
-            ]
-            if items:
-                self.cache.setdefault("regions", {}).setdefault("code", {})[code] = items[0]
-                self._save_cache()
-                return items[0]
-
-        if not region:
-            if code:
-                self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-            self._save_cache()
-            return None
-
-        for instance_of, type_value in categories:
-            code_property = None
-            if len(region) == 2:
-                code_property = PROPERTY_ISO_3166_1_ALPHA_2
-            if len(region) == 3:
-                code_property = PROPERTY_ISO_3166_1_ALPHA_3
-
-            if code_property:
-                items = [
-                    {
-                        "id": item["item"]["value"].split("/")[-1],
-                        "url": item["item"]["value"],
-                        "label": item["itemLabel"]["value"],
-                        "type": type_value,
-                    }
-                    for item in self.run_query(
-                        f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
+        # After the cache, which can have a name resolved differently from the code
+        if self.gazetteer is not None:
+            gazetteer_region = self.gazetteer.get_region(region, code)
+            if gazetteer_region is not None:
+                return True, gazetteer_region
+
+        return False, None
+
+    def _query_regions(
+        self,
+        values: list[str],
+        where: str,
+        categories: list[tuple[str, str]] | None,
+        lang: str,
+        chunk_size: int,
+        with_population: bool = False,
+    ) -> dict[str, list[dict[str, Any]]]:
+        """
+        Run a region query for many values at once.
+
+        The `where` clause should match `?item` with `?value`, the values are bound with `VALUES`,
+        and the items are restricted to the instances of the `categories`. The chunks of values are queried
+        concurrently. Returns the items by value, at most `_REGIONS_LIMIT` by category.
+        """
+        types = dict(categories or [])
+
+        def _query_chunk(chunk_values: list[str]) -> list[dict[str, Any]]:
+            values_sparql = " ".join(json.dumps(value) for value in chunk_values)
+            instance = "?instance" if categories else ""
+            instance_where = (
+                f"""
+            VALUES ?instance {{ {" ".join(f"wd:{instance_of}" for instance_of in types)} }}
             ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
-            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
-            ?item p:{code_property} ?code.
-            ?code (ps:{code_property}) "{region}"
-        }}
-        LIMIT {limit}
-    }}
-}}""",
-                    )["results"]["bindings"]
-                ]
-                if items:
-                    if code:
-                        self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-                    self.cache.setdefault("regions", {}).setdefault("name", {})[region] = items[0]
-                    self._save_cache()
-                    return items[0]
-
-        code_property = None
-        if len(region) == 2:
-            code_property = PROPERTY_ISO_3166_1_ALPHA_2
-        if len(region) == 3:
-            code_property = PROPERTY_ISO_3166_1_ALPHA_3
-
-        if code_property:
-            items = [
-                {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                    "type": "other",
-                }
-                for item in self.run_query(
+            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) ?instance."""
+                if categories
+                else ""
+            )
+            population = "?population" if with_population else ""
+            population_where = (
+                f"\n            ?item wdt:{PROPERTY_POPULATION} ?population." if with_population else ""
+            )
+            return cast(
+                "list[dict[str, Any]]",
+                self.run_query(
                     f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
+SELECT DISTINCT ?value {instance} ?item ?itemLabel {population} WHERE {{
     SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
-            ?item p:{code_property} ?code.
-            ?code (ps:{code_property}) "{region}"
+        SELECT DISTINCT ?value {instance} ?item {population} WHERE {{
+            VALUES ?value {{ {values_sparql} }}{instance_where}{population_where}
+            {where}
         }}
-        LIMIT {limit}
     }}
 }}""",
-                )["results"]["bindings"]
-            ]
-            if items:
-                if code:
-                    self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-                self.cache.setdefault("regions", {}).setdefault("name", {})[region] = items[0]
-                self._save_cache()
-                return items[0]
-
-        categories = [
-            (ELEMENT_CONTINENT, "continent"),
-            (ELEMENT_COUNTRY, "country"),
-            (ELEMENT_SUBCONTINENT, "subcontinent"),
-            (ELEMENT_GEOPOLITICAL_REGION, "geographic region"),
-            (ELEMENT_SUBREGION, "subregion"),
-            (ELEMENT_ELECTORAL_DISTRICT, "electoral district"),
-            (ELEMENT_POLITICAL_TERRITORY_ENTITY, "political territorial entity"),
-        ]
+                )["results"]["bindings"],
+            )
 
-        for instance_of, type_value in categories:
-            items = [
-                {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                    "type": type_value,
+        result: dict[str, list[dict[str, Any]]] = {}
+        # The limit is by value and category, a value with many items doesn't hide the other ones
+        counts: dict[tuple[str, str], int] = {}
+        for bindings in self.transport.map(
+            _query_chunk,
+            [values[start : start + chunk_size] for start in range(0, len(values), chunk_size)],
+        ):
+            for binding in bindings:
+                item = {
+                    "id": binding["item"]["value"].split("/")[-1],
+                    "url": binding["item"]["value"],
+                    "label": binding["itemLabel"]["value"],
+                    "type": (types[binding["instance"]["value"].split("/")[-1]] if categories else "other"),
                 }
-                for item in self.run_query(
+                if with_population:
+                    item["population"] = float(binding["population"]["value"])
+                value = binding["value"]["value"]
+                count = counts.get((value, item["type"]), 0)
+                if count < _REGIONS_LIMIT:
+                    counts[value, item["type"]] = count + 1
+                    result.setdefault(value, []).append(item)
+        return result
+
+    def _get_regions_by_code(
+        self,
+        values: dict[_RegionKey, str],
+        lang: str,
+        chunk_size: int,
+    ) -> dict[_RegionKey, dict[str, str]]:
+        """Get the regions from their ISO 3166-1 code, first in the main categories then in any item."""
+        categories = _REGION_CATEGORIES[:2]
+        result: dict[_RegionKey, dict[str, str]] = {}
+        for length, code_property in ((2, PROPERTY_ISO_3166_1_ALPHA_2), (3, PROPERTY_ISO_3166_1_ALPHA_3)):
+            keys = {key: value for key, value in values.items() if len(value) == length}
+            if not keys:
+                continue
+            where = f"""?item p:{code_property} ?code.
+            ?code (ps:{code_property}) ?value."""
+            items = self._query_regions(sorted(set(keys.values())), where, categories, lang, chunk_size)
+            for key, value in keys.items():
+                for _, type_value in categories:
+                    category_items = [item for item in items.get(value, []) if item["type"] == type_value]
+                    if category_items:
+                        result[key] = category_items[0]
+                        break
+
+            keys = {key: value for key, value in keys.items() if key not in result}
+            if not keys:
+                continue
+            items = self._query_regions(sorted(set(keys.values())), where, None, lang, chunk_size)
+            for key, value in keys.items():
+                if items.get(value):
+                    result[key] = items[value][0]
+        return result
+
+    def _get_regions_by_label(
+        self,
+        values: dict[_RegionKey, str],
+        lang: str,
+        chunk_size: int,
+    ) -> dict[_RegionKey, dict[str, str]]:
+        """Get the regions from their label, case insensitive."""
+        where = f"""?item rdfs:label ?label.
+            FILTER(LCASE(?label) = STRLANG(?value, "{lang}"))"""
+        items = self._query_regions(
+            sorted({value.lower() for value in values.values()}),
+            where,
+            _REGION_CATEGORIES,
+            lang,
+            chunk_size,
+        )
+        result: dict[_RegionKey, dict[str, str]] = {}
+        for key, value in values.items():
+            for _, type_value in _REGION_CATEGORIES:
+                category_items = [item for item in items.get(value.lower(), []) if item["type"] == type_value]
+                if category_items:
+                    result[key] = category_items[0]
+                    break
+        return result
+
+    def _get_regions_by_alias(
+        self,
+        values: dict[_RegionKey, str],
+        lang: str,
+        chunk_size: int,
+    ) -> dict[_RegionKey, dict[str, str]]:
+        """
+        Get the regions from their aliases.
+
+        For each category, the most populated item is preferred, then the item with the smallest id.
+        """
+        where = f"""?item skos:altLabel ?alias.
+            FILTER(CONTAINS(?alias, STRLANG(?value, "{lang}")))"""
+        distinct_values = sorted(set(values.values()))
+        populated_items, items = self.transport.map(
+            lambda with_population: self._query_regions(
+                distinct_values,
+                where,
+                _REGION_CATEGORIES,
+                lang,
+                chunk_size,
+                with_population=with_population,
+            ),
+            [True, False],
+        )
+        result: dict[_RegionKey, dict[str, str]] = {}
+        for key, value in values.items():
+            for _, type_value in _REGION_CATEGORIES:
+                category_items = sorted(
+                    (item for item in populated_items.get(value, []) if item["type"] == type_value),
+                    key=lambda item: -cast("float", item["population"]),
+                )
+                if category_items:
+                    result[key] = {k: v for k, v in category_items[0].items() if k != "population"}
+                    break
+                category_items = sorted(
+                    (item for item in items.get(value, []) if item["type"] == type_value),
+                    key=lambda item: cast("str", item["id"]),
+                )
+                if category_items:
+                    result[key] = category_items[0]
+                    break
+        return result
+
+    def get_gazetteer_regions(self, lang: str = "en") -> dict[str, GazetteerRegion]:
+        """
+        Get the regions of the gazetteer categories with their labels, aliases, ISO 3166-1 and 3166-2 codes.
+
+        The categories are queried concurrently, a region of many categories gets the first one.
+        """
+
+        def _query_category(instance_of: str) -> list[dict[str, Any]]:
+            return cast(
+                "list[dict[str, Any]]",
+                self.run_query(
                     f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
-            ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
-            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
-            ?item rdfs:label ?label.
-            FILTER(LCASE(?label) = "{region.lower()}"@{lang})
-        }}
-        LIMIT {limit}
-    }}
+SELECT DISTINCT ?item ?itemLabel ?alias ?alpha2 ?alpha3 ?numeric ?subdivision WHERE {{
+    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }}
+    ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
+    ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
+    OPTIONAL {{ ?item skos:altLabel ?alias. FILTER(LANG(?alias) = "{lang}") }}
+    OPTIONAL {{ ?item wdt:{PROPERTY_ISO_3166_1_ALPHA_2} ?alpha2. }}
+    OPTIONAL {{ ?item wdt:{PROPERTY_ISO_3166_1_ALPHA_3} ?alpha3. }}
+    OPTIONAL {{ ?item wdt:{PROPERTY_ISO_3166_1_NUMERIC} ?numeric. }}
+    OPTIONAL {{ ?item wdt:{PROPERTY_ISO_3166_2} ?subdivision. }}
 }}""",
-                )["results"]["bindings"]
-            ]
-            if items:
-                if code:
-                    self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-                self.cache.setdefault("regions", {}).setdefault("name", {})[region] = items[0]
-                self._save_cache()
-                return items[0]
+                )["results"]["bindings"],
+            )
 
-        for instance_of, type_value in categories:
-            items = [
-                {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                    "type": type_value,
+        regions: dict[str, GazetteerRegion] = {}
+        for (_, type_value), bindings in zip(
+            _GAZETTEER_CATEGORIES,
+            self.transport.map(_query_category, [instance_of for instance_of, _ in _GAZETTEER_CATEGORIES]),
+            strict=True,
+        ):
+            for binding in bindings:
+                item_id = binding["item"]["value"].split("/")[-1]
+                region = regions.setdefault(
+                    item_id,
+                    GazetteerRegion(item_id, binding["itemLabel"]["value"], type_value),
+                )
+                region.add_name(region.label, PRIORITY_LABEL)
+                if "alias" in binding:
+                    region.add_name(binding["alias"]["value"], PRIORITY_ALIAS)
+                region.codes |= {
+                    binding[name]["value"]
+                    for name in ("alpha2", "alpha3", "numeric", "subdivision")
+                    if name in binding
                 }
-                for item in self.run_query(
-                    f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item ?population WHERE {{
-            ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
-            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
-            ?item skos:altLabel ?alias.
-            ?item wdt:{PROPERTY_POPULATION} ?population.
-            FILTER(CONTAINS(?alias, "{region}"@{lang}))
-        }}
-        LIMIT {limit}
-    }}
-}}
-ORDER BY DESC(?population)""",
-                )["results"]["bindings"]
-            ]
-            if items:
-                if code:
-                    self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-                self.cache.setdefault("regions", {}).setdefault("name", {})[region] = items[0]
-                self._save_cache()
-                return items[0]
+        return regions
+
+    def get_region(self, region: str | None, code: str | None = None) -> dict[str, str] | None:
+        """Get the region information."""
+        return self.get_regions([region], [code])[0]
+
+    def get_regions(
+        self,
+        names: Sequence[str | None] | None = None,
+        codes: Sequence[str | None] | None = None,
+        chunk_size: int = 100,
+    ) -> list[dict[str, str] | None]:
+        """
+        Get the information of many regions.
+
+        Same as `get_region` for each name and code pair, but the cache misses are resolved together,
+        with a few SPARQL queries using `VALUES`, of at most `chunk_size` values.
+        """
+        if names is None:
+            names = [None] * len(codes or [])
+        if codes is None:
+            codes = [None] * len(names)
+        if len(names) != len(codes):
+            message = "The names and the codes should have the same length"
+            raise ValueError(message)
+        lang = "en"
 
-            items = [
+        results: dict[_RegionKey, dict[str, str] | None] = {}
+        pending = []
+        for key in dict.fromkeys(zip(names, codes, strict=True)):
+            found, region = self._get_cached_region(*key)
+            if found:
+                results[key] = region
+            else:
+                pending.append(key)
+        if pending and self.fuzzy_threshold is not None and self.gazetteer is not None:
+            if self._matcher is None:
+                self._matcher = RegionMatcher.from_gazetteer(self.gazetteer, self.fuzzy_threshold)
+            results.update(
                 {
-                    "id": item["item"]["value"].split("/")[-1],
-                    "url": item["item"]["value"],
-                    "label": item["itemLabel"]["value"],
-                    "type": type_value,
-                }
-                for item in self.run_query(
-                    f"""
-SELECT DISTINCT ?item ?itemLabel WHERE {{
-    SERVICE wikibase:label {{ bd:serviceParam wikibase:language "{lang}". }} {{
-        SELECT DISTINCT ?item WHERE {{
-            ?item p:{PROPERTY_INSTANCE_OF} ?statement0.
-            ?statement0 (ps:{PROPERTY_INSTANCE_OF}) wd:{instance_of}.
-            ?item skos:altLabel ?alias.
-            FILTER(CONTAINS(?alias, "{region}"@{lang}))
-        }}
-        LIMIT {limit}
-    }}
-}}""",
-                )["results"]["bindings"]
-            ]
+                    key: region
+                    for key, region in zip(
+                        pending, self._matcher.match([name for name, _ in pending]), strict=True
+                    )
+                    if region is not None
+                },
+            )
+            pending = [key for key in pending if key not in results]
+        if not pending:
+            return [results[key] for key in zip(names, codes, strict=True)]
 
-            def _get_id(item: dict[str, Any]) -> str:
-                return cast("str", item["id"])
+        with self._fetching("regions"):
+            # Resolved by another process while waiting for the lock
+            for key in pending:
+                found, region = self._get_cached_region(*key)
+                if found:
+                    results[key] = region
+            pending = [key for key in pending if key not in results]
+            if pending:
+                results.update(self._resolve_regions(pending, lang, chunk_size))
+        return [results[key] for key in zip(names, codes, strict=True)]
 
-            items = sorted(items, key=_get_id)
-            if items:
+    def _resolve_regions(
+        self,
+        pending: list[_RegionKey],
+        lang: str,
+        chunk_size: int,
+    ) -> dict[_RegionKey, dict[str, str] | None]:
+        """Resolve the regions missing in the cache with SPARQL queries, and cache them."""
+        results: dict[_RegionKey, dict[str, str] | None] = {}
+        codes_cache = self.cache.section("regions/code")
+        names_cache = self.cache.section("regions/name")
+        for key, region in self._get_regions_by_code(
+            {key: key[1] for key in pending if key[1]},
+            lang,
+            chunk_size,
+        ).items():
+            codes_cache[cast("str", key[1])] = region
+            results[key] = region
+
+        for key in pending:
+            name, code = key
+            if key not in results and not name:
+                if code:
+                    codes_cache[code] = None
+                results[key] = None
+        pending = [key for key in pending if key not in results]
+
+        for get_regions in (
+            self._get_regions_by_code,
+            self._get_regions_by_label,
+            self._get_regions_by_alias,
+        ):
+            if not pending:
+                break
+            for key, region in get_regions(
+                {key: cast("str", key[0]) for key in pending},
+                lang,
+                chunk_size,
+            ).items():
+                name, code = key
                 if code:
-                    self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-                self.cache.setdefault("regions", {}).setdefault("name", {})[region] = items[0]
-                self._save_cache()
-                return items[0]
+                    codes_cache[code] = None
+                names_cache[cast("str", name)] = region
+                results[key] = region
+            pending = [key for key in pending if key not in results]
+
+        for key in pending:
+            name, code = key
+            if code:
+                codes_cache[code] = None
+            names_cache[cast("str", name)] = None
+            results[key] = None
 
-        if code:
-            self.cache.setdefault("regions", {}).setdefault("code", {})[code] = None
-        self.cache.setdefault("regions", {}).setdefault("name", {})[region] = None
-        self._save_cache()
-        return None
+        return results
+
+    def get_regions_data_frame(
+        self,
+        names: Sequence[str | None],
+        wikidata_id: bool = False,
+        wikidata_name: bool = False,
+        wikidata_type: bool = False,
+        wikidata_properties: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Get the Wikidata columns of the regions, indexed by the names, to be joined on a datasource.
+
+        Each distinct name is resolved once.
+        """
+        if wikidata_properties is None:
+            wikidata_properties = []
+        distinct_names = list(dict.fromkeys(names))
+        with self.batch():
+            regions = self.get_regions(names=distinct_names)
+            items = self.get_items(
+                [region["id"] if region else None for region in regions],
+                with_name=wikidata_name,
+                with_id=wikidata_id,
+                properties=wikidata_properties,
+                prefix="Wikidata",
+            )
+
+        columns = []
+        if wikidata_id:
+            columns.append("WikidataId")
+        if wikidata_name:
+            columns.append("WikidataName")
+        columns += [
+            f"Wikidata{standardize_property(property_name)}"
+            for property_name in self.get_property_names(wikidata_properties)
+        ]
+        data: dict[str, list[Any]] = {}
+        if wikidata_type:
+            data["WikidataType"] = [region["type"] if region else None for region in regions]
+        for column in columns:
+            data[column] = [item[column] for item in items]
+        return pd.DataFrame(data, index=pd.Index(distinct_names)).reindex(pd.Index(names))
 
     def datasource(
         self,
@@ -522,14 +839,13 @@ SELECT DISTINCT ?item ?itemLabel WHERE {{
             )["results"]["bindings"]
         ]
         values: dict[str, list[Any]] = {}
-        for element_id in ids:
-            item = self.get_item(
-                element_id,
-                properties=properties,
-                with_name=with_name,
-                with_description=with_description,
-                with_id=with_id,
-            )
+        for item in self.get_items(
+            ids,
+            properties=properties,
+            with_name=with_name,
+            with_description=with_description,
+            with_id=with_id,
+        ):
             for key, value in item.items():
                 values.setdefault(key, []).append(value)
         return pd.DataFrame(values)
@@ -785,20 +1101,63 @@ SELECT DISTINCT ?item ?itemLabel WHERE {{
         }
 
         data: dict[str, list[Any]] = {}
-        for code in codes:
-            element_id = self.get_region(None, code)
-            if element_id:
-                data.setdefault("Code", []).append(code)
-
-                if wikidata_type:
-                    data.setdefault("WikidataType", []).append(element_id["type"] if element_id else None)
-                item = self.get_item(
-                    element_id["id"],
-                    with_name=wikidata_name,
-                    with_id=wikidata_id,
-                    properties=wikidata_properties,
-                    prefix="Wikidata",
-                )
-                for key, value in item.items():
-                    data.setdefault(key, []).append(value)
+        sorted_codes = sorted(codes)
+        regions = [
+            (code, element_id)
+            for code, element_id in zip(sorted_codes, self.get_regions(codes=sorted_codes), strict=True)
+            if element_id
+        ]
+        items = self.get_items(
+            [element_id["id"] for _, element_id in regions],
+            with_name=wikidata_name,
+            with_id=wikidata_id,
+            properties=wikidata_properties,
+            prefix="Wikidata",
+        )
+        for (code, element_id), item in zip(regions, items, strict=True):
+            data.setdefault("Code", []).append(code)
+
+            if wikidata_type:
+                data.setdefault("WikidataType", []).append(element_id["type"])
+            for key, value in item.items():
+                data.setdefault(key, []).append(value)
         return pd.DataFrame(data)
+
+
+def gazetteer_main() -> None:
+    """Build the regions gazetteer from Wikidata, from Wikidata caches and from the ISO 3166 codes."""
+    parser = argparse.ArgumentParser(description=gazetteer_main.__doc__)
+    parser.add_argument(
+        "--cache",
+        action="append",
+        default=[],
+        help="A Wikidata cache file, to add the resolved names and codes",
+    )
+    parser.add_argument(
+        "--iso-3166",
+        action="append",
+        default=[],
+        help="The ISO 3166-1 or 3166-2 codes, in the format of the /usr/share/iso-codes/json/iso_3166-*.json files",
+    )
+    parser.add_argument("--offline", action="store_true", help="Don't query Wikidata")
+    parser.add_argument(
+        "--version",
+        default=datetime.now(tz=UTC).date().isoformat(),
+        help="The version of the gazetteer, the date by default",
+    )
+    parser.add_argument("output", nargs="?", default=str(DEFAULT_FILE), help="The gazetteer file")
+    args = parser.parse_args()
+
+    sources = [] if args.offline else [WikidataDatasource(gazetteer=False).get_gazetteer_regions()]
+    sources += [regions_from_cache(open_backend(cache_file).items()) for cache_file in args.cache]
+    regions = merge_regions(*sources)
+    for iso_3166 in args.iso_3166:
+        with Path(iso_3166).open(encoding="utf-8") as iso_3166_file:
+            add_iso_3166(regions, json.load(iso_3166_file))
+    write_gazetteer(
+        args.output,
+        regions.values(),
+        args.version,
+        [type_value for _, type_value in _GAZETTEER_CATEGORIES],
+    )
+    print(f"{len(regions)} regions written in {args.output}")
@@ -3,29 +3,116 @@
 import csv
 import io
 import re
+import shutil
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 from zipfile import ZipFile
 
+import numpy as np
 import pandas as pd
 
-from shifter_pandas import standardize_property
+from shifter_pandas import compact_dtypes, standardize_property
+from shifter_pandas.scan import Scan, is_selected
+from shifter_pandas.units import UnitRegistry, indicator_unit
 from shifter_pandas.wikidata_ import WikidataDatasource
 
+# The columns converted to categories
+_LABEL_COLUMNS = [
+    "CountryName",
+    "CountryCode",
+    "IndicatorName",
+    "IndicatorCode",
+    "Unit",
+    "WikidataId",
+    "WikidataName",
+    "WikidataType",
+]
+
+_YEAR_RE = re.compile(r"^[0-9]{4}$")
+
+
+def _select_years(years: list[str], from_year: int | None, to_year: int | None) -> list[str]:
+    """Get the years columns in the inclusive range."""
+    return [
+        year
+        for year in years
+        if (from_year is None or int(year) >= from_year) and (to_year is None or int(year) <= to_year)
+    ]
+
+
+def _rows_mask(
+    table: pd.DataFrame,
+    indicators_filter: list[str] | None,
+    countries_filter: list[str] | None,
+) -> np.ndarray:
+    """Get the mask of the rows of the table with the given indicator and country codes."""
+    mask = np.ones(len(table), dtype=bool)
+    if indicators_filter is not None:
+        mask &= table["Indicator Code"].isin(set(indicators_filter)).to_numpy()
+    if countries_filter is not None:
+        mask &= table["Country Code"].isin(set(countries_filter)).to_numpy()
+    return mask
+
+
+def _long_table(table: pd.DataFrame, headers: list[str], years: list[str]) -> pd.DataFrame:
+    """
+    Get the long table of a table with a column per year.
+
+    The rows are in the order of the table, the years in the order of the columns, without the empty cells.
+    The labels are repeated on each year as categories.
+    """
+    labels = table[headers].fillna("").astype("category").rename(columns=standardize_property)
+    values = table[years].to_numpy(dtype=float)
+    rows, columns = np.nonzero(~np.isnan(values))
+    return pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "Year": np.array([int(year) for year in years], dtype=np.int64)[columns],
+                    "Value": values[rows, columns],
+                },
+            ),
+            labels.iloc[rows].reset_index(drop=True),
+        ],
+        axis=1,
+    )
+
+
+def _concat(data_frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate the DataFrames, the categorical columns keep the union of the categories."""
+    dtypes = {
+        column: pd.CategoricalDtype(
+            pd.api.types.union_categoricals(
+                [data_frame[column] for data_frame in data_frames],
+                sort_categories=True,
+            ).categories,
+        )
+        for column, dtype in data_frames[0].dtypes.items()
+        if isinstance(dtype, pd.CategoricalDtype)
+    }
+    return pd.concat([data_frame.astype(dtypes) for data_frame in data_frames], ignore_index=True)
+
 
 class WorldbankDatasource:
     """Datasource builder for data from World Bank."""
 
     def __init__(self, zip_filename: str) -> None:
-        """Initialize the datasource builder."""
+        """Initialize the datasource builder, the CSV of the zip file is read as a table with a column per year."""
         self.wdds = WikidataDatasource()
         self.wdds.set_alias("World", "WLD", "Q16502", "World")
+        self.units = UnitRegistry()
         with (
             ZipFile(zip_filename) as myzip,
             myzip.open(Path(zip_filename).stem + ".csv") as csvfile,
         ):
-            self.table = list(
-                csv.reader(io.TextIOWrapper(csvfile, encoding=None), delimiter=",", quotechar='"'),
+            # Skip the data source and the last updated date lines
+            self.table = pd.read_csv(
+                csvfile,
+                skiprows=4,
+                keep_default_na=False,
+                na_values=[""],
+                float_precision="round_trip",
             )
 
     def datasource(
@@ -34,49 +121,268 @@ class WorldbankDatasource:
         wikidata_name: bool = False,
         wikidata_type: bool = False,
         wikidata_properties: list[str] | None = None,
+        units: str = "original",
+        categorical: bool = True,
+        indicators_filter: list[str] | None = None,
+        countries_filter: list[str] | None = None,
+        from_year: int | None = None,
+        to_year: int | None = None,
     ) -> pd.DataFrame:
-        """Get the Datasource as DataFrame."""
+        """
+        Get the Datasource as DataFrame.
+
+        With `units="iso"` the values are converted to the ISO unit given in the parenthesis at the end of
+        the indicator name, and a `Unit` column is added.
+        With `categorical` the labels are categories and the `Year` a small integer.
+        The rows are filtered by indicator codes, country codes and years range (inclusive) before
+        being reshaped.
+        """
         if wikidata_properties is None:
             wikidata_properties = []
-        wikidata = wikidata_id or wikidata_name or wikidata_properties
+        wikidata = wikidata_id or wikidata_name or wikidata_type or wikidata_properties
+
+        years = [column for column in self.table.columns if _YEAR_RE.match(column) is not None]
+        # The empty column after the last year is named `Unnamed: <index>`
+        headers = [
+            column
+            for column in self.table.columns
+            if column not in years and not column.startswith("Unnamed: ")
+        ]
+        years = _select_years(years, from_year, to_year)
+        table = self.table[_rows_mask(self.table, indicators_filter, countries_filter)]
+        data_frame = _long_table(table, headers, years)
+        if not categorical:
+            data_frame = data_frame.astype({standardize_property(header): str for header in headers})
+
+        if wikidata:
+            data_frame = data_frame.join(
+                self.wdds.get_regions_data_frame(
+                    data_frame["CountryCode"].unique().tolist(),
+                    wikidata_id=wikidata_id,
+                    wikidata_name=wikidata_name,
+                    wikidata_type=wikidata_type,
+                    wikidata_properties=wikidata_properties,
+                ),
+                on="CountryCode",
+            )
+        if units == "iso":
+            indicator_names = data_frame["IndicatorName"]
+            data_frame["Value"], unit = self.units.to_iso(
+                data_frame["Value"],
+                indicator_names.map({name: indicator_unit(name) for name in indicator_names.unique()}),
+            )
+            data_frame.insert(list(data_frame.columns).index("IndicatorCode") + 1, "Unit", unit)
+        if categorical:
+            data_frame = compact_dtypes(data_frame, _LABEL_COLUMNS)
+        return data_frame
+
+    def scan(self, units: str = "original", categorical: bool = True) -> Scan:
+        """
+        Get a lazy query on the Datasource.
+
+        The `indicators` and `countries` filters and the years range select the rows and the years of
+        the table before its reshaping. The Wikidata columns `WikidataId`, `WikidataName` and `WikidataType`
+        are only looked up when they are selected.
+        """
+
+        def _collect(filters: dict[str, Any], columns: list[str] | None) -> pd.DataFrame:
+            return self.datasource(
+                units=units,
+                categorical=categorical,
+                indicators_filter=filters.get("indicators"),
+                countries_filter=filters.get("countries"),
+                from_year=filters.get("from_year"),
+                to_year=filters.get("to_year"),
+                wikidata_id=is_selected(columns, "WikidataId"),
+                wikidata_name=is_selected(columns, "WikidataName"),
+                wikidata_type=is_selected(columns, "WikidataType"),
+            )
+
+        return Scan(_collect, ["indicators", "countries", "from_year", "to_year"])
 
-        year_re = re.compile(r"^[0-9]{4}$")
+
+class WorldbankBulkDatasource:
+    """
+    Datasource builder for the bulk downloads of World Bank, like the World Development Indicators archive.
+
+    The data is the biggest CSV file of the zip file, it's read by chunks of `chunk_size` rows, only the columns
+    of the selected years are parsed, and the rows are filtered while reading, then the memory use is bounded
+    by the chunk size.
+    """
+
+    def __init__(self, zip_filename: str, chunk_size: int = 10_000) -> None:
+        """Initialize the datasource builder, only the header of the data is read."""
+        self.zip_filename = zip_filename
+        self.chunk_size = chunk_size
+        with ZipFile(zip_filename) as myzip:
+            self.csv_name = max(
+                (info for info in myzip.infolist() if info.filename.lower().endswith(".csv")),
+                key=lambda info: info.file_size,
+            ).filename
+            with myzip.open(self.csv_name) as csvfile:
+                # The single indicator files start with the data source and the last updated date lines
+                for index, row in enumerate(csv.reader(io.TextIOWrapper(csvfile, encoding="utf-8-sig"))):
+                    if row[:1] == ["Country Name"]:
+                        self.skiprows = index
+                        break
+                else:
+                    message = f"No header line in {self.csv_name}"
+                    raise ValueError(message)
+        self.years = [int(column) for column in row if _YEAR_RE.match(column) is not None]
+        self.headers = [column for column in row if column and _YEAR_RE.match(column) is None]
+
+    def chunks(
+        self,
+        indicators_filter: list[str] | None = None,
+        countries_filter: list[str] | None = None,
+        from_year: int | None = None,
+        to_year: int | None = None,
+        categorical: bool = True,
+        columns: list[str] | None = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Get the data by chunks, filtered by indicator codes, country codes and years range (inclusive).
+
+        With `columns` only the given label columns are parsed.
+        """
+        years = _select_years([str(year) for year in self.years], from_year, to_year)
         headers = [
-            (e[0], standardize_property(e[1]))
-            for e in enumerate(self.table[4])
-            if e[1] and year_re.match(e[1]) is None
+            header for header in self.headers if columns is None or standardize_property(header) in columns
         ]
-        years = [(e[0], int(e[1])) for e in enumerate(self.table[4]) if year_re.match(e[1]) is not None]
-
-        data: dict[str, list[Any]] = {"Year": [], "Value": []}
-        for _, header in headers:
-            data[header] = []
-        for row in self.table[5:]:
-            for index_y, year in years:
-                value = row[index_y]
-                if value:
-                    country_name = None
-                    for index_y2, header in headers:
-                        data[header].append(row[index_y2])
-                        if header == "CountryCode":
-                            country_name = row[index_y2]
-                    data["Year"].append(year)
-                    data["Value"].append(float(row[index_y]))
-
-                    if wikidata:
-                        assert country_name is not None
-                        element_id = self.wdds.get_region(country_name)
-                        if wikidata_type:
-                            data.setdefault("WikidataType", []).append(
-                                element_id["type"] if element_id else None,
-                            )
-                        item = self.wdds.get_item(
-                            element_id["id"] if element_id else None,
-                            with_name=wikidata_name,
-                            with_id=wikidata_id,
-                            properties=wikidata_properties,
-                            prefix="Wikidata",
-                        )
-                        for key, value in item.items():
-                            data.setdefault(key, []).append(value)
-        return pd.DataFrame(data)
+        filter_headers = [
+            header
+            for header, filter_ in (("Indicator Code", indicators_filter), ("Country Code", countries_filter))
+            if filter_ is not None and header not in headers
+        ]
+        with ZipFile(self.zip_filename) as myzip, myzip.open(self.csv_name) as csvfile:
+            for table in pd.read_csv(
+                csvfile,
+                skiprows=self.skiprows,
+                usecols=[*headers, *filter_headers, *years],
+                keep_default_na=False,
+                na_values=[""],
+                float_precision="round_trip",
+                chunksize=self.chunk_size,
+            ):
+                data_frame = _long_table(
+                    table[_rows_mask(table, indicators_filter, countries_filter)],
+                    headers,
+                    years,
+                )
+                if data_frame.empty:
+                    continue
+                if categorical:
+                    yield compact_dtypes(data_frame, _LABEL_COLUMNS)
+                else:
+                    yield data_frame.astype({standardize_property(header): str for header in headers})
+
+    def datasource(
+        self,
+        indicators_filter: list[str] | None = None,
+        countries_filter: list[str] | None = None,
+        from_year: int | None = None,
+        to_year: int | None = None,
+        categorical: bool = True,
+        columns: list[str] | None = None,
+    ) -> pd.DataFrame:
+        """Get the filtered data as DataFrame, with the columns of `WorldbankDatasource.datasource`."""
+        data_frames = list(
+            self.chunks(
+                indicators_filter,
+                countries_filter,
+                from_year,
+                to_year,
+                categorical=categorical,
+                columns=columns,
+            ),
+        )
+        if not data_frames:
+            data_frame = pd.DataFrame(
+                {
+                    "Year": pd.Series(dtype=np.int64),
+                    "Value": pd.Series(dtype=float),
+                    **{
+                        standardize_property(header): pd.Series(dtype=str)
+                        for header in self.headers
+                        if columns is None or standardize_property(header) in columns
+                    },
+                },
+            )
+            return compact_dtypes(data_frame, _LABEL_COLUMNS) if categorical else data_frame
+        return _concat(data_frames)
+
+    def scan(self, categorical: bool = True) -> Scan:
+        """
+        Get a lazy query on the Datasource.
+
+        The `indicators` and `countries` filters are applied while reading, only the columns of the years
+        range and the selected label columns are parsed.
+        """
+
+        def _collect(filters: dict[str, Any], columns: list[str] | None) -> pd.DataFrame:
+            return self.datasource(
+                indicators_filter=filters.get("indicators"),
+                countries_filter=filters.get("countries"),
+                from_year=filters.get("from_year"),
+                to_year=filters.get("to_year"),
+                categorical=categorical,
+                columns=columns,
+            )
+
+        return Scan(_collect, ["indicators", "countries", "from_year", "to_year"])
+
+    def to_parquet(
+        self,
+        directory: str,
+        indicators_filter: list[str] | None = None,
+        countries_filter: list[str] | None = None,
+        from_year: int | None = None,
+        to_year: int | None = None,
+        partition_cols: list[str] | None = None,
+    ) -> None:
+        """
+        Write the filtered data in a Parquet dataset partitioned by indicator code, it requires pyarrow.
+
+        The chunks are written one by one in a new directory, which replaces the previous dataset at the end.
+        """
+        if partition_cols is None:
+            partition_cols = ["IndicatorCode"]
+        path = Path(directory)
+        new_path = path.with_name(f"{path.name}.new")
+        shutil.rmtree(new_path, ignore_errors=True)
+        new_path.mkdir(parents=True)
+        for data_frame in self.chunks(indicators_filter, countries_filter, from_year, to_year):
+            data_frame.to_parquet(new_path, partition_cols=partition_cols, index=False)
+        shutil.rmtree(path, ignore_errors=True)
+        new_path.replace(path)
+
+
+def read_parquet(
+    directory: str,
+    indicators_filter: list[str] | None = None,
+    countries_filter: list[str] | None = None,
+    from_year: int | None = None,
+    to_year: int | None = None,
+    columns: list[str] | None = None,
+) -> pd.DataFrame:
+    """
+    Read a Parquet dataset written by `WorldbankBulkDatasource.to_parquet`, it requires pyarrow.
+
+    The filters are applied on the partitions and on the row groups, the order of the rows isn't kept.
+    """
+    filters: list[tuple[str, str, Any]] = []
+    if indicators_filter is not None:
+        filters.append(("IndicatorCode", "in", indicators_filter))
+    if countries_filter is not None:
+        filters.append(("CountryCode", "in", countries_filter))
+    if from_year is not None:
+        filters.append(("Year", ">=", from_year))
+    if to_year is not None:
+        filters.append(("Year", "<=", to_year))
+    data_frame = pd.read_parquet(directory, columns=columns, filters=filters or None)
+    # The partition columns are at the end
+    order = ["Year", "Value", "CountryName", "CountryCode", "IndicatorName", "IndicatorCode"]
+    return data_frame[
+        [column for column in order if column in data_frame]
+        + [column for column in data_frame if column not in order]
+    ]
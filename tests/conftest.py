@@ -0,0 +1,67 @@
+import json
+import threading
+from collections.abc import Callable, Iterator
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+import pytest
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTP server of a stub handler, served by a daemon thread.
+
+    The state of the stub, e.g. the received queries, is given by the keyword arguments, as attributes of the
+    server, so each server starts with its own state. The `lock` protects the state changed by the handlers.
+    """
+
+    def __init__(self, handler: type[BaseHTTPRequestHandler], **state: Any) -> None:
+        """Start the server on a free port."""
+        super().__init__(("127.0.0.1", 0), handler)
+        self.lock = threading.Lock()
+        for name, value in state.items():
+            setattr(self, name, value)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        """Get the base URL of the server, without a trailing slash."""
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def close(self) -> None:
+        """Stop the server."""
+        self.shutdown()
+        self.server_close()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base handler of the stubs, without logs."""
+
+    server: StubServer
+
+    def send_json(self, result: Any, status: int = 200, content_type: str = "application/json") -> None:
+        """Send a JSON response."""
+        body = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        del args
+
+
+@pytest.fixture
+def http_stub() -> Iterator[Callable[..., StubServer]]:
+    """Get a factory of stub servers, `http_stub(handler, **state)`, stopped at the end of the test."""
+    servers: list[StubServer] = []
+
+    def _http_stub(handler: type[BaseHTTPRequestHandler], **state: Any) -> StubServer:
+        server = StubServer(handler, **state)
+        servers.append(server)
+        return server
+
+    yield _http_stub
+    for server in servers:
+        server.close()
@@ -1,8 +1,18 @@
 """Tests of BP Datasource."""
 
+import pandas as pd
+import pytest
+
 from shifter_pandas.bp import UNITS_ENERGY, BPDatasource
 
 
+def _used_categories(data_frame: pd.DataFrame) -> pd.DataFrame:
+    """Remove the unused categories, as in a DataFrame built from the filtered rows."""
+    return data_frame.apply(
+        lambda column: column.cat.remove_unused_categories() if column.dtype == "category" else column,
+    )
+
+
 def test_bp() -> None:
     """Tests of BP Datasource."""
     shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx")
@@ -70,34 +80,34 @@ def test_bp() -> None:
     ]
 
     assert shifter_ds.to_iso_unit == {
-        "lb": {"unit": "tonnes", "factor": 2204.62},
-        "short tons": {"unit": "tonnes", "factor": 1.1023},
-        "barrels": {"unit": "m³", "factor": 6.2898},
-        "litres": {"unit": "m³", "factor": 1000},
-        "kilocalorie": {"unit": "J", "factor": 0.0041841004184100415},
-        "kcal": {"unit": "J", "factor": 0.0041841004184100415},
-        "calorie": {"unit": "J", "factor": 4.184100418410042},
-        "cal": {"unit": "J", "factor": 4.184100418410042},
-        "Btu": {"unit": "J", "factor": 0.0010548523206751054},
-        "barrel of oil equivalent": {"unit": "j", "factor": 6119000},
-        "kilowatt-hour": {"unit": "J", "factor": 3.6},
-        "kilowatt-hours": {"unit": "J", "factor": 3.6},
-        "kWh": {"unit": "J", "factor": 3.6},
+        "lb": {"unit": "tonnes", "factor": 1 / 2204.62},
+        "short tons": {"unit": "tonnes", "factor": 1 / 1.1023},
+        "barrels": {"unit": "m³", "factor": 1 / 6.2898},
+        "litres": {"unit": "m³", "factor": 1 / 1000},
+        "kilocalorie": {"unit": "J", "factor": 4186.8},
+        "kcal": {"unit": "J", "factor": 4186.8},
+        "calorie": {"unit": "J", "factor": 4.1868},
+        "cal": {"unit": "J", "factor": 4.1868},
+        "btu": {"unit": "J", "factor": 1055},
+        "barrel of oil equivalent": {"unit": "J", "factor": 6119000000},
+        "kilowatt-hour": {"unit": "J", "factor": 3600000},
+        "kilowatt-hours": {"unit": "J", "factor": 3600000},
+        "kwh": {"unit": "J", "factor": 3600000},
         "watt-hour": {"unit": "J", "factor": 3600},
         "watt-hours": {"unit": "J", "factor": 3600},
-        "Wh": {"unit": "J", "factor": 3600},
+        "wh": {"unit": "J", "factor": 3600},
         "cubic meters": {"unit": "m³", "factor": 1},
         "meters": {"unit": "m", "factor": 1},
         "joules": {"unit": "J", "factor": 1},
-        "cubic feets": {"unit": "m³", "factor": 35.3146667},
+        "cubic feets": {"unit": "m³", "factor": 1 / 35.3146667},
         "cubic meter": {"unit": "m³", "factor": 1},
         "meter": {"unit": "m", "factor": 1},
         "joule": {"unit": "J", "factor": 1},
-        "cubic feet": {"unit": "m³", "factor": 35.3146667},
+        "cubic feet": {"unit": "m³", "factor": 1 / 35.3146667},
         "watts": {"unit": "W", "factor": 1},
         "watt": {"unit": "W", "factor": 1},
-        "us gallons": {"unit": "m³", "factor": 0.14969724},
-        "gallons": {"unit": "m³", "factor": 0.14969724},
+        "us gallons": {"unit": "m³", "factor": pytest.approx(0.0037839, rel=1e-4)},
+        "gallons": {"unit": "m³", "factor": pytest.approx(0.0037839, rel=1e-4)},
     }
 
     data_frame = shifter_ds.datasource(regions_filter=["Total World"], years_factor=20)
@@ -127,3 +137,120 @@ def test_bp() -> None:
 
     data_frame = shifter_ds.datasource(units_filter=UNITS_ENERGY, years_factor=50)
     assert set(data_frame.Type) == {"Primary Energy Consumption"}
+
+
+def test_bp_read_only() -> None:
+    """The read only mode gives the same result as the full mode."""
+    full_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx")
+    read_only_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", read_only=True)
+    assert read_only_ds.xlsx is None
+    assert read_only_ds.metadata() == full_ds.metadata()
+    assert read_only_ds.to_iso_unit == full_ds.to_iso_unit
+    assert read_only_ds.oil_units_conversion == full_ds.oil_units_conversion
+    assert read_only_ds.gaz_units_conversion == full_ds.gaz_units_conversion
+    pd.testing.assert_frame_equal(
+        read_only_ds.datasource(types_filter=["Primary Energy Consumption"]),
+        full_ds.datasource(types_filter=["Primary Energy Consumption"]),
+    )
+    # Some values of the Geothermal Capacity are formulas, only available with their cached values
+    merged = read_only_ds.datasource().merge(
+        full_ds.datasource(),
+        how="left",
+        on=["Type", "Year", "Region", "Value"],
+        indicator=True,
+    )
+    assert set(merged[merged["_merge"] == "left_only"].Type) == {"Geothermal Capacity"}
+    assert len(merged[merged["_merge"] == "both"]) == len(full_ds.datasource())
+    pd.testing.assert_frame_equal(
+        read_only_ds.datasource_non_fossil_electricity_to_primary_energy_factor(),
+        full_ds.datasource_non_fossil_electricity_to_primary_energy_factor(),
+    )
+
+
+def test_bp_metadata_cache() -> None:
+    """The layout of the sheets is computed lazily and only once."""
+    shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", read_only=True)
+    shifter_ds.datasource(types_filter=["Geothermal Capacity"])
+    assert set(shifter_ds._metadata_cache) == {3}
+
+    metadata = shifter_ds.metadata()
+    assert set(shifter_ds._metadata_cache) == {0, 1, 2, 3, 4}
+    # The returned metadata can be modified without changing the cache
+    del metadata[1]["regions"]
+    assert shifter_ds.metadata()[1]["regions"][0] == {"index": 5, "label": "Canada"}
+
+    geothermal_metadata = shifter_ds._metadata_cache[3]
+    shifter_ds.datasource(regions_filter=["Switzerland"])
+    assert shifter_ds._metadata_cache[3] is geothermal_metadata
+
+    shifter_ds.invalidate_metadata()
+    assert shifter_ds._metadata_cache == {}
+    assert shifter_ds.metadata()[3] == geothermal_metadata
+
+
+def test_bp_cache(tmp_path) -> None:
+    """The parsed workbook is saved in and loaded from the cache directory."""
+    pytest.importorskip("pyarrow")
+
+    shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", cache_dir=str(tmp_path))
+    assert shifter_ds.xlsx is not None
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+    assert len(list(tmp_path.glob("*.json"))) == 1
+
+    cached_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", cache_dir=str(tmp_path))
+    assert cached_ds.xlsx is None
+    assert cached_ds.metadata() == shifter_ds.metadata()
+    assert cached_ds.to_iso_unit == shifter_ds.to_iso_unit
+    assert cached_ds.oil_units_conversion == shifter_ds.oil_units_conversion
+    assert cached_ds.oil_products_units_conversion == shifter_ds.oil_products_units_conversion
+    assert cached_ds.gaz_units_conversion == shifter_ds.gaz_units_conversion
+    pd.testing.assert_frame_equal(cached_ds.datasource(), shifter_ds.datasource())
+    pd.testing.assert_frame_equal(
+        cached_ds.datasource_non_fossil_electricity_to_primary_energy_factor(),
+        shifter_ds.datasource_non_fossil_electricity_to_primary_energy_factor(),
+    )
+
+    # The layout can be computed again from the cached cells
+    cached_ds.invalidate_metadata()
+    assert cached_ds.metadata() == shifter_ds.metadata()
+
+
+@pytest.mark.parametrize("read_only", [False, True])
+def test_bp_filters(read_only) -> None:
+    """The filters pushed down in the sheets scan give the same result as filtering the full DataFrame."""
+    shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", read_only=read_only)
+    data_frame = shifter_ds.datasource()
+
+    filtered = shifter_ds.datasource(
+        regions_filter=["Switzerland", "Total World", "Unknown"],
+        years_filter=[1980, 1990, 2000, 2005, 1800],
+        years_factor=10,
+    )
+    expected = data_frame[
+        data_frame.Region.isin(["Switzerland", "Total World"]) & data_frame.Year.isin([1980, 1990, 2000])
+    ]
+    pd.testing.assert_frame_equal(filtered, _used_categories(expected.reset_index(drop=True)))
+
+    filtered = shifter_ds.datasource(units_filter=["W"], regions_filter=["Mexico"])
+    expected = data_frame[(data_frame.Unit == "W") & (data_frame.Region == "Mexico")]
+    pd.testing.assert_frame_equal(filtered, _used_categories(expected.reset_index(drop=True)))
+
+    assert shifter_ds.datasource(units_filter=["m³"]).empty
+
+
+def test_bp_dtypes() -> None:
+    """The labels are categories and the years small integers, or all objects as before."""
+    shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx", read_only=True)
+    data_frame = shifter_ds.datasource()
+    assert data_frame.dtypes.to_dict() == {
+        "Value": "float64",
+        "Type": "category",
+        "Unit": "category",
+        "TypeUnit": "category",
+        "Year": "int16",
+        "Region": "category",
+    }
+    objects = shifter_ds.datasource(categorical=False)
+    assert all(pd.api.types.is_object_dtype(dtype) for dtype in objects.dtypes)
+    pd.testing.assert_frame_equal(data_frame.astype(object), objects)
+    assert data_frame.memory_usage(deep=True).sum() < objects.memory_usage(deep=True).sum() / 4
@@ -0,0 +1,338 @@
+import fcntl
+import json
+import multiprocessing
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from shifter_pandas.cache import (
+    SCHEMA_VERSION,
+    Cache,
+    CachePolicy,
+    CacheStats,
+    JsonCacheBackend,
+    SqliteCacheBackend,
+    import_json,
+    main,
+    open_backend,
+)
+
+JSON_CACHE = {
+    "regions": {"name": {"World": None, "Switzerland": {"id": "Q39"}}, "code": {"CHE": {"id": "Q39"}}},
+    "items": {"Q39": {"name": "Switzerland"}},
+    "properties": {"P297": "ISO 3166-1 alpha-2 code"},
+    "fromAlias": {"en": {"Q23058": {"VD": [{"id": "Q12771"}]}}},
+}
+
+
+@pytest.fixture(params=["cache.json", "cache.sqlite"])
+def cache_file(request, tmp_path) -> Path:
+    return tmp_path / request.param
+
+
+def _write_keys(cache_file: Path, worker: int) -> None:
+    cache = Cache(open_backend(cache_file))
+    for number in range(20):
+        cache.section("items")[f"Q{worker}_{number}"] = {"name": f"Item {number}"}
+        cache.flush()
+
+
+def test_open_backend(tmp_path) -> None:
+    assert isinstance(open_backend(tmp_path / "cache.json"), JsonCacheBackend)
+    assert isinstance(open_backend(tmp_path / "cache.sqlite"), SqliteCacheBackend)
+
+
+def test_import_json(cache_file, tmp_path) -> None:
+    json_file = tmp_path / "legacy.json"
+    json_file.write_text(json.dumps(JSON_CACHE), encoding="utf-8")
+    import_json(json_file, open_backend(cache_file))
+
+    cache = Cache(open_backend(cache_file))
+    assert cache.section("regions/name")["World"] is None
+    assert "World" in cache.section("regions/name")
+    assert "Unknown" not in cache.section("regions/name")
+    assert cache.section("regions/code")["CHE"] == {"id": "Q39"}
+    assert cache.section("fromAlias/en/Q23058")["VD"] == [{"id": "Q12771"}]
+    assert sorted(open_backend(cache_file).items()) == sorted(
+        [
+            ("regions/name", "World", None),
+            ("regions/name", "Switzerland", {"id": "Q39"}),
+            ("regions/code", "CHE", {"id": "Q39"}),
+            ("items", "Q39", {"name": "Switzerland"}),
+            ("properties", "P297", "ISO 3166-1 alpha-2 code"),
+            ("fromAlias/en/Q23058", "VD", [{"id": "Q12771"}]),
+        ],
+    )
+
+
+def test_json_journal(tmp_path) -> None:
+    cache_file = tmp_path / "cache.json"
+    cache_file.write_text(json.dumps(JSON_CACHE, indent=2), encoding="utf-8")
+    cache = Cache(open_backend(cache_file))
+    assert cache.section("items")["Q39"] == {"name": "Switzerland"}
+
+    cache.section("items")["Q30"] = {"name": "United States of America"}
+    cache.section("regions/name")["Unknown"] = None
+    cache.flush()
+    # Only the changed keys are written
+    assert json.loads(cache_file.read_text(encoding="utf-8")) == JSON_CACHE
+    lines = [json.loads(line) for line in Path(f"{cache_file}.log").read_text(encoding="utf-8").splitlines()]
+    # With the written time
+    assert [line[:3] for line in lines] == [
+        ["items", "Q30", {"name": "United States of America"}],
+        ["regions/name", "Unknown", None],
+    ]
+    assert all(isinstance(line[3], float) for line in lines)
+    # Nothing to write
+    cache.flush()
+    assert len(Path(f"{cache_file}.log").read_text(encoding="utf-8").splitlines()) == 2
+
+    open_backend(cache_file).compact()
+    assert not Path(f"{cache_file}.log").exists()
+    compacted = json.loads(cache_file.read_text(encoding="utf-8"))
+    assert compacted["schema"] == SCHEMA_VERSION
+    assert compacted["values"]["items"]["Q30"] == {"name": "United States of America"}
+    assert compacted["values"]["regions"]["name"]["Unknown"] is None
+    # The entries of the version 1 file get its time
+    assert compacted["times"]["items"]["Q39"][0] < compacted["times"]["items"]["Q30"][0]
+
+    # The other instances see the compaction
+    assert cache.backend.get("items", "Q30") == {"name": "United States of America"}
+
+
+def test_visible_across_instances(cache_file) -> None:
+    cache1 = Cache(open_backend(cache_file))
+    cache2 = Cache(open_backend(cache_file))
+    assert "Q39" not in cache2.section("items")
+
+    cache1.section("items")["Q39"] = {"name": "Switzerland"}
+    cache1.flush()
+    assert cache2.section("items")["Q39"] == {"name": "Switzerland"}
+
+
+def test_concurrent_processes(cache_file) -> None:
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        pool.starmap(_write_keys, [(cache_file, worker) for worker in range(4)])
+
+    items = {key for section, key, _ in open_backend(cache_file).items() if section == "items"}
+    assert items == {f"Q{worker}_{number}" for worker in range(4) for number in range(20)}
+
+
+def test_fetch_lock(cache_file) -> None:
+    backend = open_backend(cache_file)
+    # Reentrant, and held for the other processes
+    with (
+        backend.fetch_lock("regions"),
+        backend.fetch_lock("regions"),
+        Path(f"{cache_file}.fetch.regions.lock").open("a") as lock_file,
+        pytest.raises(BlockingIOError),
+    ):
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    with Path(f"{cache_file}.fetch.regions.lock").open("a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    # By section
+    with (
+        backend.fetch_lock("fromAlias/en/Q23058"),
+        Path(f"{cache_file}.fetch.regions.lock").open("a") as lock_file,
+    ):
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        assert Path(f"{cache_file}.fetch.fromAlias-en-Q23058.lock").exists()
+    acquired = []
+
+    def _fetch_properties() -> None:
+        with backend.fetch_lock("properties"):
+            acquired.append(True)
+
+    with backend.fetch_lock("items"):
+        thread = threading.Thread(target=_fetch_properties)
+        thread.start()
+        thread.join(timeout=10)
+        assert acquired == [True]
+
+
+def test_threads(cache_file) -> None:
+    backend = open_backend(cache_file)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda number: backend.write({("items", f"Q{number}"): number}), range(8)))
+        assert sorted(executor.map(lambda number: backend.get("items", f"Q{number}"), range(8))) == list(
+            range(8)
+        )
+    assert backend.size() == 8
+
+
+def test_json_read_lock(tmp_path) -> None:
+    JsonCacheBackend(tmp_path / "cache.json").write({("items", "Q1"): {"name": "Item 1"}})
+    backend = JsonCacheBackend(tmp_path / "cache.json")
+    sizes = []
+    thread = threading.Thread(target=lambda: sizes.append(backend.size()))
+    with (tmp_path / "cache.json.lock").open("a") as lock_file:
+        # Written by another process
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        thread.start()
+        thread.join(timeout=0.5)
+        assert sizes == []
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+    thread.join()
+    assert sizes == [1]
+
+
+def test_main(tmp_path, monkeypatch) -> None:
+    json_file = tmp_path / "legacy.json"
+    json_file.write_text(json.dumps(JSON_CACHE), encoding="utf-8")
+    monkeypatch.setattr(
+        sys, "argv", ["shifter-pandas-cache", "import", str(json_file), str(tmp_path / "c.db")]
+    )
+    main()
+    monkeypatch.setattr(sys, "argv", ["shifter-pandas-cache", "compact", str(tmp_path / "c.db")])
+    main()
+    assert open_backend(tmp_path / "c.db").get("properties", "P297") == "ISO 3166-1 alpha-2 code"
+
+
+def test_ttl(cache_file, monkeypatch) -> None:
+    cache = Cache(open_backend(cache_file))
+    cache.section("items")["Q39"] = {"name": "Switzerland"}
+    cache.section("regions/name")["Switzerland"] = {"id": "Q39"}
+    cache.section("regions/name")["Unknown"] = None
+    cache.flush()
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 3600)
+    policy = CachePolicy(ttl={"items": 7200, "regions/name": 86400}, negative_ttl=60)
+    cache = Cache(open_backend(cache_file, policy))
+    assert "Q39" in cache.section("items")
+    assert "Switzerland" in cache.section("regions/name")
+    # The negative entries have a shorter time to live
+    assert "Unknown" not in cache.section("regions/name")
+
+    # The loaded values also expire
+    monkeypatch.setattr(time, "time", lambda: now + 3 * 3600)
+    assert "Q39" not in cache.section("items")
+    assert "Switzerland" in cache.section("regions/name")
+
+    # Written again
+    cache.section("items")["Q39"] = {"name": "Switzerland"}
+    cache.flush()
+    assert "Q39" in cache.section("items")
+    assert Cache(open_backend(cache_file, policy)).section("items")["Q39"] == {"name": "Switzerland"}
+
+    cache.backend.compact()
+    assert sorted(key for _, key, _ in open_backend(cache_file).items()) == ["Q39", "Switzerland"]
+
+
+def test_lru_eviction(cache_file, monkeypatch) -> None:
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache = Cache(open_backend(cache_file, CachePolicy(max_entries=10)))
+    for number in range(10):
+        cache.section("items")[f"Q{number}"] = {"name": f"Item {number}"}
+    cache.flush()
+
+    # Use the first item
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    assert cache.section("items")["Q0"] == {"name": "Item 0"}
+    cache.flush()
+
+    # Evicted over the margin
+    monkeypatch.setattr(time, "time", lambda: now + 20)
+    cache.section("items")["Q10"] = {"name": "Item 10"}
+    cache.flush()
+    assert cache.backend.size() == 11
+    cache.section("items")["Q11"] = {"name": "Item 11"}
+    cache.flush()
+    keys = {key for _, key, _ in open_backend(cache_file).items()}
+    assert len(keys) == 10
+    assert {"Q0", "Q10", "Q11"} <= keys
+
+
+def test_memory_tier(cache_file) -> None:
+    cache = Cache(open_backend(cache_file), memory_size=2)
+    items = cache.section("items")
+    items["Q1"] = {"name": "Item 1"}
+    items["Q2"] = {"name": "Item 2"}
+    assert items["Q1"] == {"name": "Item 1"}
+    # Q2 is the least recently used
+    items["Q3"] = {"name": "Item 3"}
+    assert items.values == {"Q1": {"name": "Item 1"}, "Q3": {"name": "Item 3"}}
+    assert cache.stats == CacheStats(hits=1, misses=0, evictions=1)
+    # Evicted before the flush
+    assert items["Q2"] == {"name": "Item 2"}
+    assert cache.stats == CacheStats(hits=1, misses=1, evictions=2)
+    cache.flush()
+    assert {(section, key): value for section, key, value in open_backend(cache_file).items()} == {
+        ("items", "Q1"): {"name": "Item 1"},
+        ("items", "Q2"): {"name": "Item 2"},
+        ("items", "Q3"): {"name": "Item 3"},
+    }
+
+    # Loaded again from the backend
+    assert items["Q1"] == {"name": "Item 1"}
+    assert "Q4" not in items
+    assert cache.stats == CacheStats(hits=1, misses=3, evictions=3)
+    assert len(items.values) == 2
+
+
+def test_decoded_on_get(cache_file) -> None:
+    backend = open_backend(cache_file)
+    backend.write({("items", "Q1"): {"name": "Item 1"}})
+    value = backend.get("items", "Q1")
+    value["name"] = "Changed"
+    assert backend.get("items", "Q1") == {"name": "Item 1"}
+
+
+def test_sqlite_migration(tmp_path) -> None:
+    connection = sqlite3.connect(tmp_path / "cache.sqlite")
+    with connection:
+        connection.execute(
+            "CREATE TABLE cache "
+            "(section TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (section, key))",
+        )
+        connection.execute("INSERT INTO cache VALUES ('items', 'Q39', '{\"name\": \"Switzerland\"}')")
+    connection.close()
+
+    backend = SqliteCacheBackend(tmp_path / "cache.sqlite")
+    value, written = backend.get_entry("items", "Q39")
+    assert value == {"name": "Switzerland"}
+    assert written == pytest.approx(time.time(), abs=60)
+    assert backend.connection.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    # Already migrated
+    assert SqliteCacheBackend(tmp_path / "cache.sqlite").get("items", "Q39") == {"name": "Switzerland"}
+
+
+def test_unsupported_schema(tmp_path) -> None:
+    (tmp_path / "cache.json").write_text(
+        json.dumps({"schema": SCHEMA_VERSION + 1, "values": {}, "times": {}})
+    )
+    with pytest.raises(ValueError, match="Unsupported cache schema version"):
+        JsonCacheBackend(tmp_path / "cache.json").get("items", "Q39")
+
+    connection = sqlite3.connect(tmp_path / "cache.sqlite")
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    connection.close()
+    with pytest.raises(ValueError, match="Unsupported cache schema version"):
+        SqliteCacheBackend(tmp_path / "cache.sqlite")
+
+
+def test_main_compact(cache_file, monkeypatch) -> None:
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now - 3600)
+    cache = Cache(open_backend(cache_file))
+    cache.section("items")["Q39"] = {"name": "Switzerland"}
+    cache.section("regions/name")["Unknown"] = None
+    cache.section("properties")["P297"] = "ISO 3166-1 alpha-2 code"
+    cache.flush()
+
+    monkeypatch.setattr(time, "time", lambda: now)
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["shifter-pandas-cache", "compact", "--ttl=items=60", "--negative-ttl=60", str(cache_file)],
+    )
+    main()
+    assert list(open_backend(cache_file).items()) == [("properties", "P297", "ISO 3166-1 alpha-2 code")]
+    assert not Path(f"{cache_file}.log").exists()
@@ -0,0 +1,231 @@
+import json
+import sys
+
+import pytest
+
+from shifter_pandas.gazetteer import (
+    PRIORITY_ALIAS,
+    PRIORITY_LABEL,
+    PRIORITY_RESOLVED,
+    Gazetteer,
+    GazetteerRegion,
+    add_iso_3166,
+    merge_regions,
+    normalize_name,
+    regions_from_cache,
+    write_gazetteer,
+)
+from shifter_pandas.wikidata_ import WikidataDatasource, gazetteer_main
+
+TYPES = ["continent", "country", "canton"]
+
+
+def _region(region_id, label, type_, names=(), codes=()):
+    region = GazetteerRegion(region_id, label, type_, codes=set(codes))
+    region.add_name(label, PRIORITY_LABEL)
+    for name in names:
+        region.add_name(name, PRIORITY_ALIAS)
+    return region
+
+
+@pytest.fixture
+def gazetteer(tmp_path):
+    regions = [
+        _region("Q39", "Switzerland", "country", ["Swiss Confederation", "Suisse"], ["CH", "CHE", "756"]),
+        _region("Q30", "United States of America", "country", ["America"], ["US", "USA", "840"]),
+        _region("Q46", "Europe", "continent"),
+        _region("Q4", "Europe", "country"),
+        _region("Q12771", "Vaud", "canton", ["Canton of Vaud"]),
+        _region("Q11917", "Geneva", "canton", ["Genève", "Switzerland"]),
+    ]
+    write_gazetteer(tmp_path / "gazetteer.bin", regions, "2026-01-01", TYPES)
+    gazetteer = Gazetteer(tmp_path / "gazetteer.bin")
+    yield gazetteer
+    gazetteer.close()
+
+
+def test_normalize_name() -> None:
+    assert normalize_name("  Trinidad & Tobago ") == "trinidad and tobago"
+    assert normalize_name("Côte d'Ivoire") == "cote d ivoire"
+    assert normalize_name("S. & Cent. America") == "s and cent america"
+    assert normalize_name("GENÈVE") == "geneve"
+
+
+def test_lookup(gazetteer) -> None:
+    assert gazetteer.version == "2026-01-01"
+    assert len(gazetteer) == 6
+    assert gazetteer.get_by_code("756") == {
+        "id": "Q39",
+        "url": "http://www.wikidata.org/entity/Q39",
+        "label": "Switzerland",
+        "type": "country",
+    }
+    assert gazetteer.get_by_code("che") is None
+    assert gazetteer.get_by_name("geneve")["id"] == "Q11917"
+    assert gazetteer.get_by_name("canton of vaud")["id"] == "Q12771"
+    assert gazetteer.get_by_name("Unknown") is None
+    # The continents have the precedence over the countries
+    assert gazetteer.get_by_name("EUROPE")["id"] == "Q46"
+    # The labels have the precedence over the aliases
+    assert gazetteer.get_by_name("Switzerland")["id"] == "Q39"
+
+    # The code first, then the name as a code, then the name
+    assert gazetteer.get_region("Suisse", "USA")["id"] == "Q30"
+    assert gazetteer.get_region("Suisse", "XXX")["id"] == "Q39"
+    assert gazetteer.get_region("US")["id"] == "Q30"
+    assert gazetteer.get_region(None, None) is None
+    assert {name for name, _ in gazetteer.names()} == {
+        "switzerland",
+        "swiss confederation",
+        "suisse",
+        "united states of america",
+        "america",
+        "europe",
+        "vaud",
+        "canton of vaud",
+        "geneva",
+        "geneve",
+    }
+
+
+def test_bad_file(tmp_path) -> None:
+    (tmp_path / "gazetteer.bin").write_bytes(b"SPGZ\x02\x00\x00\x00\x00\x00")
+    with pytest.raises(ValueError, match="Unsupported gazetteer file"):
+        Gazetteer(tmp_path / "gazetteer.bin")
+
+
+def test_regions_from_cache() -> None:
+    switzerland = {"id": "Q39", "url": "", "label": "Switzerland", "type": "country"}
+    regions = regions_from_cache(
+        [
+            ("regions/name", "Swiss", switzerland),
+            ("regions/name", "Other Europe", None),
+            ("regions/code", "CHE", switzerland),
+            ("items", "Q39", {"name": "Switzerland", "ISO 3166-1 alpha-2 code": "CH"}),
+            ("items", "Q30", {"name": "United States of America", "ISO 3166-1 alpha-2 code": "US"}),
+        ],
+    )
+    assert regions == {
+        "Q39": GazetteerRegion(
+            "Q39",
+            "Switzerland",
+            "country",
+            {"Switzerland": PRIORITY_LABEL, "Swiss": PRIORITY_RESOLVED},
+            {"CH", "CHE"},
+        ),
+    }
+
+    add_iso_3166(
+        regions,
+        {
+            "3166-1": [
+                {"alpha_2": "CH", "alpha_3": "CHE", "numeric": "756", "name": "Switzerland"},
+                {"alpha_2": "FR", "alpha_3": "FRA", "numeric": "250", "name": "France"},
+            ],
+        },
+    )
+    assert regions["Q39"].codes == {"CH", "CHE", "756"}
+    assert list(regions) == ["Q39"]
+
+    merged = merge_regions({"Q39": _region("Q39", "Swiss Confederation", "country", ["Schweiz"])}, regions)
+    assert merged["Q39"].label == "Swiss Confederation"
+    assert merged["Q39"].names == {
+        "Swiss Confederation": PRIORITY_LABEL,
+        "Schweiz": PRIORITY_ALIAS,
+        "Switzerland": PRIORITY_LABEL,
+        "Swiss": PRIORITY_RESOLVED,
+    }
+
+
+def test_cantons(tmp_path) -> None:
+    regions = {
+        "Q12771": _region("Q12771", "Vaud", "canton", codes=["CH-VD"]),
+        "Q11917": _region("Q11917", "Geneva", "canton", codes=["CH-GE"]),
+    }
+    add_iso_3166(
+        regions,
+        {
+            "3166-2": [
+                {"code": "CH-GE", "name": "Genève", "type": "Canton"},
+                {"code": "CH-ZH", "name": "Zürich", "type": "Canton"},
+            ],
+        },
+    )
+    assert regions["Q11917"].names == {"Geneva": PRIORITY_LABEL, "Genève": PRIORITY_ALIAS}
+    assert list(regions) == ["Q12771", "Q11917"]
+
+    write_gazetteer(tmp_path / "cantons.bin", regions.values(), "test", TYPES)
+    gazetteer = Gazetteer(tmp_path / "cantons.bin")
+    assert gazetteer.get_region("Genève") == {
+        "id": "Q11917",
+        "url": "http://www.wikidata.org/entity/Q11917",
+        "label": "Geneva",
+        "type": "canton",
+    }
+    assert gazetteer.get_region("VAUD")["id"] == "Q12771"
+    assert gazetteer.get_region(None, "CH-VD")["id"] == "Q12771"
+    assert gazetteer.get_region("Zürich") is None
+    gazetteer.close()
+
+
+def test_get_regions(gazetteer, tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("WIKIDATA_CACHE_FILE", str(tmp_path / "cache.json"))
+    # No SPARQL endpoint
+    wdds = WikidataDatasource("http://127.0.0.1:1/sparql", gazetteer=gazetteer)
+    regions = wdds.get_regions(names=["Suisse", "Genève", None], codes=[None, None, "840"])
+    assert [region and region["id"] for region in regions] == ["Q39", "Q11917", "Q30"]
+    # The gazetteer regions are not cached
+    assert wdds.cache.section("regions/name").values == {}
+
+    # The cache has the precedence
+    wdds.cache.section("regions/name")["Genève"] = {"id": "Q71", "url": "", "label": "Geneva", "type": "city"}
+    assert wdds.get_region("Genève")["id"] == "Q71"
+
+    # The aliases and the cached names without region also
+    wdds.custom_aliases["name"] = {"Suisse": None}
+    wdds.cache.section("regions/name")["Vaud"] = None
+    wdds.cache.section("regions/code")["840"] = None
+    assert wdds.get_regions(["Suisse", "Vaud", None], [None, None, "840"]) == [None, None, None]
+
+
+def test_bundled() -> None:
+    gazetteer = Gazetteer()
+    assert gazetteer.get_region("Trinidad & Tobago")["label"] == "Trinidad and Tobago"
+    assert gazetteer.get_region("Korea, Rep.", "KOR")["label"] == "South Korea"
+    assert gazetteer.get_region(None, "756")["label"] == "Switzerland"
+    assert "iso-codes" in gazetteer.version
+    gazetteer.close()
+
+
+def test_gazetteer_main(tmp_path, monkeypatch) -> None:
+    (tmp_path / "cache.json").write_text(
+        json.dumps(
+            {
+                "regions": {
+                    "name": {"Swiss": {"id": "Q39", "url": "", "label": "Switzerland", "type": "country"}},
+                    "code": {"CH-VD": {"id": "Q12771", "url": "", "label": "Vaud", "type": "canton"}},
+                },
+            },
+        ),
+    )
+    (tmp_path / "iso_3166-2.json").write_text(
+        json.dumps({"3166-2": [{"code": "CH-VD", "name": "Waadt", "type": "Canton"}]}),
+    )
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "shifter-pandas-gazetteer",
+            "--offline",
+            f"--cache={tmp_path / 'cache.json'}",
+            f"--iso-3166={tmp_path / 'iso_3166-2.json'}",
+            "--version=test",
+            str(tmp_path / "gazetteer.bin"),
+        ],
+    )
+    gazetteer_main()
+    gazetteer = Gazetteer(tmp_path / "gazetteer.bin")
+    assert gazetteer.version == "test"
+    assert gazetteer.get_by_name("swiss")["label"] == "Switzerland"
+    assert gazetteer.get_by_name("waadt")["type"] == "canton"
+    gazetteer.close()
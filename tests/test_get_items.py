@@ -0,0 +1,170 @@
+import contextlib
+import multiprocessing
+import os
+import time
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from conftest import StubHandler, StubServer
+
+from shifter_pandas.cache import CachePolicy, JsonCacheBackend
+from shifter_pandas.wikidata_ import PROPERTY_ISO_3166_1_ALPHA_2, PROPERTY_POPULATION, WikidataDatasource
+
+
+def _claim(datavalue: dict[str, Any], rank: str = "normal") -> dict[str, Any]:
+    return {"mainsnak": {"snaktype": "value", "datavalue": datavalue}, "rank": rank}
+
+
+def _entity(entity_id: str) -> dict[str, Any]:
+    if entity_id == PROPERTY_ISO_3166_1_ALPHA_2:
+        return {"id": entity_id, "labels": {"en": {"language": "en", "value": "ISO 3166-1 alpha-2 code"}}}
+    if entity_id == PROPERTY_POPULATION:
+        return {"id": entity_id, "labels": {"en": {"language": "en", "value": "population"}}}
+    if entity_id == "Q404":
+        return {"id": entity_id, "missing": ""}
+    number = int(entity_id[1:])
+    return {
+        "id": entity_id,
+        "labels": {"en": {"language": "en", "value": f"Item {number}"}},
+        "descriptions": {"en": {"language": "en", "value": f"Description {number}"}},
+        "claims": {
+            PROPERTY_ISO_3166_1_ALPHA_2: [_claim({"type": "string", "value": f"C{number}"})],
+            PROPERTY_POPULATION: [
+                _claim({"type": "quantity", "value": {"amount": "+1000", "unit": "1"}}),
+                _claim({"type": "quantity", "value": {"amount": f"+{number}", "unit": "1"}}, "preferred"),
+            ],
+        },
+    }
+
+
+class _ApiHandler(StubHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        params = {key: value[0] for key, value in parse_qs(urlparse(self.path).query).items()}
+        self.server.requests.append(params)
+        assert params["action"] == "wbgetentities"
+        entities = {entity_id: _entity(entity_id) for entity_id in params["ids"].split("|")}
+        self.send_json({"entities": entities, "success": 1})
+
+
+def _get_items(api_url: str, cache_file: str, batch: bool) -> list[dict[str, Any]]:
+    os.environ["WIKIDATA_CACHE_FILE"] = cache_file
+    wdds = WikidataDatasource(api_url=api_url)
+    with wdds.batch() if batch else contextlib.nullcontext():
+        return wdds.get_items([f"Q{number}" for number in range(1, 21)])
+
+
+@pytest.fixture
+def api(http_stub) -> StubServer:
+    return http_stub(_ApiHandler, requests=[])
+
+
+@pytest.fixture
+def wdds(api, tmp_path, monkeypatch) -> WikidataDatasource:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WIKIDATA_CACHE_FILE", str(tmp_path / "cache.json"))
+    return WikidataDatasource(api_url=f"{api.url}/w/api.php")
+
+
+def test_get_items(wdds, api) -> None:
+    item_ids = [f"Q{number}" for number in range(1, 121)]
+    items = wdds.get_items(
+        [*item_ids, None, "Q1"],
+        properties=[PROPERTY_ISO_3166_1_ALPHA_2, PROPERTY_POPULATION],
+        with_id=True,
+        with_description=True,
+        prefix="Wikidata",
+    )
+    # One request for the properties, then 3 concurrent requests of at most 50 items
+    assert len(api.requests[0]["ids"].split("|")) == 2
+    assert sorted(len(request["ids"].split("|")) for request in api.requests[1:]) == [20, 50, 50]
+    assert len(items) == 122
+    assert items[0] == {
+        "WikidataId": "Q1",
+        "WikidataName": "Item 1",
+        "WikidataDescription": "Description 1",
+        "WikidataIso3166_1Alpha_2Code": "C1",
+        "WikidataPopulation": 1.0,
+    }
+    assert items[120] == {
+        "WikidataId": None,
+        "WikidataName": None,
+        "WikidataDescription": None,
+        "WikidataIso3166_1Alpha_2Code": None,
+        "WikidataPopulation": None,
+    }
+    assert items[121] == items[0]
+
+    # Everything is now cached
+    assert wdds.get_item("Q120", properties=[PROPERTY_POPULATION]) == {
+        "Name": "Item 120",
+        "Population": 120.0,
+    }
+    assert len(api.requests) == 4
+    cache = list(JsonCacheBackend("cache.json").items())
+    assert {key: value for section, key, value in cache if section == "properties"} == {
+        PROPERTY_ISO_3166_1_ALPHA_2: "ISO 3166-1 alpha-2 code",
+        PROPERTY_POPULATION: "population",
+    }
+    assert len([key for section, key, _ in cache if section == "items"]) == 120
+
+
+def test_get_items_missing_property(wdds, api) -> None:
+    assert wdds.get_items(["Q1", "Q404"]) == [{"Name": "Item 1"}, {"Name": None}]
+    assert len(api.requests) == 1
+
+    # The missing properties of the cached items are fetched
+    assert wdds.get_items(["Q1"], properties=[PROPERTY_ISO_3166_1_ALPHA_2]) == [
+        {"Name": "Item 1", "Iso3166_1Alpha_2Code": "C1"},
+    ]
+    assert [request["ids"] for request in api.requests[1:]] == [PROPERTY_ISO_3166_1_ALPHA_2, "Q1"]
+
+
+def _used(item_id: str) -> float:
+    return next(used for _, key, _, _, used in JsonCacheBackend("cache.json").entries() if key == item_id)
+
+
+def test_batch(wdds, monkeypatch) -> None:
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now)
+    # The used times are recorded with a maximum number of entries
+    wdds.cache.backend.policy = CachePolicy(max_entries=100)
+    with wdds.batch():
+        wdds.get_items(["Q1"])
+        with wdds.batch():
+            wdds.get_items(["Q2"])
+        # The fetched entries and the used times only at the end of the outer batch
+        assert list(JsonCacheBackend("cache.json").items()) == []
+        monkeypatch.setattr(time, "time", lambda: now + 10)
+        wdds.get_items(["Q1", "Q3"])
+        assert list(JsonCacheBackend("cache.json").items()) == []
+    assert {key for _, key, _ in JsonCacheBackend("cache.json").items()} == {"Q1", "Q2", "Q3"}
+    assert _used("Q1") == now + 10
+
+    wdds.flush_interval = 0
+    with wdds.batch():
+        monkeypatch.setattr(time, "time", lambda: now + 20)
+        wdds.get_items(["Q1", "Q4"])
+        # The flush interval is elapsed
+        assert _used("Q1") == now + 20
+        wdds.flush_interval = 3600
+        monkeypatch.setattr(time, "time", lambda: now + 30)
+        wdds.get_items(["Q1", "Q5"])
+        assert _used("Q1") == now + 20
+        wdds.flush()
+        assert _used("Q1") == now + 30
+
+
+@pytest.mark.parametrize("batch", [False, True])
+@pytest.mark.parametrize("cache_name", ["cache.json", "cache.sqlite"])
+def test_shared_across_processes(wdds, api, tmp_path, cache_name, batch) -> None:
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        results = pool.starmap(_get_items, [(wdds.api_url, str(tmp_path / cache_name), batch)] * 4)
+
+    assert all(items == results[0] for items in results)
+    if batch:
+        # The entries are written at the end of the batches
+        assert 1 <= len(api.requests) <= 4
+    else:
+        # Fetched once, the other processes wait for the first one and read the cache
+        assert len(api.requests) == 1
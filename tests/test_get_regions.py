@@ -0,0 +1,197 @@
+import json
+import re
+from typing import Any
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from conftest import StubHandler, StubServer
+
+from shifter_pandas.cache import JsonCacheBackend
+from shifter_pandas.wikidata_ import (
+    ELEMENT_CONTINENT,
+    ELEMENT_COUNTRY,
+    ELEMENT_GEOPOLITICAL_REGION,
+    WikidataDatasource,
+)
+
+ITEMS = [
+    {"id": "Q39", "label": "Switzerland", "instance_of": [ELEMENT_COUNTRY], "P297": "CH", "P298": "CHE"},
+    {
+        "id": "Q30",
+        "label": "United States of America",
+        "instance_of": [ELEMENT_COUNTRY],
+        "P297": "US",
+        "P298": "USA",
+        "aliases": ["US", "USA", "America"],
+        "population": 331449281,
+    },
+    {"id": "Q46", "label": "Europe", "instance_of": [ELEMENT_CONTINENT]},
+    {"id": "Q4", "label": "Europe", "instance_of": [ELEMENT_COUNTRY]},
+    {"id": "Q27", "label": "Ireland", "instance_of": [ELEMENT_COUNTRY], "P297": "IE", "P298": "IRL"},
+    {"id": "Q5", "label": "Ireland island", "instance_of": [], "P298": "IRL"},
+    {"id": "Q7", "label": "Other code", "instance_of": [], "P298": "OTH"},
+    {
+        "id": "Q12",
+        "label": "Middle East",
+        "instance_of": [ELEMENT_GEOPOLITICAL_REGION],
+        "aliases": ["Middle East and North Africa"],
+    },
+    # More items than the limit by value
+    *(
+        {
+            "id": f"Q{1000 + number}",
+            "label": f"Great {number}",
+            "instance_of": [ELEMENT_COUNTRY],
+            "aliases": [f"Great Region {number}"],
+        }
+        for number in range(25)
+    ),
+]
+
+
+class _SparqlHandler(StubHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        query = parse_qs(urlparse(self.path).query)["query"][0]
+        self.server.queries.append(query)
+        self.send_json({"results": {"bindings": _run(query)}}, content_type="application/sparql-results+json")
+
+
+def _run(query: str) -> list[dict[str, Any]]:
+    """Minimal evaluation of the region queries."""
+    values_match = re.search(r"VALUES \?value \{ (.*) \}", query)
+    assert values_match is not None, query
+    values = [json.loads(value) for value in re.findall(r'"(?:[^"\\]|\\.)*"', values_match.group(1))]
+    instances_match = re.search(r"VALUES \?instance \{ (.*) \}", query)
+    instances = (
+        [i.removeprefix("wd:") for i in instances_match.group(1).split()] if instances_match else [None]
+    )
+    code_match = re.search(r"\(ps:(P29[78])\) \?value", query)
+
+    bindings = []
+    for value in values:
+        for item in ITEMS:
+            for instance in instances:
+                if instance is not None and instance not in item["instance_of"]:
+                    continue
+                if "wdt:P1082" in query and "population" not in item:
+                    continue
+                if code_match:
+                    match = item.get(code_match.group(1)) == value
+                elif "rdfs:label" in query:
+                    match = item["label"].lower() == value
+                else:
+                    match = any(value in alias for alias in item.get("aliases", []))
+                if match:
+                    binding = {
+                        "value": {"type": "literal", "value": value},
+                        "item": {"type": "uri", "value": f"http://www.wikidata.org/entity/{item['id']}"},
+                        "itemLabel": {"type": "literal", "value": item["label"]},
+                    }
+                    if instance is not None:
+                        binding["instance"] = {
+                            "type": "uri",
+                            "value": f"http://www.wikidata.org/entity/{instance}",
+                        }
+                    if "population" in item:
+                        binding["population"] = {"type": "literal", "value": str(item["population"])}
+                    bindings.append(binding)
+    limit_match = re.search(r"LIMIT (\d+)", query)
+    return bindings[: int(limit_match.group(1))] if limit_match else bindings
+
+
+@pytest.fixture
+def sparql(http_stub) -> StubServer:
+    return http_stub(_SparqlHandler, queries=[])
+
+
+@pytest.fixture
+def wdds(sparql, tmp_path, monkeypatch) -> WikidataDatasource:
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("WIKIDATA_CACHE_FILE", str(tmp_path / "cache.json"))
+    return WikidataDatasource(f"{sparql.url}/sparql", gazetteer=False)
+
+
+def test_get_regions_codes(wdds, sparql) -> None:
+    regions = wdds.get_regions(codes=["CHE", "USA", "CH", "IRL", "OTH", "XXX", "OWID_WRL"])
+    assert [region and (region["id"], region["type"]) for region in regions] == [
+        ("Q39", "country"),
+        ("Q30", "country"),
+        ("Q39", "country"),
+        ("Q27", "country"),
+        ("Q7", "other"),
+        None,
+        None,
+    ]
+    # Categories by alpha-2 and by alpha-3, then alpha-3 without category
+    assert len(sparql.queries) == 3
+    assert wdds.cache.section("regions/code")["XXX"] is None
+
+    # Everything is now cached
+    assert wdds.get_regions(codes=["CHE", "XXX"]) == [regions[0], None]
+    assert len(sparql.queries) == 3
+    assert JsonCacheBackend("cache.json").get("regions/code", "CHE")["id"] == "Q39"
+
+
+def test_get_regions_names(wdds) -> None:
+    wdds.set_alias("World", "World", "Q16502", "World")
+    regions = wdds.get_regions(
+        names=["Switzerland", "europe", "US", "America", "Middle East and North Africa", "Unknown", "World"],
+    )
+    assert [region and (region["id"], region["type"]) for region in regions] == [
+        ("Q39", "country"),
+        # The continents have the precedence over the countries
+        ("Q46", "continent"),
+        ("Q30", "country"),
+        ("Q30", "country"),
+        ("Q12", "geographic region"),
+        None,
+        ("Q16502", "World"),
+    ]
+    assert "population" not in regions[3]
+    assert wdds.cache.section("regions/name")["Unknown"] is None
+    assert "World" not in wdds.cache.section("regions/name")
+    assert wdds.get_region("europe") == regions[1]
+
+
+def test_get_regions_limit(wdds, monkeypatch) -> None:
+    items = []
+    original = wdds._query_regions
+
+    def _query_regions(*args: Any, **kwargs: Any) -> dict[str, list[dict[str, Any]]]:
+        result = original(*args, **kwargs)
+        items.append(result)
+        return result
+
+    monkeypatch.setattr(wdds, "_query_regions", _query_regions)
+    # In the same chunk, the first value has 25 items
+    regions = wdds.get_regions(["Great Region", "Middle East and North Africa"])
+    assert [region and region["id"] for region in regions] == ["Q1000", "Q12"]
+    # The queries with and without population are concurrent
+    assert [len(result["Great Region"]) for result in items if "Great Region" in result] == [10]
+
+
+def test_get_regions_name_and_code(wdds) -> None:
+    regions = wdds.get_regions(names=["Switzerland", None, "Ireland"], codes=["CHE", "USA", "XXX"])
+    assert [region and region["id"] for region in regions] == ["Q39", "Q30", "Q27"]
+    assert wdds.cache.section("regions/code").values == {"CHE": regions[0], "USA": regions[1], "XXX": None}
+    assert wdds.cache.section("regions/name").values == {"Ireland": regions[2]}
+
+    with pytest.raises(ValueError, match="same length"):
+        wdds.get_regions(names=["Switzerland"], codes=[])
+
+
+def test_get_regions_data_frame(wdds, sparql) -> None:
+    wdds.cache.section("items")["Q39"] = {"name": "Switzerland", "description": ""}
+    wdds.cache.section("items")["Q46"] = {"name": "Europe", "description": ""}
+    regions = wdds.get_regions_data_frame(
+        ["Switzerland", "europe", "Unknown"] * 57,
+        wikidata_id=True,
+        wikidata_name=True,
+        wikidata_type=True,
+    )
+    # Each distinct name is resolved once
+    assert len(sparql.queries) == 3
+    assert list(regions.columns) == ["WikidataType", "WikidataId", "WikidataName"]
+    assert len(regions) == 3 * 57
+    assert regions.loc["europe"].iloc[0].tolist() == ["continent", "Q46", "Europe"]
+    assert regions.loc["Unknown"].isna().all().all()
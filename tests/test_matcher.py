@@ -0,0 +1,105 @@
+from shifter_pandas.gazetteer import (
+    PRIORITY_ALIAS,
+    PRIORITY_LABEL,
+    Gazetteer,
+    GazetteerRegion,
+    write_gazetteer,
+)
+from shifter_pandas.matcher import RegionMatcher, clean_label
+from shifter_pandas.wikidata_ import WikidataDatasource
+
+
+def _region(region_id, label, type_):
+    return {
+        "id": region_id,
+        "url": f"http://www.wikidata.org/entity/{region_id}",
+        "label": label,
+        "type": type_,
+    }
+
+
+SWITZERLAND = _region("Q39", "Switzerland", "country")
+CENTRAL_AMERICA = _region("Q27611", "Central America", "subcontinent")
+SOUTH_AMERICA = _region("Q18", "South America", "continent")
+NAMES = [
+    ("Switzerland", SWITZERLAND),
+    ("Swiss Confederation", SWITZERLAND),
+    ("Central America", CENTRAL_AMERICA),
+    ("South America", SOUTH_AMERICA),
+    ("Trinidad and Tobago", _region("Q754", "Trinidad and Tobago", "country")),
+    ("Asia-Pacific", _region("Q1070940", "Asia-Pacific", "geographic region")),
+    ("Asia", _region("Q48", "Asia", "continent")),
+]
+
+
+def test_clean_label() -> None:
+    assert clean_label("Total S. & Cent. America") == "south and central america"
+    assert clean_label("  Trinidad & Tobago #") == "trinidad and tobago"
+    assert clean_label("St. Kitts and Nevis") == "saint kitts and nevis"
+    assert clean_label("Other Europe") is None
+    assert clean_label("of which: OECD") is None
+    assert clean_label("Non-OECD") is None
+    assert clean_label("Total") == "total"
+
+
+def test_candidates() -> None:
+    matcher = RegionMatcher(NAMES, ["continent", "country", "subcontinent"], threshold=0.5)
+    candidates = matcher.candidates(
+        ["Total S. & Cent. America", "Swiss Confederation", "Swizerland", "Other Asia Pacific", None, "Xyz"],
+        limit=3,
+    )
+    assert [[(region["id"], round(score, 2)) for region, score in label] for label in candidates] == [
+        # Central America and South America cover only a part of the label
+        [],
+        [("Q39", 1.0)],
+        # Each region once
+        [("Q39", 0.76)],
+        [],
+        [],
+        [],
+    ]
+    assert matcher.match(["Total Asia Pacific", "Trinidad & Tobago", "Europe"]) == [
+        _region("Q1070940", "Asia-Pacific", "geographic region"),
+        _region("Q754", "Trinidad and Tobago", "country"),
+        None,
+    ]
+    # The regions are copied
+    matcher.match(["Switzerland"])[0]["label"] = "Changed"
+    assert matcher.match(["Switzerland"])[0]["label"] == "Switzerland"
+
+    assert RegionMatcher(NAMES, threshold=0.7).match(
+        ["Total S. & Cent. America", "Swizerland", "Cent. Americas", "S. America"]
+    ) == [
+        None,
+        SWITZERLAND,
+        CENTRAL_AMERICA,
+        SOUTH_AMERICA,
+    ]
+    assert RegionMatcher(NAMES, threshold=0.8).match(["Total S. & Cent. America", "Swizerland"]) == [
+        None,
+        None,
+    ]
+
+
+def test_get_regions_fuzzy(tmp_path, monkeypatch) -> None:
+    monkeypatch.setenv("WIKIDATA_CACHE_FILE", str(tmp_path / "cache.json"))
+    regions: dict[str, GazetteerRegion] = {}
+    for name, region in NAMES:
+        gazetteer_region = regions.setdefault(
+            region["id"], GazetteerRegion(region["id"], region["label"], region["type"])
+        )
+        gazetteer_region.add_name(region["label"], PRIORITY_LABEL)
+        gazetteer_region.add_name(name, PRIORITY_ALIAS)
+    write_gazetteer(tmp_path / "gazetteer.bin", regions.values(), "test", ["continent", "country"])
+
+    # No SPARQL endpoint
+    wdds = WikidataDatasource(
+        "http://127.0.0.1:1/sparql",
+        gazetteer=Gazetteer(tmp_path / "gazetteer.bin"),
+        fuzzy_threshold=0.7,
+    )
+    assert wdds.get_regions(["Swiss Confederation", "Swizerland", "Total Asia Pacific"]) == [
+        SWITZERLAND,
+        SWITZERLAND,
+        _region("Q1070940", "Asia-Pacific", "geographic region"),
+    ]
@@ -1,6 +1,289 @@
 # https://www.bfs.admin.ch/bfs/fr/home/statistiques/catalogues-banques-donnees/donnees.assetdetail.18904904.html
 
-from shifter_pandas.ofs import OFSDatasource
+import fnmatch
+import itertools
+import json
+import math
+from typing import Any
+
+import pandas as pd
+import pytest
+import requests
+from conftest import StubHandler, StubServer
+
+from shifter_pandas.ofs import OFSDatasource, combine_json_stat, decode_json_stat, split_query
+from shifter_pandas.transport import Transport
+
+
+def _dimension(label: str, labels: list[str]) -> dict[str, Any]:
+    return {
+        "label": label,
+        "category": {
+            "index": {str(index): index for index in range(len(labels))},
+            "label": {str(index): value for index, value in enumerate(labels)},
+        },
+    }
+
+
+DATASET = {
+    "dimension": {
+        "id": ["unit", "canton", "year"],
+        "unit": _dimension("Unité", ["Terajoules", "Gigawatt-hours"]),
+        "canton": _dimension("Canton", ["Vaud", "Genève", "Valais"]),
+        "year": _dimension("Année", [str(year) for year in range(2000, 2004)]),
+    },
+    "value": [*range(23), None],
+}
+
+
+def _decode_loops(dataset: dict[str, Any]) -> dict[str, Any]:
+    """Decode the JSON-stat dataset with the loops, as it was done before the vectorized decoding."""
+    values = {"values": dataset["value"]}
+    length = 1
+    total_length = len(dataset["value"])
+    for dimension_id in dataset["dimension"]["id"]:
+        dimension = dataset["dimension"][dimension_id]
+        current_length = len(dimension["category"]["index"])
+        number = int(total_length / (length * current_length))
+        dimension_value = list(dataset["value"])
+        for index_x in range(length):
+            for index_y, value in enumerate(dimension["category"]["label"].values()):
+                for index_z in range(number):
+                    dimension_value[index_x * current_length * number + index_y * number + index_z] = value
+        values[dimension["label"]] = dimension_value
+        length *= current_length
+    return values
+
+
+class _PxWebHandler(StubHandler):
+    def do_POST(self) -> None:  # noqa: N802
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_json({"dataset": DATASET})
+
+
+@pytest.fixture
+def url(http_stub, tmp_path, monkeypatch) -> str:
+    monkeypatch.chdir(tmp_path)
+    return f"{http_stub(_PxWebHandler).url}/px.px"
+
+
+VARIABLES = [
+    {
+        "code": "Kanton",
+        "text": "Canton",
+        "values": [str(number) for number in range(26)],
+        "valueTexts": [f"Canton {number}" for number in range(26)],
+        "elimination": True,
+    },
+    {
+        "code": "Jahr",
+        "text": "Année",
+        "values": [str(year) for year in range(2000, 2020)],
+        "valueTexts": [str(year) for year in range(2000, 2020)],
+        "time": True,
+    },
+    {"code": "Typ", "text": "Type", "values": ["a", "b", "c"], "valueTexts": ["A", "B", "C"]},
+]
+
+
+class _LimitedPxWebHandler(StubHandler):
+    # Answer a 403 when the query selects more than the `max_cells` server attribute
+
+    def do_GET(self) -> None:  # noqa: N802
+        with self.server.lock:
+            self.server.metadata_requests += 1
+        self.send_json({"title": "Test", "variables": VARIABLES})
+
+    def do_POST(self) -> None:  # noqa: N802
+        query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.queries.append(query)
+        selections = {item["code"]: item["selection"] for item in query["query"]}
+        dimensions = {}
+        for variable in VARIABLES:
+            texts = dict(zip(variable["values"], variable["valueTexts"], strict=True))
+            selection = selections.get(variable["code"])
+            if selection is None:
+                if variable.get("elimination"):
+                    continue
+                codes = variable["values"]
+            elif selection["filter"] == "all":
+                codes = [
+                    code
+                    for code in variable["values"]
+                    if any(fnmatch.fnmatchcase(code, pattern) for pattern in selection["values"])
+                ]
+            else:
+                # In the order of the table
+                codes = [code for code in variable["values"] if code in selection["values"]]
+            dimensions[variable["code"]] = {
+                "label": variable["text"],
+                "category": {
+                    "index": {code: index for index, code in enumerate(codes)},
+                    "label": {code: texts[code] for code in codes},
+                },
+            }
+        if (
+            math.prod(len(dimension["category"]["index"]) for dimension in dimensions.values())
+            > self.server.max_cells
+        ):
+            self.send_json({"error": "Too many values selected"}, status=403)
+            return
+        values = [
+            sum(hash(code) % 1000 for code in cell)
+            for cell in itertools.product(
+                *[dimension["category"]["index"] for dimension in dimensions.values()]
+            )
+        ]
+        self.send_json({"dataset": {"dimension": {"id": list(dimensions), **dimensions}, "value": values}})
+
+
+@pytest.fixture
+def limited(http_stub) -> StubServer:
+    return http_stub(_LimitedPxWebHandler, max_cells=100, queries=[], metadata_requests=0)
+
+
+@pytest.fixture
+def limited_url(limited, tmp_path, monkeypatch) -> str:
+    monkeypatch.chdir(tmp_path)
+    return f"{limited.url}/px.px"
+
+
+def test_split_query() -> None:
+    query = {
+        "query": [
+            {"code": "Kanton", "selection": {"filter": "item", "values": ["1", "2", "3"]}},
+            {"code": "Jahr", "selection": {"filter": "all", "values": ["201*"]}},
+        ],
+        "response": {"format": "json-stat"},
+    }
+    # 3 cantons, 10 years and 3 types
+    assert split_query(query, VARIABLES, 90) == [query]
+    queries = split_query(query, VARIABLES, 40)
+    assert len(queries) == 3
+    assert queries[0]["query"][0] == query["query"][0]
+    assert queries[0]["query"][1] == {
+        "code": "Jahr",
+        "selection": {"filter": "item", "values": ["2010", "2011", "2012", "2013"]},
+    }
+    assert queries[0]["response"] == {"format": "json-stat"}
+
+    # The types are not in the query
+    queries = split_query(query, VARIABLES, 2)
+    # 10 years, 3 cantons, and 2 chunks of types
+    assert len(queries) == 60
+    assert queries[0]["query"][2] == {"code": "Typ", "selection": {"filter": "item", "values": ["a", "b"]}}
+
+    with pytest.raises(ValueError, match="at most 2 cells"):
+        split_query(
+            {"query": [{"code": "Jahr", "selection": {"filter": "top", "values": ["3"]}}]}, VARIABLES, 2
+        )
+
+
+def test_datasource_chunks(limited, limited_url) -> None:
+    query = {
+        "query": [
+            {"code": "Kanton", "selection": {"filter": "all", "values": ["*"]}},
+            {"code": "Jahr", "selection": {"filter": "item", "values": ["2005", "2001", "2010"]}},
+        ],
+        "response": {"format": "json-stat"},
+    }
+    with pytest.raises(requests.HTTPError):
+        OFSDatasource(limited_url, max_cells=None).datasource(query)
+
+    assert limited.metadata_requests == 0
+
+    limited.queries = []
+    ofs = OFSDatasource(limited_url, transport=Transport(max_workers=3), max_cells=100)
+    data_frame = ofs.datasource(query)
+    # The refused query, then 11, 11 and 4 cantons
+    assert len(limited.queries) == 4
+    assert limited.metadata_requests == 1
+    assert len(data_frame) == 26 * 3 * 3
+
+    limited.queries = []
+    ofs.datasource(query)
+    # Split with the known metadata
+    assert len(limited.queries) == 3
+    assert limited.metadata_requests == 1
+
+    limited.max_cells = 1000
+    expected = OFSDatasource(limited_url, max_cells=None).datasource(query)
+    pd.testing.assert_frame_equal(data_frame, expected)
+    assert data_frame["Année"].cat.categories.tolist() == ["2001", "2005", "2010"]
+
+
+def test_datasource_chunks_order(limited, limited_url) -> None:
+    query = {
+        "query": [
+            {"code": "Kanton", "selection": {"filter": "item", "values": ["3", "1"]}},
+            {"code": "Jahr", "selection": {"filter": "item", "values": ["2005", "2001", "2010"]}},
+        ],
+        "response": {"format": "json-stat"},
+    }
+    # 2 cantons, 3 years and 3 types
+    expected = OFSDatasource(limited_url).datasource(query)
+    assert limited.metadata_requests == 0
+
+    limited.max_cells = 6
+    limited.queries = []
+    data_frame = OFSDatasource(limited_url, max_cells=6).datasource(query)
+    # The refused query, then a query by year, sent concurrently
+    assert sorted(query["query"][1]["selection"]["values"] for query in limited.queries[1:]) == [
+        ["2001"],
+        ["2005"],
+        ["2010"],
+    ]
+    pd.testing.assert_frame_equal(data_frame, expected)
+    assert data_frame["Année"].cat.categories.tolist() == ["2001", "2005", "2010"]
+
+
+def test_combine_json_stat() -> None:
+    pieces = [
+        decode_json_stat(
+            {
+                "dimension": {
+                    "id": ["year", "type"],
+                    "year": _dimension("Année", [year]),
+                    "type": _dimension("Type", ["A", "B"]),
+                },
+                "value": values,
+            }
+        )
+        for year, values in (("2005", [1, 2]), ("2001", [3, 4]))
+    ]
+    # In the order of the chunks
+    assert combine_json_stat(pieces)["values"] == [1, 2, 3, 4]
+    # In the order of the table
+    values = combine_json_stat(pieces, VARIABLES)
+    assert values["values"] == [3, 4, 1, 2]
+    assert values["Année"].categories.tolist() == ["2001", "2005"]
+    assert values["Type"].tolist() == ["A", "B", "A", "B"]
+
+
+def test_decode_json_stat() -> None:
+    values = decode_json_stat(DATASET)
+    assert list(values) == ["values", "Unité", "Canton", "Année"]
+    assert isinstance(values["Canton"], pd.Categorical)
+    assert list(values["Canton"].categories) == ["Vaud", "Genève", "Valais"]
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(values).astype({"Unité": str, "Canton": str, "Année": str}),
+        pd.DataFrame(_decode_loops(DATASET)),
+    )
+
+
+def test_datasource_units(url) -> None:
+    data_frame = OFSDatasource(url, max_cells=None).datasource({}, unit_dimension="Unité")
+    assert data_frame["Unité"].cat.categories.tolist() == ["J"]
+    assert data_frame["values"].tolist()[:2] == [0.0, 1e12]
+    assert data_frame["values"].tolist()[12:14] == [12 * 3.6e12, 13 * 3.6e12]
+    assert pd.isna(data_frame["values"].iloc[23])
+    assert data_frame["Canton"].tolist()[:5] == ["Vaud"] * 4 + ["Genève"]
+
+
+def test_datasource_strings(url) -> None:
+    data_frame = OFSDatasource(url, max_cells=None).datasource({}, categorical=False)
+    pd.testing.assert_frame_equal(data_frame, pd.DataFrame(_decode_loops(DATASET)))
 
 
 def test_ofs():
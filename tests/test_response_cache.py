@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+from conftest import StubHandler, StubServer
+
+from shifter_pandas.ofs import OFSDatasource
+from shifter_pandas.transport import ResponseCache, Transport
+
+JSON_STAT = {
+    "dataset": {
+        "dimension": {
+            "id": ["Canton", "Year"],
+            "Canton": {
+                "label": "Canton",
+                "category": {"index": {"1": 0, "2": 1}, "label": {"1": "Vaud", "2": "Genève"}},
+            },
+            "Year": {"label": "Year", "category": {"index": {"0": 0}, "label": {"0": "2020"}}},
+        },
+        "value": [1, 2],
+    },
+}
+
+
+class _PxWebHandler(StubHandler):
+    # The `etag` and `last_modified` server attributes enable the validators headers
+
+    def do_POST(self) -> None:  # noqa: N802
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.requests.append(dict(self.headers))
+        body = json.dumps(JSON_STAT).encode()
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if (self.server.etag and self.headers.get("If-None-Match") == etag) or (
+            self.server.last_modified
+            and self.headers.get("If-Modified-Since") == "Wed, 01 Jan 2020 00:00:00 GMT"
+        ):
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if self.server.etag:
+            self.send_header("ETag", etag)
+        if self.server.last_modified:
+            self.send_header("Last-Modified", "Wed, 01 Jan 2020 00:00:00 GMT")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def px(http_stub) -> StubServer:
+    return http_stub(_PxWebHandler, etag=True, last_modified=True, requests=[])
+
+
+@pytest.fixture
+def url(px, tmp_path, monkeypatch) -> str:
+    monkeypatch.chdir(tmp_path)
+    return f"{px.url}/px.px"
+
+
+def test_key() -> None:
+    assert ResponseCache.key("post", "http://x/", {"a": 1, "b": [1, 2]}) == ResponseCache.key(
+        "POST", "http://x/", {"b": [1, 2], "a": 1}
+    )
+    assert ResponseCache.key("POST", "http://x/", {"a": 1}) != ResponseCache.key(
+        "POST", "http://y/", {"a": 1}
+    )
+    assert ResponseCache.key("POST", "http://x/", {"a": 1}) != ResponseCache.key(
+        "POST", "http://x/", {"a": 2}
+    )
+
+
+def test_ofs_cache(px, url, tmp_path) -> None:
+    transport = Transport()
+    ofs = OFSDatasource(url, transport=transport, cache_dir=tmp_path / "ofs", max_cells=None)
+    query = {"query": [], "response": {"format": "json-stat"}}
+    data_frame = ofs.datasource(query)
+    assert data_frame["values"].tolist() == [1, 2]
+    assert data_frame["Canton"].tolist() == ["Vaud", "Genève"]
+    assert len(px.requests) == 1
+
+    # Fresh, no request
+    assert ofs.datasource({"response": {"format": "json-stat"}, "query": []}).equals(data_frame)
+    assert len(px.requests) == 1
+    assert transport.stats.cache_hits == 1
+
+    # Expired, revalidated
+    ofs.cache.ttl = 0
+    assert ofs.datasource(query).equals(data_frame)
+    assert len(px.requests) == 2
+    assert px.requests[1]["If-None-Match"].startswith('"')
+    assert px.requests[1]["If-Modified-Since"] == "Wed, 01 Jan 2020 00:00:00 GMT"
+    assert transport.stats.not_modified == 1
+    # The revalidation makes the response fresh again
+    ofs.cache.ttl = 3600
+    assert ofs.datasource(query).equals(data_frame)
+    assert len(px.requests) == 2
+
+
+def test_without_validators(px, url, tmp_path) -> None:
+    px.etag = False
+    px.last_modified = False
+    transport = Transport()
+    cache = ResponseCache(tmp_path / "cache", ttl=0)
+    for _ in range(2):
+        assert transport.request("POST", url, cache=cache, json={}).json() == JSON_STAT
+    assert "If-None-Match" not in px.requests[1]
+    assert "If-Modified-Since" not in px.requests[1]
+    assert transport.stats.not_modified == 0
+
+
+def test_lru_eviction(url, tmp_path) -> None:
+    transport = Transport()
+    size = len(json.dumps(JSON_STAT))
+    cache = ResponseCache(tmp_path / "cache", max_size=size * 3)
+    for number in range(3):
+        transport.request("POST", url, cache=cache, json={"number": number})
+    assert cache.size() == size * 3
+
+    # Make the first response the most recently used
+    for number in range(3):
+        used = time.time() - 10 + number
+        os.utime(tmp_path / "cache" / f"{cache.key('POST', url, {'number': number})}.json", (used, used))
+    assert cache.get(cache.key("POST", url, {"number": 0})) is not None
+
+    transport.request("POST", url, cache=cache, json={"number": 3})
+    assert cache.size() == size * 3
+    assert [cache.get(cache.key("POST", url, {"number": number})) is not None for number in range(4)] == [
+        True,
+        False,
+        True,
+        True,
+    ]
@@ -0,0 +1,124 @@
+import pandas as pd
+import pytest
+
+from shifter_pandas.bp import BPDatasource
+from shifter_pandas.scan import Scan
+from shifter_pandas.worldbank import WorldbankBulkDatasource, WorldbankDatasource
+
+WORLDBANK_FILE = "tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip"
+
+
+def test_scan_filters() -> None:
+    calls = []
+
+    def _collect(filters, columns) -> pd.DataFrame:
+        calls.append((filters, columns))
+        return pd.DataFrame({"Year": [2000], "Value": [1.0], "Region": ["World"]})
+
+    scan = Scan(_collect, ["regions", "from_year", "to_year"])
+    filtered = (
+        scan.filter(regions=["World", "Switzerland", "France"], from_year=1990)
+        .filter(regions=["France", "World"], from_year=1980, to_year=2010)
+        .filter(to_year=2000)
+    )
+    # Nothing is read before collect
+    assert calls == []
+    assert scan.filters == {}
+    assert filtered.filters == {"regions": ["World", "France"], "from_year": 1990, "to_year": 2000}
+
+    data_frame = filtered.select("Year", "Value").collect()
+    assert list(data_frame.columns) == ["Year", "Value"]
+    assert calls == [(filtered.filters, ["Year", "Value"])]
+
+    with pytest.raises(ValueError, match="Unsupported filters: types"):
+        scan.filter(types=["Oil"])
+    with pytest.raises(ValueError, match="Columns not selected: Region"):
+        scan.select("Year", "Value").select("Region")
+
+
+def test_bp_scan() -> None:
+    shifter_ds = BPDatasource("tests/bp-stats-review-2021-all-data.xlsx")
+    scan = (
+        shifter_ds.scan()
+        .filter(types=["Geothermal Capacity"], regions=["Mexico", "US"], from_year=1990, to_year=2000)
+        .select("Year", "Region", "Value")
+    )
+    data_frame = scan.collect()
+    # Only the filtered sheet is read
+    assert set(shifter_ds._metadata_cache) == {3}
+
+    expected = shifter_ds.datasource()
+    expected = expected[
+        (expected.Type == "Geothermal Capacity")
+        & expected.Region.isin(["Mexico", "US"])
+        & expected.Year.between(1990, 2000)
+    ][["Year", "Region", "Value"]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(
+        data_frame.astype({"Region": str}),
+        expected.astype({"Region": str}),
+    )
+
+
+def test_worldbank_scan() -> None:
+    shifter_ds = WorldbankDatasource(WORLDBANK_FILE)
+    data_frame = (
+        shifter_ds.scan(categorical=False)
+        .filter(countries=["CHE", "FRA"], from_year=2010)
+        .select("CountryCode", "Year", "Value")
+        .collect()
+    )
+    expected = shifter_ds.datasource(categorical=False)
+    expected = expected[expected.CountryCode.isin(["CHE", "FRA"]) & (expected.Year >= 2010)]
+    pd.testing.assert_frame_equal(
+        data_frame, expected[["CountryCode", "Year", "Value"]].reset_index(drop=True)
+    )
+
+
+def test_worldbank_bulk_scan() -> None:
+    bulk_ds = WorldbankBulkDatasource(WORLDBANK_FILE, chunk_size=50)
+    data_frame = (
+        bulk_ds.scan(categorical=False)
+        .filter(indicators=["NY.GDP.MKTP.KD"], countries=["FRA"], to_year=1969)
+        .select("Year", "Value")
+        .collect()
+    )
+    expected = WorldbankDatasource(WORLDBANK_FILE).datasource(categorical=False)
+    expected = expected[(expected.CountryCode == "FRA") & (expected.Year <= 1969)]
+    assert len(expected) == 10
+    pd.testing.assert_frame_equal(data_frame, expected[["Year", "Value"]].reset_index(drop=True))
+
+    # Only the selected label columns are parsed
+    assert list(bulk_ds.datasource(columns=["CountryCode"]).columns) == ["Year", "Value", "CountryCode"]
+
+    empty = bulk_ds.scan().filter(countries=["CHE"], to_year=1969).collect()
+    assert empty.empty
+    assert empty.dtypes.astype(str).to_dict() == {
+        "Year": "int16",
+        "Value": "float64",
+        "CountryName": "category",
+        "CountryCode": "category",
+        "IndicatorName": "category",
+        "IndicatorCode": "category",
+    }
+
+
+def test_scan_wikidata_type() -> None:
+    bp_frame = (
+        BPDatasource("tests/bp-stats-review-2021-all-data.xlsx")
+        .scan()
+        .filter(types=["Geothermal Capacity"], regions=["Mexico", "US"], from_year=2000, to_year=2000)
+        .select("Region", "WikidataType")
+        .collect()
+    )
+    assert list(bp_frame.columns) == ["Region", "WikidataType"]
+    assert set(bp_frame.WikidataType) == {"country"}
+
+    worldbank_frame = (
+        WorldbankDatasource(WORLDBANK_FILE)
+        .scan(categorical=False)
+        .filter(countries=["CHE", "FRA"], from_year=2010, to_year=2010)
+        .select("CountryCode", "WikidataType")
+        .collect()
+    )
+    assert list(worldbank_frame.columns) == ["CountryCode", "WikidataType"]
+    assert set(worldbank_frame.WikidataType) == {"country"}
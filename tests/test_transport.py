@@ -0,0 +1,204 @@
+import gzip
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+from conftest import StubHandler, StubServer
+
+from shifter_pandas.transport import ResponseCache, TokenBucket, Transport, retry_after
+
+
+class _Handler(StubHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:  # noqa: N802
+        server = self.server
+        with server.lock:
+            server.hits += 1
+            server.client_ports.add(self.client_address[1])
+            server.running += 1
+            server.max_running = max(server.max_running, server.running)
+        try:
+            time.sleep(server.delay)
+            self._respond()
+        finally:
+            with server.lock:
+                server.running -= 1
+
+    def _respond(self) -> None:
+        server = self.server
+        with server.lock:
+            too_many_requests = server.too_many_requests > 0
+            if too_many_requests:
+                server.too_many_requests -= 1
+            error = server.errors.pop(0) if server.errors and not too_many_requests else None
+        if too_many_requests:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        if error is not None:
+            self.send_response(error)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = b"OK" * 100
+        self.send_response(200)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub(http_stub) -> StubServer:
+    return http_stub(
+        _Handler,
+        # Number of 429 responses before the 200 one
+        too_many_requests=0,
+        # Status codes of the responses before the 200 one
+        errors=[],
+        hits=0,
+        client_ports=set(),
+        # Duration of the responses in seconds, and maximum number of responses in progress
+        delay=0.0,
+        running=0,
+        max_running=0,
+    )
+
+
+@pytest.fixture
+def url(stub) -> str:
+    return f"{stub.url}/"
+
+
+def test_retry_after(stub, url) -> None:
+    stub.too_many_requests = 2
+    response = Transport().request("GET", url)
+    assert response.status_code == 200
+    assert stub.hits == 3
+
+    stub.too_many_requests = 2
+    stub.hits = 0
+    response = Transport(max_retries=1).request("GET", url)
+    assert response.status_code == 429
+    assert stub.hits == 2
+
+
+def test_max_backoff(stub, url, monkeypatch) -> None:
+    stub.too_many_requests = 1
+    delays: list[float] = []
+    monkeypatch.setattr(time, "sleep", delays.append)
+    monkeypatch.setattr("shifter_pandas.transport.retry_after", lambda response: 3600.0)
+    response = Transport(max_backoff=10).request("GET", url)
+    assert response.status_code == 200
+    # The other delays are the ones of the handler
+    assert max(delays) == 10
+
+
+def test_retry_after_header() -> None:
+    response = requests.Response()
+    assert retry_after(response) is None
+    response.headers["Retry-After"] = "2"
+    assert retry_after(response) == 2
+    response.headers["Retry-After"] = formatdate(time.time() + 60, usegmt=True)
+    assert 50 < retry_after(response) <= 60
+    response.headers["Retry-After"] = "invalid"
+    assert retry_after(response) is None
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first token is available immediately, then one every 20 ms
+    assert time.monotonic() - start >= 0.09
+
+
+def test_map() -> None:
+    running = 0
+    max_running = 0
+    lock = threading.Lock()
+
+    def _function(value: int) -> int:
+        nonlocal running, max_running
+        with lock:
+            running += 1
+            max_running = max(max_running, running)
+        time.sleep((10 - value) / 1000)
+        with lock:
+            running -= 1
+        return value * 2
+
+    assert Transport(max_workers=3).map(_function, range(10)) == [value * 2 for value in range(10)]
+    assert max_running == 3
+    assert Transport(max_workers=1).map(_function, range(3)) == [0, 2, 4]
+
+
+def test_nested_map(stub, url) -> None:
+    stub.delay = 0.02
+    transport = Transport(max_workers=3)
+    responses = transport.map(
+        lambda _: transport.map(lambda _: transport.request("GET", url).status_code, range(4)),
+        range(4),
+    )
+    assert responses == [[200] * 4] * 4
+    assert stub.hits == 16
+    # Not max_workers² requests in flight
+    assert stub.max_running == 3
+
+
+def test_backoff(stub, url) -> None:
+    stub.errors = [500, 503]
+    transport = Transport(backoff_factor=0.05)
+    start = time.monotonic()
+    response = transport.request("GET", url)
+    assert response.status_code == 200
+    # 0.05s then 0.1s
+    assert time.monotonic() - start >= 0.15
+    assert stub.hits == 3
+    assert transport.stats.requests == 3
+    assert transport.stats.retries == 2
+    assert transport.stats.errors == 2
+
+    stub.errors = [404]
+    assert transport.request("GET", url).status_code == 404
+    assert transport.stats.requests == 4
+
+
+def test_cache_params(stub, url, tmp_path) -> None:
+    transport = Transport()
+    cache = ResponseCache(tmp_path)
+    assert transport.request("GET", url, cache=cache, params={"q": "1"}).status_code == 200
+    assert transport.request("GET", url, cache=cache, params={"q": "2"}).status_code == 200
+    assert stub.hits == 2
+    assert transport.request("GET", url, cache=cache, params={"q": "1"}).text == "OK" * 100
+    assert stub.hits == 2
+    assert transport.stats.cache_hits == 1
+
+
+def test_connection_error() -> None:
+    transport = Transport(max_retries=2, backoff_factor=0)
+    with pytest.raises(requests.ConnectionError):
+        transport.request("GET", "http://127.0.0.1:1/")
+    assert transport.stats.requests == 3
+    assert transport.stats.errors == 3
+
+
+def test_session(stub, url) -> None:
+    transport = Transport()
+    for _ in range(5):
+        response = transport.request("GET", url)
+        assert response.text == "OK" * 100
+        assert response.headers["Content-Encoding"] == "gzip"
+    # The connection is reused
+    assert len(stub.client_ports) == 1
+    assert transport.stats.requests == 5
+    assert transport.stats.errors == 0
+    assert 0 < transport.stats.mean_seconds <= transport.stats.max_seconds
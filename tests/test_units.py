@@ -0,0 +1,77 @@
+"""Tests of the units registry."""
+
+import pandas as pd
+import pytest
+
+from shifter_pandas.units import IsoUnit, UnitRegistry, indicator_unit, normalize_unit
+
+
+def test_parse() -> None:
+    registry = UnitRegistry()
+    assert normalize_unit(" Exajoules ") == "exajoules"
+    assert registry.parse("exajoules") == IsoUnit("J", "", 1000000000000000000)
+    assert registry.parse("million tonnes of oil equivalent") == IsoUnit(
+        "tonnes", " of oil equivalent", 1000000
+    )
+    assert registry.parse("thousand barrels per day") == IsoUnit("m³ per day", "", 1000 / 6.2898)
+    assert registry.parse("kwh per capita") == IsoUnit("J per capita", "", 3600000)
+    assert registry.parse("megawatts") == IsoUnit("W", "", 1000000)
+    assert registry.parse("unknown") == IsoUnit("unknown", "", 1)
+
+    # The parsed units are cached, and the cache is cleared when a unit is defined
+    assert registry.parse("gallons") == IsoUnit("gallons", "", 1)
+    registry.define("Gallons", "m³", 0.00378541)
+    assert registry.parse("gallons") == IsoUnit("m³", "", 0.00378541)
+
+
+def test_convert() -> None:
+    registry = UnitRegistry()
+    values = pd.Series([1.0, 2.5])
+    pd.testing.assert_series_equal(registry.convert(values, "Terawatt-hours"), pd.Series([3.6e15, 9e15]))
+    pd.testing.assert_series_equal(
+        registry.convert(values, "Petajoules", "Terajoules"), pd.Series([1000.0, 2500.0])
+    )
+    pd.testing.assert_series_equal(
+        registry.convert(values, "Barrels", "Cubic meters"), pd.Series([1 / 6.2898, 2.5 / 6.2898])
+    )
+    pd.testing.assert_series_equal(
+        registry.convert(values, "lb", "tonnes"), pd.Series([1 / 2204.62, 2.5 / 2204.62])
+    )
+    with pytest.raises(ValueError, match="Unable to convert"):
+        registry.convert(values, "Exajoules", "Megawatts")
+
+
+def test_to_iso() -> None:
+    registry = UnitRegistry()
+    values, units = registry.to_iso(
+        pd.Series([1.0, 2.0, 3.0, 4.0]),
+        pd.Series(["Exajoules", "Megawatts", None, "Million tonnes per capita"]),
+    )
+    pd.testing.assert_series_equal(values, pd.Series([1e18, 2e6, 3.0, 4e6]))
+    assert units.tolist()[:2] == ["J", "W"]
+    assert pd.isna(units[2])
+    assert units[3] == "tonnes per capita"
+
+
+def test_to_iso_worldbank_units() -> None:
+    registry = UnitRegistry()
+    units = pd.Series(
+        [
+            "kWh per capita",
+            "constant 2015 US$",
+            "current US$ per capita",
+            "% of GDP",
+            "metric tons per capita",
+            "kt of CO2 equivalent",
+        ]
+    )
+    values, iso_units = registry.to_iso(pd.Series([1.0] * len(units)), units)
+    pd.testing.assert_series_equal(values, pd.Series([3600000.0, 1.0, 1.0, 1.0, 1.0, 1.0]))
+    # The units that are not converted are kept as is
+    assert iso_units.tolist() == ["J per capita", *units.tolist()[1:]]
+
+
+def test_indicator_unit() -> None:
+    assert indicator_unit("GDP (constant 2015 US$)") == "constant 2015 US$"
+    assert indicator_unit("Electric power consumption (kWh per capita)") == "kWh per capita"
+    assert indicator_unit("Population, total") is None
@@ -1,5 +1,10 @@
 # https://data.worldbank.org/indicator/NY.GDP.MKTP.KD
-from shifter_pandas.worldbank import WorldbankDatasource
+import zipfile
+
+import pandas as pd
+import pytest
+
+from shifter_pandas.worldbank import WorldbankBulkDatasource, WorldbankDatasource, read_parquet
 
 
 def test_worldbank() -> None:
@@ -14,3 +19,97 @@ def test_worldbank() -> None:
         "IndicatorCode",
     ]
     assert set(data_field.Year) == set(range(1960, 2021))
+
+
+def test_worldbank_dtypes() -> None:
+    shifter_ds = WorldbankDatasource("tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip")
+    data_frame = shifter_ds.datasource(units="iso")
+    assert data_frame.dtypes.to_dict() == {
+        "Year": "int16",
+        "Value": "float64",
+        "CountryName": "category",
+        "CountryCode": "category",
+        "IndicatorName": "category",
+        "IndicatorCode": "category",
+        "Unit": "category",
+    }
+    strings = shifter_ds.datasource(units="iso", categorical=False)
+    assert strings.Year.dtype == "int64"
+    assert strings.CountryCode.dtype == "str"
+    pd.testing.assert_frame_equal(data_frame.astype(strings.dtypes.to_dict()), strings)
+
+
+def _bulk_file(tmp_path) -> str:
+    """Get a bulk file like the WDI archive, with 3 indicators and without the preamble lines."""
+    name = "API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701"
+    with zipfile.ZipFile(f"tests/{name}.zip") as myzip:
+        lines = myzip.read(f"{name}.csv").decode("utf-8-sig").splitlines(keepends=True)
+    bulk_filename = tmp_path / "WDI_CSV.zip"
+    with zipfile.ZipFile(bulk_filename, "w") as bulk_zip:
+        bulk_zip.writestr("WDICountry.csv", '"Country Code","Short Name"\n"CHE","Switzerland"\n')
+        bulk_zip.writestr(
+            "WDIData.csv",
+            "".join(
+                [
+                    lines[4],
+                    *[
+                        line.replace("NY.GDP.MKTP.KD", code)
+                        for line in lines[5:]
+                        for code in ("NY.GDP.MKTP.KD", "TEST.1", "TEST.2")
+                    ],
+                ],
+            ),
+        )
+    return str(bulk_filename)
+
+
+def test_worldbank_bulk(tmp_path) -> None:
+    bulk_ds = WorldbankBulkDatasource(_bulk_file(tmp_path), chunk_size=50)
+    assert bulk_ds.csv_name == "WDIData.csv"
+    assert bulk_ds.skiprows == 0
+    assert bulk_ds.years == list(range(1960, 2021))
+
+    expected = WorldbankDatasource("tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip").datasource()
+    pd.testing.assert_frame_equal(bulk_ds.datasource(indicators_filter=["NY.GDP.MKTP.KD"]), expected)
+
+    data_frame = bulk_ds.datasource(countries_filter=["CHE", "FRA"], from_year=2000, to_year=2009)
+    assert len(data_frame) == 2 * 3 * 10
+    assert set(data_frame.CountryCode) == {"CHE", "FRA"}
+    assert set(data_frame.IndicatorCode) == {"NY.GDP.MKTP.KD", "TEST.1", "TEST.2"}
+    assert set(data_frame.Year) == set(range(2000, 2010))
+    assert bulk_ds.datasource(indicators_filter=["Unknown"]).empty
+
+    # The single indicator files have a preamble
+    single_ds = WorldbankBulkDatasource("tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip")
+    assert single_ds.skiprows == 4
+    pd.testing.assert_frame_equal(
+        single_ds.datasource(categorical=False),
+        WorldbankDatasource("tests/API_NY.GDP.MKTP.KD_DS2_en_csv_v2_3630701.zip").datasource(
+            categorical=False
+        ),
+    )
+
+
+def test_worldbank_parquet(tmp_path) -> None:
+    pytest.importorskip("pyarrow")
+
+    bulk_ds = WorldbankBulkDatasource(_bulk_file(tmp_path), chunk_size=50)
+    bulk_ds.to_parquet(str(tmp_path / "wdi"), from_year=2000)
+    assert sorted(path.name for path in (tmp_path / "wdi").iterdir()) == [
+        "IndicatorCode=NY.GDP.MKTP.KD",
+        "IndicatorCode=TEST.1",
+        "IndicatorCode=TEST.2",
+    ]
+
+    data_frame = read_parquet(str(tmp_path / "wdi"), indicators_filter=["TEST.1"], countries_filter=["CHE"])
+    expected = bulk_ds.datasource(indicators_filter=["TEST.1"], countries_filter=["CHE"], from_year=2000)
+    assert list(data_frame.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(
+        data_frame.sort_values("Year").reset_index(drop=True).astype(str),
+        expected.astype(str),
+    )
+    assert set(read_parquet(str(tmp_path / "wdi"), to_year=2001).Year) == {2000, 2001}
+
+    # Written again
+    bulk_ds.to_parquet(str(tmp_path / "wdi"), indicators_filter=["TEST.2"])
+    assert [path.name for path in (tmp_path / "wdi").iterdir()] == ["IndicatorCode=TEST.2"]